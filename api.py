@@ -0,0 +1,454 @@
+"""
+JSON API
+Asynchronous HTTP API for programmatic clients, served as a plain ASGI
+application next to the HTML interface (it shares the job store, the
+scheduler and the engine pool of app.py):
+
+    uvicorn api:app --port 5001
+
+    POST /api/jobs              multipart upload: files, optional profile
+                                and callback_url; answers 202 with the job
+    GET  /api/jobs/<id>         job status; ?wait=<seconds> holds the request
+                                until the job finishes, or until it changes
+                                after ?since=<updated_at>
+    GET  /api/jobs/<id>/result  the PDF of a single file job or a ZIP of all
+                                PDFs; ?file=<index> selects one file
+
+A waiting client costs a coroutine rather than a server thread, and clients
+that pass a callback_url get the finished job POSTed to them instead of
+polling (see webhooks.py).
+"""
+
+import asyncio
+import json
+import os
+import sys
+import time
+from urllib.parse import parse_qs
+
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.http import parse_etags, parse_options_header, parse_range_header, quote_etag
+from werkzeug.sansio.multipart import Data, Epilogue, Field, File, MultipartDecoder, NeedData
+
+from app import (
+    FINISHED_STATES, app as flask_app, batch_zip_compression, converter, etags, job_store, job_summary,
+    preflight_uploads, public_status, recover_jobs_once, submit_batch
+)
+from export_profiles import PROFILES
+from file_serving import attachment_header, combined_etag, offload_headers
+from scheduler import QueueFullError
+from upload_stream import IngestFile
+from webhooks import valid_callback_url
+from zip_stream import stream_zip, unique_arcnames
+
+CHUNK_SIZE = 256 * 1024
+
+# Largest plain form field (profile, callback_url) accepted
+MAX_FIELD_BYTES = 4096
+
+# Most recent read of each job, shared by all clients waiting on it so a
+# thousand long-polls of one job cost one job store read per interval
+_job_reads = {}
+
+
+async def app(scope, receive, send):
+    """ASGI entry point"""
+    if scope['type'] == 'lifespan':
+        await _lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        return
+
+    parts = scope['path'].rstrip('/').split('/')
+    method = scope['method']
+    try:
+        if parts[1:3] == ['api', 'jobs']:
+            if len(parts) == 3:
+                if method == 'POST':
+                    return await create_job(scope, receive, send)
+                return await send_json(send, 405, {'error': 'Method not allowed'}, [(b'allow', b'POST')])
+            if len(parts) in (4, 5) and method not in ('GET', 'HEAD'):
+                return await send_json(send, 405, {'error': 'Method not allowed'}, [(b'allow', b'GET')])
+            if len(parts) == 4:
+                return await get_job(scope, send, parts[3])
+            if len(parts) == 5 and parts[4] == 'result':
+                return await get_result(scope, send, parts[3])
+        await send_json(send, 404, {'error': 'Not found'})
+    except Exception as e:
+        print(f"API error on {method} {scope['path']}: {str(e)}")
+        try:
+            await send_json(send, 500, {'error': 'Internal error'})
+        except Exception:
+            pass  # the response had already started
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            # Same start-up work as the web application's first request
+            await asyncio.to_thread(recover_jobs_once)
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def send_json(send, status, body, headers=()):
+    data = json.dumps(body).encode()
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(data)).encode())]
+                   + list(headers),
+    })
+    await send({'type': 'http.response.body', 'body': data})
+
+
+def _query(scope):
+    return {key: values[-1] for key, values in parse_qs(scope.get('query_string', b'').decode()).items()}
+
+
+def _header(scope, name):
+    for key, value in scope.get('headers', []):
+        if key == name:
+            return value.decode('latin-1')
+    return None
+
+
+async def create_job(scope, receive, send):
+    """Stream a multipart upload into the upload folder and queue the batch"""
+    content_type, options = parse_options_header(_header(scope, b'content-type') or '')
+    boundary = options.get('boundary')
+    if content_type != 'multipart/form-data' or not boundary:
+        return await send_json(send, 415, {'error': 'Expected multipart/form-data with files'})
+
+    max_length = flask_app.config['MAX_CONTENT_LENGTH']
+    content_length = _header(scope, b'content-length')
+    if content_length and content_length.isdigit() and int(content_length) > max_length:
+        return await send_json(send, 413, {'error': f'Upload is larger than {max_length // (1024 * 1024)}MB'})
+
+    fields, uploads = {}, []
+    try:
+        await _read_multipart(receive, boundary.encode(), max_length, fields, uploads)
+    except RequestEntityTooLarge as e:
+        _discard(uploads)
+        return await send_json(send, 413, {'error': e.description})
+    except ValueError as e:
+        _discard(uploads)
+        return await send_json(send, 400, {'error': str(e)})
+
+    profile = fields.get('profile') or converter.default_profile
+    callback_url = fields.get('callback_url') or None
+    if profile not in PROFILES:
+        _discard(uploads)
+        return await send_json(send, 400, {'error': f'Unknown export profile: {profile}',
+                                           'profiles': list(PROFILES)})
+    if callback_url and not await asyncio.to_thread(valid_callback_url, callback_url,
+                                                    flask_app.config['WEBHOOK_ALLOW_PRIVATE']):
+        _discard(uploads)
+        return await send_json(send, 400, {'error': 'callback_url must be an http(s) URL of a public host'})
+
+    uploaded_files, failed_uploads = [], []
+    for filename, ingest in uploads:
+        if ingest is None:
+            failed_uploads.append(f"{filename}: Invalid file type. Please upload a PPT or PPTX file.")
+        elif ingest.error:
+            failed_uploads.append(f"{filename}: {ingest.error}")
+        else:
+            ingest.keep()
+            uploaded_files.append({
+                'file_path': ingest.path,
+                'original_filename': filename,
+                'file_hash': ingest.hexdigest()
+            })
+    uploaded_files = await asyncio.to_thread(preflight_uploads, uploaded_files, failed_uploads, profile)
+    if not uploaded_files:
+        _discard(uploads)
+        return await send_json(send, 400, {'error': 'No valid files uploaded', 'rejected_uploads': failed_uploads})
+
+    client = (scope.get('client') or ('anonymous',))[0]
+    try:
+        job_id = await asyncio.to_thread(submit_batch, uploaded_files, failed_uploads, profile,
+                                         client, callback_url)
+    except QueueFullError:
+        return await send_json(send, 429, {'error': 'The server is busy converting other files'},
+                               [(b'retry-after', b'60')])
+
+    job = await asyncio.to_thread(job_store.get, job_id)
+    await send_json(send, 202, job_summary(job_id, job), [(b'location', f'/api/jobs/{job_id}'.encode())])
+
+
+async def _read_multipart(receive, boundary, max_length, fields, uploads):
+    """
+    Feed the request body through a multipart decoder, writing files to the
+    upload folder as their data arrives
+
+    Args:
+        fields: Filled with plain form fields
+        uploads: Filled with (filename, IngestFile or None for refused names)
+    """
+    decoder = MultipartDecoder(boundary)
+    received = 0
+    more_body = True
+    current = None
+    while True:
+        event = decoder.next_event()
+        if isinstance(event, NeedData):
+            if not more_body:
+                raise ValueError("Incomplete multipart body")
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                raise ValueError("Client disconnected")
+            body = message.get('body', b'')
+            more_body = message.get('more_body', False)
+            received += len(body)
+            if received > max_length:
+                raise RequestEntityTooLarge(f'Upload is larger than {max_length // (1024 * 1024)}MB')
+            decoder.receive_data(body)
+            if not more_body:
+                decoder.receive_data(None)
+        elif isinstance(event, File):
+            ingest = None
+            if event.name == 'files' and event.filename and converter.allowed_file(event.filename):
+                ingest = IngestFile(converter.new_upload_path(event.filename), converter.max_file_size)
+            uploads.append((event.filename, ingest))
+            current = ingest
+        elif isinstance(event, Field):
+            current = fields.setdefault(event.name, bytearray())
+        elif isinstance(event, Data):
+            if isinstance(current, IngestFile):
+                current.write(event.data)
+                if not event.more_data:
+                    current.seek(0)  # runs the checks for very short files
+            elif isinstance(current, bytearray):
+                current.extend(event.data)
+                if len(current) > MAX_FIELD_BYTES:
+                    raise ValueError("Form field is too long")
+        elif isinstance(event, Epilogue):
+            break
+
+    for name, value in list(fields.items()):
+        fields[name] = bytes(value).decode('utf-8', 'replace')
+    # Empty file inputs arrive as parts without a file name
+    uploads[:] = [(filename, ingest) for filename, ingest in uploads if filename]
+
+
+def _discard(uploads):
+    """Remove files written for a refused upload"""
+    for _, ingest in uploads:
+        if ingest is not None:
+            ingest.close()
+
+
+async def _read_job(job_id, max_age):
+    """Read a job, reusing a read of another waiting client if recent enough"""
+    now = time.monotonic()
+    if len(_job_reads) > 10000:
+        # Forget jobs nobody has asked about for a while
+        for stale_id, (read_at, _) in list(_job_reads.items()):
+            if now - read_at > flask_app.config['API_MAX_WAIT_SECONDS']:
+                _job_reads.pop(stale_id, None)
+    cached = _job_reads.get(job_id)
+    if cached is not None and now - cached[0] < max_age:
+        return cached[1]
+    job = await asyncio.to_thread(job_store.get, job_id)
+    if job is None:
+        _job_reads.pop(job_id, None)
+    else:
+        _job_reads[job_id] = (time.monotonic(), job)
+    return job
+
+
+def _float(value, default=None):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+async def get_job(scope, send, job_id):
+    """Job status, optionally held open until the job finishes or changes"""
+    query = _query(scope)
+    wait = min(max(_float(query.get('wait'), 0), 0), flask_app.config['API_MAX_WAIT_SECONDS'])
+    since = _float(query.get('since'))
+    poll = flask_app.config['API_POLL_SECONDS']
+
+    def settled(job):
+        if job['status'] in FINISHED_STATES:
+            return True
+        return since is not None and job.get('updated_at', 0) > since
+
+    job = await _read_job(job_id, 0)
+    deadline = time.monotonic() + wait
+    while job is not None and not settled(job) and time.monotonic() < deadline:
+        await asyncio.sleep(min(poll, max(0, deadline - time.monotonic())))
+        job = await _read_job(job_id, poll)
+    if job is None:
+        return await send_json(send, 404, {'error': 'Unknown job'})
+
+    if job['status'] in FINISHED_STATES:
+        _job_reads.pop(job_id, None)
+    await send_json(send, 200, job_summary(job_id, public_status(job_id, job)))
+
+
+async def get_result(scope, send, job_id):
+    """Send the PDF of one file, or a ZIP of every converted file"""
+    job = await asyncio.to_thread(job_store.get, job_id)
+    if job is None:
+        return await send_json(send, 404, {'error': 'Unknown job'})
+    if job['status'] not in ('completed', 'completed_with_errors'):
+        return await send_json(send, 409, {'error': 'Job has no result', 'status': job['status']})
+
+    results = job.get('results', [])
+    file_index = _query(scope).get('file')
+    if file_index is not None:
+        if not file_index.isdigit() or int(file_index) >= len(results):
+            return await send_json(send, 404, {'error': 'Unknown file index'})
+        selected = [results[int(file_index)]]
+    else:
+        selected = results
+    converted = [result for result in selected
+                 if result['status'] == 'success' and os.path.exists(result['pdf_path'])]
+    if not converted:
+        return await send_json(send, 404, {'error': 'No converted file available'})
+
+    head_only = scope['method'] == 'HEAD'
+    if file_index is not None or len(results) == 1:
+        result = converted[0]
+        return await send_file(scope, send, result['pdf_path'], result['pdf_filename'], 'application/pdf',
+                               head_only, digest=result.get('pdf_sha256'))
+
+    archive_path = job.get('archive_path')
+    zip_name = f'converted_pdfs_{job_id}.zip'
+    if archive_path and os.path.exists(archive_path):
+        return await send_file(scope, send, archive_path, zip_name, 'application/zip', head_only)
+
+    arcnames = unique_arcnames([result['pdf_filename'] for result in converted])
+    members = [(arcname, result['pdf_path']) for arcname, result in zip(arcnames, converted)]
+    member_etags = [arcname + ':' + await asyncio.to_thread(etags.etag, result['pdf_path'], result.get('pdf_sha256'))
+                    for arcname, result in zip(arcnames, converted)]
+    etag = 'W/' + quote_etag(combined_etag(member_etags + [str(batch_zip_compression())]))
+    if _not_modified(scope, etag):
+        return await _send_not_modified(send, etag)
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [
+            (b'content-type', b'application/zip'),
+            (b'content-disposition', attachment_header(zip_name).encode()),
+            (b'etag', etag.encode()),
+        ],
+    })
+    if not head_only:
+        # The archive is built in a thread while it is sent
+        chunks = stream_zip(members, compression=batch_zip_compression())
+        while True:
+            chunk = await asyncio.to_thread(next, chunks, None)
+            if chunk is None:
+                break
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+    await send({'type': 'http.response.body', 'body': b''})
+
+
+def _not_modified(scope, etag):
+    return parse_etags(_header(scope, b'if-none-match')).contains_weak(etag.removeprefix('W/').strip('"'))
+
+
+async def _send_not_modified(send, etag):
+    await send({'type': 'http.response.start', 'status': 304, 'headers': [(b'etag', etag.encode())]})
+    await send({'type': 'http.response.body', 'body': b''})
+
+
+def _byte_range(scope, etag, size):
+    """
+    The (start, stop) slice a Range request asks for
+
+    Returns:
+        tuple: (start, stop), None to send the whole file, or False if the
+        range cannot be satisfied
+    """
+    header = _header(scope, b'range')
+    if not header:
+        return None
+    if_range = _header(scope, b'if-range')
+    if if_range and if_range != etag:
+        return None  # the client's copy is stale: send the current file
+    ranges = parse_range_header(header)
+    if ranges is None or len(ranges.ranges) != 1:
+        return None  # multipart/byteranges is not offered
+    return ranges.range_for_length(size) or False
+
+
+async def send_file(scope, send, path, filename, content_type, head_only=False, digest=None):
+    """
+    Stream a file from disk in chunks read off the event loop. Answers
+    If-None-Match with 304 and a single-range Range request with 206, and
+    hands the file to the front proxy when PPT2PDF_SENDFILE is set.
+
+    Args:
+        scope: ASGI scope of the request
+        send: ASGI send callable
+        path: The file
+        filename: File name offered to the client
+        content_type: Content type
+        head_only: Send the headers only
+        digest: SHA-256 of the file if already known
+    """
+    etag = quote_etag(await asyncio.to_thread(etags.etag, path, digest))
+    if _not_modified(scope, etag):
+        return await _send_not_modified(send, etag)
+    headers = [
+        (b'content-type', content_type.encode()),
+        (b'content-disposition', attachment_header(filename).encode()),
+        (b'etag', etag.encode()),
+    ]
+
+    offload = offload_headers(path, flask_app.config['SENDFILE'], flask_app.config['X_ACCEL_PREFIX'],
+                              converter.download_folder)
+    if offload is not None:
+        headers += [(key.lower().encode(), value.encode()) for key, value in offload.items()]
+        await send({'type': 'http.response.start', 'status': 200, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': b''})
+        return
+
+    f = await asyncio.to_thread(open, path, 'rb')
+    try:
+        size = os.fstat(f.fileno()).st_size
+        byte_range = _byte_range(scope, etag, size)
+        if byte_range is False:
+            await send({
+                'type': 'http.response.start',
+                'status': 416,
+                'headers': [(b'content-range', f'bytes */{size}'.encode())],
+            })
+            await send({'type': 'http.response.body', 'body': b''})
+            return
+        status = 200
+        start, stop = 0, size
+        if byte_range:
+            status = 206
+            start, stop = byte_range
+            headers.append((b'content-range', f'bytes {start}-{stop - 1}/{size}'.encode()))
+            await asyncio.to_thread(f.seek, start)
+        headers += [(b'content-length', str(stop - start).encode()), (b'accept-ranges', b'bytes')]
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        remaining = 0 if head_only else stop - start
+        while remaining > 0:
+            chunk = await asyncio.to_thread(f.read, min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        f.close()
+
+
+if __name__ == '__main__':
+    try:
+        import uvicorn
+    except ImportError:
+        print("Serving the API needs an ASGI server: pip install uvicorn (or run it with hypercorn)")
+        sys.exit(1)
+    uvicorn.run(app, host='0.0.0.0', port=int(os.environ.get('PPT2PDF_API_PORT', '5001')))
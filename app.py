@@ -5,22 +5,365 @@ Simple web interface for uploading and converting PowerPoint files to PDF.
 @author: Modified for web application
 """
 
+import json
 import os
+import socket
 import threading
 import time
-from flask import Flask, request, render_template, send_file, jsonify, redirect, url_for, flash
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, Response, request, render_template, send_file, jsonify, redirect, url_for, flash
+from werkzeug.exceptions import RequestedRangeNotSatisfiable, RequestEntityTooLarge
 from werkzeug.utils import secure_filename
 from simple_converter import SimplePPTConverter
+from chunked_upload import UploadError, UploadSessions
+from conversion_cache import ConversionCache, hash_file
+from job_store import create_job_store
+from job_queue import create_job_queue
+from export_profiles import PROFILES
+from file_serving import SENDFILE_MODES, ETagCache, attachment_header, combined_etag, offload_headers
+from metrics import REGISTRY, Gauge, span
+from reaper import Reaper
+from split_export import can_merge, extract_page
+from zip_stream import append_to_archive, stream_zip, unique_arcnames
+from scheduler import JobScheduler, QueueFullError
+from upload_stream import StreamingUploadRequest
+from webhooks import WebhookSender
 
 app = Flask(__name__)
 app.secret_key = 'your-secret-key-change-this-in-production'  # Change this in production
-app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024  # 50MB max file size
+# Largest single request; bigger files are sent as chunked uploads
+app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('PPT2PDF_MAX_REQUEST_MB', '50')) * 1024 * 1024
+app.config['MAX_FILE_MB'] = int(os.environ.get('PPT2PDF_MAX_FILE_MB', '500'))
+app.config['UPLOAD_CHUNK_MB'] = int(os.environ.get('PPT2PDF_UPLOAD_CHUNK_MB', '8'))
+app.config['UPLOAD_SESSION_DIR'] = os.environ.get('PPT2PDF_UPLOAD_SESSION_DIR', 'upload_sessions')
+app.config['UPLOAD_SESSION_TTL'] = int(os.environ.get('PPT2PDF_UPLOAD_SESSION_TTL', '86400'))
+app.config['UPLOAD_MAX_SESSIONS'] = int(os.environ.get('PPT2PDF_UPLOAD_MAX_SESSIONS', '200'))
+
+# Conversion engine settings (override through environment variables)
+app.config['CONVERTER_BACKEND'] = os.environ.get('PPT2PDF_BACKEND', 'powerpoint')
+app.config['CONVERTER_POOL_SIZE'] = int(os.environ.get('PPT2PDF_POOL_SIZE', '1'))
+app.config['CONVERTER_MAX_JOBS_PER_WORKER'] = int(os.environ.get('PPT2PDF_MAX_JOBS_PER_WORKER', '100'))
+app.config['MAX_CONCURRENT_CONVERSIONS'] = int(os.environ.get(
+    'PPT2PDF_MAX_CONCURRENT_CONVERSIONS', str(app.config['CONVERTER_POOL_SIZE'] * 2)))
+app.config['BATCH_MAX_PARALLEL'] = int(os.environ.get('PPT2PDF_BATCH_MAX_PARALLEL', '4'))
+app.config['SCHEDULER_WORKERS'] = int(os.environ.get('PPT2PDF_SCHEDULER_WORKERS', '2'))
+app.config['SCHEDULER_MAX_QUEUED'] = int(os.environ.get('PPT2PDF_SCHEDULER_MAX_QUEUED', '50'))
+app.config['INTERACTIVE_MAX_FILES'] = int(os.environ.get('PPT2PDF_INTERACTIVE_MAX_FILES', '1'))
+app.config['INTERACTIVE_MAX_SECONDS'] = float(os.environ.get('PPT2PDF_INTERACTIVE_MAX_SECONDS', '20'))
+app.config['MAX_SLIDES'] = int(os.environ.get('PPT2PDF_MAX_SLIDES', '2000'))
+app.config['MAX_UNPACKED_MB'] = int(os.environ.get('PPT2PDF_MAX_UNPACKED_MB', '2048'))
+app.config['MAX_COMPRESSION_RATIO'] = float(os.environ.get('PPT2PDF_MAX_COMPRESSION_RATIO', '100'))
+app.config['CONVERT_TIMEOUT_MIN'] = float(os.environ.get('PPT2PDF_CONVERT_TIMEOUT_MIN', '60'))
+app.config['CONVERT_TIMEOUT_MAX'] = float(os.environ.get('PPT2PDF_CONVERT_TIMEOUT_MAX', '1800'))
+app.config['CONVERT_TIMEOUT_FACTOR'] = float(os.environ.get('PPT2PDF_CONVERT_TIMEOUT_FACTOR', '4'))
+app.config['SPLIT_MIN_SLIDES'] = int(os.environ.get('PPT2PDF_SPLIT_MIN_SLIDES', '0'))
+app.config['SPLIT_MAX_PARTS'] = int(os.environ.get('PPT2PDF_SPLIT_MAX_PARTS', '0'))
+app.config['PREVIEW_SLIDES'] = int(os.environ.get('PPT2PDF_PREVIEW_SLIDES', '0'))
+app.config['EXPORT_PROFILE'] = os.environ.get('PPT2PDF_EXPORT_PROFILE', 'screen')
+app.config['OPTIMIZE_PDF'] = os.environ.get('PPT2PDF_OPTIMIZE_PDF', '1') == '1'
+app.config['SLIM_MEDIA'] = os.environ.get('PPT2PDF_SLIM_MEDIA', '0') == '1'
+app.config['CACHE_ENABLED'] = os.environ.get('PPT2PDF_CACHE_ENABLED', '1') == '1'
+app.config['CACHE_DIR'] = os.environ.get('PPT2PDF_CACHE_DIR', 'cache')
+app.config['CACHE_MAX_MB'] = int(os.environ.get('PPT2PDF_CACHE_MAX_MB', '1024'))
+app.config['JOB_STORE'] = os.environ.get('PPT2PDF_JOB_STORE', 'sqlite')
+app.config['JOB_STORE_PATH'] = os.environ.get('PPT2PDF_JOB_STORE_PATH', 'jobs.db')
+app.config['REDIS_URL'] = os.environ.get('PPT2PDF_REDIS_URL', 'redis://localhost:6379/0')
+app.config['JOB_QUEUE'] = os.environ.get('PPT2PDF_JOB_QUEUE', '')
+app.config['SPOOL_DIR'] = os.environ.get('PPT2PDF_SPOOL_DIR', 'spool')
+app.config['UPLOAD_FOLDER'] = os.environ.get('PPT2PDF_UPLOAD_FOLDER', 'uploads')
+app.config['DOWNLOAD_FOLDER'] = os.environ.get('PPT2PDF_DOWNLOAD_FOLDER', 'downloads')
+app.config['JOB_TTL_SECONDS'] = int(os.environ.get('PPT2PDF_JOB_TTL_SECONDS', '86400'))
+app.config['JOB_MAX_FINISHED'] = int(os.environ.get('PPT2PDF_JOB_MAX_FINISHED', '10000'))
+app.config['DISK_HIGH_WATER'] = float(os.environ.get('PPT2PDF_DISK_HIGH_WATER', '90'))
+app.config['DISK_LOW_WATER'] = float(os.environ.get('PPT2PDF_DISK_LOW_WATER', '80'))
+app.config['JOB_MIN_RETENTION_SECONDS'] = int(os.environ.get('PPT2PDF_JOB_MIN_RETENTION_SECONDS', '300'))
+app.config['REAPER_INTERVAL'] = float(os.environ.get('PPT2PDF_REAPER_INTERVAL', '60'))
+app.config['JOB_STALE_SECONDS'] = int(os.environ.get('PPT2PDF_JOB_STALE_SECONDS', '600'))
+app.config['SSE_RECHECK_SECONDS'] = float(os.environ.get('PPT2PDF_SSE_RECHECK_SECONDS', '1.0'))
+app.config['SSE_KEEPALIVE_SECONDS'] = float(os.environ.get('PPT2PDF_SSE_KEEPALIVE_SECONDS', '15'))
+app.config['SSE_RETRY_MS'] = int(os.environ.get('PPT2PDF_SSE_RETRY_MS', '2000'))
+app.config['BATCH_ZIP_DEFLATE'] = os.environ.get('PPT2PDF_BATCH_ZIP_DEFLATE', '0') == '1'
+app.config['INCREMENTAL_BATCH_ZIP'] = os.environ.get('PPT2PDF_INCREMENTAL_BATCH_ZIP', '0') == '1'
+app.config['API_MAX_WAIT_SECONDS'] = float(os.environ.get('PPT2PDF_API_MAX_WAIT_SECONDS', '60'))
+app.config['API_POLL_SECONDS'] = float(os.environ.get('PPT2PDF_API_POLL_SECONDS', '0.5'))
+app.config['WEBHOOK_SECRET'] = os.environ.get('PPT2PDF_WEBHOOK_SECRET', '')
+app.config['WEBHOOK_ATTEMPTS'] = int(os.environ.get('PPT2PDF_WEBHOOK_ATTEMPTS', '5'))
+app.config['WEBHOOK_ALLOW_PRIVATE'] = os.environ.get('PPT2PDF_WEBHOOK_ALLOW_PRIVATE', '0') == '1'
+app.config['SENDFILE'] = os.environ.get('PPT2PDF_SENDFILE', '').lower()
+app.config['X_ACCEL_PREFIX'] = os.environ.get('PPT2PDF_X_ACCEL_PREFIX', '/protected/')
+app.config['SOFFICE_PATH'] = os.environ.get('PPT2PDF_SOFFICE_PATH', 'soffice')
+app.config['FAKE_STARTUP_DELAY'] = float(os.environ.get('PPT2PDF_FAKE_STARTUP_DELAY', '2.0'))
+app.config['FAKE_CONVERT_DELAY'] = float(os.environ.get('PPT2PDF_FAKE_CONVERT_DELAY', '0.5'))
+app.config['FAKE_CONVERT_DELAY_PER_MB'] = float(os.environ.get('PPT2PDF_FAKE_CONVERT_DELAY_PER_MB', '0'))
+app.config['FAKE_HANG_PROBABILITY'] = float(os.environ.get('PPT2PDF_FAKE_HANG_PROBABILITY', '0'))
+
+
+def backend_options():
+    """Constructor options for the configured conversion backend"""
+    if app.config['CONVERTER_BACKEND'] == 'libreoffice':
+        return {'soffice_path': app.config['SOFFICE_PATH']}
+    if app.config['CONVERTER_BACKEND'] == 'fake':
+        return {
+            'startup_delay': app.config['FAKE_STARTUP_DELAY'],
+            'convert_delay': app.config['FAKE_CONVERT_DELAY'],
+            'convert_delay_per_mb': app.config['FAKE_CONVERT_DELAY_PER_MB'],
+            'hang_probability': app.config['FAKE_HANG_PROBABILITY']
+        }
+    return {}
+
+
+# Finished PDFs are cached by content hash so repeat uploads skip conversion
+conversion_cache = None
+if app.config['CACHE_ENABLED']:
+    conversion_cache = ConversionCache(
+        cache_dir=app.config['CACHE_DIR'],
+        max_bytes=app.config['CACHE_MAX_MB'] * 1024 * 1024
+    )
 
 # Initialize converter
-converter = SimplePPTConverter()
+converter = SimplePPTConverter(
+    upload_folder=app.config['UPLOAD_FOLDER'],
+    download_folder=app.config['DOWNLOAD_FOLDER'],
+    backend=app.config['CONVERTER_BACKEND'],
+    backend_options=backend_options(),
+    pool_size=app.config['CONVERTER_POOL_SIZE'],
+    max_jobs_per_worker=app.config['CONVERTER_MAX_JOBS_PER_WORKER'],
+    cache=conversion_cache,
+    max_file_size=app.config['MAX_FILE_MB'] * 1024 * 1024,
+    split_min_slides=app.config['SPLIT_MIN_SLIDES'],
+    split_max_parts=app.config['SPLIT_MAX_PARTS'],
+    preview_slides=app.config['PREVIEW_SLIDES'],
+    min_timeout=app.config['CONVERT_TIMEOUT_MIN'],
+    max_timeout=app.config['CONVERT_TIMEOUT_MAX'],
+    timeout_factor=app.config['CONVERT_TIMEOUT_FACTOR'],
+    default_profile=app.config['EXPORT_PROFILE'],
+    optimize=app.config['OPTIMIZE_PDF'],
+    max_slides=app.config['MAX_SLIDES'],
+    max_unpacked_size=app.config['MAX_UNPACKED_MB'] * 1024 * 1024,
+    max_compression_ratio=app.config['MAX_COMPRESSION_RATIO'],
+    slim_media=app.config['SLIM_MEDIA']
+)
+
+
+class UploadRequest(StreamingUploadRequest):
+    """Streams uploaded presentations directly into the converter's upload folder"""
+    converter = converter
+
+
+app.request_class = UploadRequest
+
+# Large files arrive as resumable chunked uploads; each chunk is one request
+if app.config['UPLOAD_CHUNK_MB'] * 1024 * 1024 > app.config['MAX_CONTENT_LENGTH']:
+    raise ValueError("PPT2PDF_UPLOAD_CHUNK_MB must not exceed PPT2PDF_MAX_REQUEST_MB")
+upload_sessions = UploadSessions(
+    session_dir=app.config['UPLOAD_SESSION_DIR'],
+    chunk_size=app.config['UPLOAD_CHUNK_MB'] * 1024 * 1024,
+    max_file_size=converter.max_file_size,
+    ttl=app.config['UPLOAD_SESSION_TTL'],
+    max_sessions=app.config['UPLOAD_MAX_SESSIONS']
+)
+
+# Conversion status for progress tracking, shared by all web workers
+job_store = create_job_store(
+    app.config['JOB_STORE'],
+    path=app.config['JOB_STORE_PATH'],
+    redis_url=app.config['REDIS_URL']
+)
+
+# In distributed mode uploads are put on a shared queue and converted by
+# worker.py processes; None converts in this process
+job_queue = create_job_queue(
+    app.config['JOB_QUEUE'],
+    spool_dir=app.config['SPOOL_DIR'],
+    redis_url=app.config['REDIS_URL']
+)
+
+# Identifies this process as the owner of the jobs it is running
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+# Job states in which a batch is waiting for or undergoing conversion
+ACTIVE_STATES = ('queued', 'validating', 'converting')
+FINISHED_STATES = ('completed', 'completed_with_errors', 'error')
+
+# Uploads are queued here instead of each getting its own thread
+scheduler = JobScheduler(
+    workers=app.config['SCHEDULER_WORKERS'],
+    max_queued=app.config['SCHEDULER_MAX_QUEUED']
+)
+
+# Files from all batches share one bounded executor; the converter pool
+# behind it decides how many engines actually run at once
+batch_executor = ThreadPoolExecutor(
+    max_workers=app.config['MAX_CONCURRENT_CONVERSIONS'],
+    thread_name_prefix='batch-item'
+)
+
+def job_files(job_id, job):
+    """Paths of the uploads, PDFs and batch archive belonging to a job"""
+    paths = [file_info['file_path'] for file_info in job.get('files', []) if file_info.get('file_path')]
+    if job.get('batch_mode', False):
+        paths.extend(result['pdf_path'] for result in job.get('results', []) if result.get('pdf_path'))
+        paths.append(batch_archive_path(job_id))
+    elif job.get('pdf_path'):
+        paths.append(job['pdf_path'])
+    return paths
+
+# Downloads carry content-hash ETags and can be handed to the front proxy
+if app.config['SENDFILE'] not in SENDFILE_MODES:
+    raise ValueError(f"Unknown PPT2PDF_SENDFILE mode: {app.config['SENDFILE']}")
+etags = ETagCache()
+
+# Completion notifications for API jobs with a callback URL
+webhooks = WebhookSender(
+    secret=app.config['WEBHOOK_SECRET'] or None,
+    attempts=app.config['WEBHOOK_ATTEMPTS'],
+    allow_private=app.config['WEBHOOK_ALLOW_PRIVATE']
+)
+
+# Expires finished jobs and deletes their files in the background
+reaper = Reaper(
+    job_store,
+    job_files,
+    roots=[app.config['UPLOAD_FOLDER'], app.config['DOWNLOAD_FOLDER']],
+    finished_statuses=FINISHED_STATES,
+    active_statuses=ACTIVE_STATES,
+    job_ttl=app.config['JOB_TTL_SECONDS'],
+    max_jobs=app.config['JOB_MAX_FINISHED'],
+    high_water=app.config['DISK_HIGH_WATER'],
+    low_water=app.config['DISK_LOW_WATER'],
+    min_age=app.config['JOB_MIN_RETENTION_SECONDS'],
+    interval=app.config['REAPER_INTERVAL']
+)
+
+# Live values read when /metrics is scraped
+Gauge('ppt2pdf_queue_depth', 'Jobs waiting for a worker', ['queue'], function=lambda: {
+    ('scheduler',): scheduler.stats()['queued'],
+    ('engine',): converter.pool_stats().get('queued', 0),
+    ('shared',): job_queue.qsize() if job_queue else 0,
+})
+Gauge('ppt2pdf_active_jobs', 'Uploads currently being processed',
+      function=lambda: scheduler.stats()['running'])
+Gauge('ppt2pdf_engine_workers', 'Conversion engine workers by state', ['state'], function=lambda: {
+    ('configured',): converter.pool_size,
+    ('healthy',): converter.pool_stats().get('healthy_workers', 0),
+    ('busy',): converter.pool_stats().get('busy_workers', 0),
+})
+Gauge('ppt2pdf_cache_lookups', 'Conversion cache lookups by outcome', ['outcome'], function=lambda: {
+    ('hit',): conversion_cache.stats()['hits'] if conversion_cache else 0,
+    ('miss',): conversion_cache.stats()['misses'] if conversion_cache else 0,
+})
+Gauge('ppt2pdf_cache_hit_ratio', 'Share of conversion cache lookups that were hits',
+      function=lambda: conversion_cache.stats()['hit_rate'] if conversion_cache else 0)
+Gauge('ppt2pdf_cache_bytes', 'Bytes held in the conversion cache',
+      function=lambda: conversion_cache.stats()['bytes'] if conversion_cache else 0)
+
+def owner_is_gone(job):
+    """
+    Decide whether the process that owned an active job has died. Owners on
+    this host are checked directly: jobs converted in a web process get no
+    heartbeat, so a long batch of a live sibling would look stale. Owners
+    elsewhere are gone once the job has not been updated for a while.
+    """
+    host, _, pid = (job.get('owner') or '').rpartition(':')
+    # os.kill(pid, 0) would send CTRL_C_EVENT on Windows; rely on staleness
+    if host == socket.gethostname() and pid.isdigit() and os.name != 'nt':
+        if int(pid) == os.getpid():
+            return False
+        try:
+            os.kill(int(pid), 0)
+            return False
+        except ProcessLookupError:
+            return True
+        except OSError:
+            return False
+    return time.time() - job.get('updated_at', 0) > app.config['JOB_STALE_SECONDS']
+
+def requeue_lost_job(job_id, job):
+    """
+    Put a queued batch back on the shared queue if it is no longer on it. A
+    worker removes the id from the queue before it records itself as owner,
+    so a worker dying in between would otherwise lose the batch.
+    """
+    if time.time() - job.get('updated_at', 0) <= app.config['JOB_STALE_SECONDS']:
+        return
+    if job_queue.position(job_id) is not None:
+        return
+    # Compare-and-set on the last update so only one process requeues it
+    requeued = job_store.transition(job_id, ('queued',), {
+        'message': f"Waiting to convert {job.get('total_files', 0)} files..."
+    }, expect={'owner': None, 'updated_at': job.get('updated_at')})
+    if requeued:
+        print(f"Requeueing lost batch {job_id}")
+        job_queue.put(job_id, job.get('lane', JobScheduler.BULK))
+
+def resume_interrupted_jobs():
+    """Requeue batches whose worker process died, e.g. across a restart"""
+    for job_id in job_store.ids_by_status(*ACTIVE_STATES):
+        job = job_store.get(job_id)
+        if job is None:
+            continue
+        # Jobs without an owner are waiting in the shared queue
+        if not job.get('owner'):
+            if job_queue is not None and job['status'] == 'queued':
+                requeue_lost_job(job_id, job)
+            continue
+        if not owner_is_gone(job):
+            continue
+
+        # Compare-and-set on the owner so only one process claims the job
+        claimed = job_store.transition(job_id, ACTIVE_STATES, {
+            'status': 'queued',
+            'owner': None if job_queue else WORKER_ID,
+            'message': 'Resuming conversion after a restart...'
+        }, expect={'owner': job.get('owner')})
+        if not claimed:
+            continue
+
+        print(f"Resuming interrupted batch {job_id}")
+        if job_queue is not None:
+            job_queue.put(job_id, job.get('lane', JobScheduler.BULK))
+            continue
+        try:
+            scheduler.submit(
+                job_id,
+                convert_batch_background,
+                args=(job_id, job['files']),
+                client=job.get('client', 'anonymous'),
+                lane=job.get('lane', JobScheduler.BULK),
+                cost=job.get('estimated_seconds', 0)
+            )
+        except QueueFullError:
+            job_store.update(job_id, {
+                'status': 'error',
+                'progress': 0,
+                'message': 'The server restarted while this batch was converting. Please upload again.'
+            })
 
-# Store conversion status for progress tracking
-conversion_status = {}
+recovery_done = False
+recovery_lock = threading.Lock()
+
+@app.before_request
+def recover_jobs_once():
+    """Resume interrupted batches and start the reaper once this process starts serving requests"""
+    global recovery_done
+    if recovery_done:
+        return
+    with recovery_lock:
+        if not recovery_done:
+            recovery_done = True
+            resume_interrupted_jobs()
+            reaper.start()
+
+@app.context_processor
+def export_profile_choices():
+    """Profiles offered on the upload form"""
+    return {'export_profiles': PROFILES.values(), 'default_profile': converter.default_profile}
+
+@app.context_processor
+def upload_limits():
+    """Limits the upload form checks before sending files"""
+    return {'max_file_mb': app.config['MAX_FILE_MB'], 'upload_chunk_size': upload_sessions.chunk_size}
 
 @app.route('/')
 def index():
@@ -50,23 +393,31 @@ def upload_file():
             flash('No valid files selected')
             return redirect(url_for('index'))
 
-        # Generate batch conversion ID for tracking
-        batch_id = str(int(time.time() * 1000))  # Use timestamp as batch ID
+        # Size/quality preset of the PDFs
+        profile = request.form.get('profile') or converter.default_profile
+        if profile not in PROFILES:
+            flash(f'Unknown export profile: {profile}')
+            return redirect(url_for('index'))
 
         # Save all uploaded files and prepare for conversion
         uploaded_files = []
         failed_uploads = []
 
         for file in valid_files:
-            success, file_path, error_msg = converter.save_uploaded_file(file)
+            with span('upload_save'):
+                success, file_path, error_msg, file_hash = converter.save_uploaded_file(file)
             if success:
                 uploaded_files.append({
                     'file_path': file_path,
-                    'original_filename': file.filename
+                    'original_filename': file.filename,
+                    'file_hash': file_hash
                 })
             else:
                 failed_uploads.append(f"{file.filename}: {error_msg}")
 
+        # Reject decks that must not reach an engine and estimate the rest
+        uploaded_files = preflight_uploads(uploaded_files, failed_uploads, profile)
+
         if not uploaded_files:
             flash(f'All file uploads failed: {"; ".join(failed_uploads)}')
             return redirect(url_for('index'))
@@ -74,113 +425,344 @@ def upload_file():
         if failed_uploads:
             flash(f'Some files failed to upload: {"; ".join(failed_uploads)}')
 
-        # Initialize batch conversion status
-        conversion_status[batch_id] = {
-            'status': 'starting',
-            'progress': 0,
-            'message': f'Preparing to convert {len(uploaded_files)} files...',
-            'batch_mode': True,
-            'total_files': len(uploaded_files),
-            'completed_files': 0,
-            'failed_files': 0,
-            'files': uploaded_files,
-            'results': [],
-            'failed_uploads': failed_uploads
-        }
-
-        # Start batch conversion in background thread
-        thread = threading.Thread(
-            target=convert_batch_background,
-            args=(batch_id, uploaded_files)
-        )
-        thread.daemon = True
-        thread.start()
+        try:
+            batch_id = submit_batch(uploaded_files, failed_uploads, profile,
+                                    client=request.remote_addr or 'anonymous')
+        except QueueFullError:
+            flash('The server is busy converting other files. Please try again in a minute.')
+            return render_template('index.html'), 429, {'Retry-After': '60'}
 
         # Redirect to progress page
         return redirect(url_for('progress', conversion_id=batch_id))
 
+    except RequestEntityTooLarge:
+        raise  # answered by too_large with the configured limit
     except Exception as e:
         flash(f'Error processing upload: {str(e)}')
         return redirect(url_for('index'))
 
-def convert_file_background(conversion_id, file_path, original_filename):
-    """Background function to handle file conversion"""
+@app.route('/uploads', methods=['POST'])
+def create_upload():
+    """Open a chunked upload: JSON {filename, size, sha256 (optional)}"""
+    data = request.get_json(silent=True) or {}
+    filename = data.get('filename') or ''
+    if not converter.allowed_file(filename):
+        return jsonify({'error': 'Invalid file type. Please upload a PPT or PPTX file.'}), 400
     try:
-        print(f"Starting background conversion for {conversion_id}: {file_path}")
-
-        # Update status to validating
-        conversion_status[conversion_id].update({
-            'status': 'validating',
-            'progress': 10,
-            'message': 'Validating file and checking PowerPoint...'
+        upload = upload_sessions.create(filename, data.get('size'), sha256=data.get('sha256'))
+    except UploadError as e:
+        return jsonify({'error': str(e)}), e.status
+    return jsonify(upload), 201, {'Location': url_for('upload_status', upload_id=upload['upload_id'])}
+
+@app.route('/uploads/<upload_id>', methods=['GET'])
+def upload_status(upload_id):
+    """Chunks received so far, for resuming an interrupted upload"""
+    upload = upload_sessions.get(upload_id)
+    if upload is None:
+        return jsonify({'error': 'Unknown or expired upload'}), 404
+    return jsonify(upload)
+
+@app.route('/uploads/<upload_id>', methods=['PUT'])
+def upload_chunk(upload_id):
+    """Store the chunk in the request body at ?offset=<bytes>"""
+    offset = request.args.get('offset', type=int)
+    if offset is None:
+        return jsonify({'error': 'offset is required'}), 400
+    if request.content_length is None:
+        return jsonify({'error': 'Content-Length is required'}), 411
+    try:
+        with span('upload_chunk'):
+            upload = upload_sessions.write_chunk(upload_id, offset, request.stream, request.content_length,
+                                                 sha256=request.headers.get('X-Chunk-SHA256'))
+    except UploadError as e:
+        return jsonify({'error': str(e)}), e.status
+    return jsonify(upload)
+
+@app.route('/uploads/<upload_id>', methods=['DELETE'])
+def cancel_upload(upload_id):
+    """Abandon a chunked upload and delete what was received"""
+    upload_sessions.discard(upload_id)
+    return '', 204
+
+@app.route('/uploads/finalize', methods=['POST'])
+def finalize_uploads():
+    """
+    Assemble completed chunked uploads and convert them as one batch:
+    JSON {uploads: [upload_id, ...], profile (optional)}
+    """
+    data = request.get_json(silent=True) or {}
+    upload_ids = data.get('uploads') or []
+    if not isinstance(upload_ids, list) or not upload_ids:
+        return jsonify({'error': 'No uploads given'}), 400
+    profile = data.get('profile') or converter.default_profile
+    if profile not in PROFILES:
+        return jsonify({'error': f'Unknown export profile: {profile}'}), 400
+
+    uploaded_files = []
+    failed_uploads = []
+    for upload_id in upload_ids:
+        upload = upload_sessions.get(str(upload_id))
+        if upload is None:
+            failed_uploads.append(f"{upload_id}: Unknown or expired upload")
+            continue
+        file_path = converter.new_upload_path(upload['filename'])
+        try:
+            with span('upload_assemble'):
+                original_filename, file_hash = upload_sessions.assemble(upload['upload_id'], file_path)
+        except UploadError as e:
+            failed_uploads.append(f"{upload['filename']}: {str(e)}")
+            continue
+        uploaded_files.append({
+            'file_path': file_path,
+            'original_filename': original_filename,
+            'file_hash': file_hash
         })
 
-        # Add a small delay to ensure status is updated
-        import time
-        time.sleep(0.5)
-
-        # Check PowerPoint availability first
-        available, error_msg = converter.check_powerpoint_availability()
-        if not available:
-            conversion_status[conversion_id].update({
-                'status': 'error',
-                'progress': 0,
-                'message': f'PowerPoint not available: {error_msg}'
-            })
-            return
+    # Reject decks that must not reach an engine and estimate the rest
+    uploaded_files = preflight_uploads(uploaded_files, failed_uploads, profile)
 
-        # Update status to converting
-        conversion_status[conversion_id].update({
-            'status': 'converting',
-            'progress': 30,
-            'message': 'Converting PowerPoint to PDF...'
-        })
+    if not uploaded_files:
+        return jsonify({'error': f'All file uploads failed: {"; ".join(failed_uploads)}',
+                        'failed_uploads': failed_uploads}), 400
 
-        time.sleep(0.5)
+    try:
+        batch_id = submit_batch(uploaded_files, failed_uploads, profile,
+                                client=request.remote_addr or 'anonymous')
+    except QueueFullError:
+        return jsonify({'error': 'The server is busy converting other files. Please try again in a minute.'}), \
+            429, {'Retry-After': '60'}
+
+    progress_url = url_for('progress', conversion_id=batch_id)
+    return jsonify({'conversion_id': batch_id, 'progress_url': progress_url, 'failed_uploads': failed_uploads}), \
+        202, {'Location': progress_url}
+
+def preflight_uploads(uploaded_files, failed_uploads, profile):
+    """
+    Inspect saved uploads before they are queued. Rejected files are removed
+    and reported in failed_uploads; the others get a cost estimate.
+
+    Returns:
+        list: the uploaded files that passed
+    """
+    accepted = []
+    for file_info in uploaded_files:
+        with span('preflight'):
+            info, error_msg = converter.inspect(file_info['file_path'])
+        if info is None:
+            failed_uploads.append(f"{file_info['original_filename']}: {error_msg}")
+            converter.cleanup_file(file_info['file_path'])
+            continue
+        file_info['preflight'] = info.to_dict()
+        # Cached files are served without an engine
+        if converter.is_cached(file_info.get('file_hash'), profile):
+            file_info['estimated_seconds'] = 0
+        else:
+            file_info['estimated_seconds'] = round(converter.estimate_seconds(info), 1)
+        accepted.append(file_info)
+    return accepted
+
+def submit_batch(uploaded_files, failed_uploads, profile, client='anonymous', callback_url=None):
+    """
+    Create a batch job for saved uploads and queue it for conversion
+
+    Args:
+        uploaded_files: Saved files ({'file_path', 'original_filename', 'file_hash'})
+        failed_uploads: Messages about files that were rejected
+        profile: Export profile name
+        client: Client the scheduler shares capacity fairly between
+        callback_url: Optional URL notified when the batch is finished
+
+    Returns:
+        str: the batch id
+
+    Raises:
+        QueueFullError: if the queue is full; the uploaded files are removed
+    """
+    # Small or quick uploads go to the interactive lane so they are not
+    # stuck behind large batches
+    estimated_seconds = sum(file_info.get('estimated_seconds', 0) for file_info in uploaded_files)
+    if len(uploaded_files) <= app.config['INTERACTIVE_MAX_FILES'] or \
+            estimated_seconds <= app.config['INTERACTIVE_MAX_SECONDS']:
+        lane = JobScheduler.INTERACTIVE
+    else:
+        lane = JobScheduler.BULK
+
+    # Initialize batch conversion status
+    job = {
+        'status': 'queued',
+        'progress': 0,
+        'message': f'Waiting to convert {len(uploaded_files)} files...',
+        'batch_mode': True,
+        'total_files': len(uploaded_files),
+        'completed_files': 0,
+        'failed_files': 0,
+        'files': uploaded_files,
+        'results': [],
+        'failed_uploads': failed_uploads,
+        'profile': profile,
+        'callback_url': callback_url,
+        'lane': lane,
+        'client': client,
+        'estimated_seconds': round(estimated_seconds, 1),
+        # Set by the worker node that claims the batch in distributed mode
+        'owner': None if job_queue else WORKER_ID,
+        'created_at': time.time()
+    }
+
+    if job_queue is not None and job_queue.qsize() >= app.config['SCHEDULER_MAX_QUEUED']:
+        for file_info in uploaded_files:
+            converter.cleanup_file(file_info['file_path'])
+        raise QueueFullError(f"Conversion queue is full ({job_queue.qsize()} jobs waiting)")
+
+    # Generate batch conversion ID for tracking (timestamp based; bumped
+    # if another worker created a batch in the same millisecond)
+    batch_id = int(time.time() * 1000)
+    while not job_store.create(str(batch_id), job):
+        batch_id += 1
+    batch_id = str(batch_id)
+
+    if job_queue is not None:
+        job_queue.put(batch_id, lane)
+        return batch_id
+
+    # Queue the batch; a worker of the scheduler runs the conversion
+    try:
+        scheduler.submit(
+            batch_id,
+            convert_batch_background,
+            args=(batch_id, uploaded_files),
+            client=client,
+            lane=lane,
+            cost=estimated_seconds
+        )
+    except QueueFullError:
+        job_store.delete(batch_id)
+        for file_info in uploaded_files:
+            converter.cleanup_file(file_info['file_path'])
+        raise
+    return batch_id
+
+# Batch archives built while conversions finish; one lock per batch keeps
+# concurrent items from appending at the same time
+archive_locks = {}
+archive_locks_guard = threading.Lock()
+
+def batch_zip_compression():
+    return zipfile.ZIP_DEFLATED if app.config['BATCH_ZIP_DEFLATE'] else zipfile.ZIP_STORED
+
+def batch_archive_path(batch_id):
+    return os.path.join(converter.download_folder, 'archives', f'{batch_id}.zip')
+
+def add_to_batch_archive(batch_id, pdf_path, pdf_filename):
+    """Append a finished PDF to the batch's prebuilt archive"""
+    with archive_locks_guard:
+        lock = archive_locks.setdefault(batch_id, threading.Lock())
+
+    archive_path = batch_archive_path(batch_id)
+    with lock:
+        job = job_store.get(batch_id)
+        if job is None or job.get('archive_failed'):
+            return
+        try:
+            os.makedirs(os.path.dirname(archive_path), exist_ok=True)
+            append_to_archive(archive_path, pdf_path, pdf_filename, compression=batch_zip_compression())
+        except Exception as e:
+            # e.g. an archive left truncated by a crash; downloads fall back to streaming
+            print(f"Could not add {pdf_filename} to batch archive: {str(e)}")
+            converter.cleanup_file(archive_path)
+            job_store.update(batch_id, {'archive_failed': True})
+
+def rebuild_batch_archive(batch_id, job):
+    """
+    Start a resumed batch's archive over from the results it already has. A
+    PDF appended just before the process died, with its result not yet
+    recorded, would otherwise be converted and appended a second time.
+    """
+    converter.cleanup_file(batch_archive_path(batch_id))
+    for result in job['results']:
+        if result['status'] == 'success':
+            add_to_batch_archive(batch_id, result['pdf_path'], result['pdf_filename'])
+
+def convert_batch_item(batch_id, index, file_info):
+    """Convert one file of a batch and record its result at the file's index"""
+    file_path = file_info['file_path']
+    original_filename = file_info['original_filename']
+
+    def mark_converting(job):
+        job['results'][index]['status'] = 'converting'
+        job['results'][index]['started_at'] = time.time()
+        job['message'] = f'Converting {original_filename}...'
+    job = job_store.modify(batch_id, mark_converting)
+
+    print(f"Converting file {index+1}/{len(job['files']) if job else '?'}: {original_filename}")
+
+    # Slide ranges that finish early are published for /preview
+    def publish_pages(first_slide, last_slide, part_path, pages):
+        def add_part(job):
+            result = job['results'][index]
+            parts = result.get('preview_parts', []) + [
+                {'first_slide': first_slide, 'last_slide': last_slide, 'path': part_path, 'pages': pages}
+            ]
+            parts.sort(key=lambda part: part['first_slide'])
+            result['preview_parts'] = parts
+            result['preview_pages'] = sum(part['pages'] for part in contiguous_parts(parts))
+        job_store.modify(batch_id, add_part)
+
+    # Bytes the post-processing stage took off the PDF
+    optimization = {}
+    def record_optimization(size_before, size_after):
+        optimization['bytes_saved'] = size_before - size_after
 
-        # Perform direct conversion
-        print(f"Starting conversion: {file_path} -> PDF")
+    try:
         success, pdf_path, error_msg = converter.convert_ppt_to_pdf(
             file_path,
-            original_filename
+            original_filename,
+            file_hash=file_info.get('file_hash'),
+            on_pages=publish_pages if app.config['PREVIEW_SLIDES'] > 0 else None,
+            profile=job.get('profile') if job else None,
+            on_optimized=record_optimization
         )
+    except Exception as e:
+        success, pdf_path, error_msg = False, None, f'Conversion error: {str(e)}'
+
+    if success:
+        result = {
+            'original_filename': original_filename,
+            'pdf_path': pdf_path,
+            'pdf_filename': os.path.basename(pdf_path),
+            'pdf_size': os.path.getsize(pdf_path),
+            'pdf_sha256': hash_file(pdf_path),
+            'status': 'success'
+        }
+        result.update(optimization)
+        print(f"✓ Conversion successful: {original_filename} -> {pdf_path}")
+    else:
+        result = {
+            'original_filename': original_filename,
+            'error_message': error_msg,
+            'status': 'failed'
+        }
+        print(f"✗ Conversion failed: {original_filename} - {error_msg}")
 
-        if success:
-            print(f"Conversion successful: {pdf_path}")
-            conversion_status[conversion_id].update({
-                'status': 'completed',
-                'progress': 100,
-                'message': 'Conversion completed successfully!',
-                'pdf_path': pdf_path,
-                'pdf_filename': os.path.basename(pdf_path)
-            })
-        else:
-            print(f"Conversion failed: {error_msg}")
-            conversion_status[conversion_id].update({
-                'status': 'error',
-                'progress': 0,
-                'message': error_msg or 'Conversion failed'
-            })
-
-        # Clean up uploaded file
-        print(f"Cleaning up uploaded file: {file_path}")
-        converter.cleanup_file(file_path)
+    # Clean up uploaded file
+    print(f"Cleaning up uploaded file: {file_path}")
+    converter.cleanup_file(file_path)
 
-    except Exception as e:
-        error_message = f'Conversion error: {str(e)}'
-        print(f"Background conversion error: {error_message}")
-        conversion_status[conversion_id].update({
-            'status': 'error',
-            'progress': 0,
-            'message': error_message
-        })
+    if success and app.config['INCREMENTAL_BATCH_ZIP']:
+        add_to_batch_archive(batch_id, pdf_path, result['pdf_filename'])
 
-        # Clean up uploaded file
-        try:
-            converter.cleanup_file(file_path)
-        except Exception as cleanup_error:
-            print(f"Error during cleanup: {str(cleanup_error)}")
-            pass
+    # Results may arrive out of order; the slot keeps /download/<id>/<index> stable
+    def progress_fields(job):
+        finished = job['completed_files'] + job['failed_files']
+        return {
+            'progress': 10 + (finished * 80 // job['total_files']),
+            'message': f'Converted {finished}/{job["total_files"]} files...'
+        }
+    job_store.set_result(
+        batch_id, index, result,
+        increments={'completed_files' if success else 'failed_files': 1},
+        fields=progress_fields
+    )
 
 def convert_batch_background(batch_id, uploaded_files):
     """Background function to handle batch file conversion"""
@@ -188,102 +770,98 @@ def convert_batch_background(batch_id, uploaded_files):
         print(f"Starting batch conversion for {batch_id}: {len(uploaded_files)} files")
 
         # Update status to validating
-        conversion_status[batch_id].update({
+        job = job_store.update(batch_id, {
             'status': 'validating',
             'progress': 5,
-            'message': 'Validating files and checking PowerPoint...'
+            'message': 'Validating files and checking PowerPoint...',
+            'owner': WORKER_ID
         })
+        profile = job.get('profile') if job else None
 
-        # Check PowerPoint availability first
-        available, error_msg = converter.check_powerpoint_availability()
+        # Check PowerPoint availability first, unless every file is cached
+        needs_engine = not all(converter.is_cached(file_info.get('file_hash'), profile)
+                               for file_info in uploaded_files)
+        available, error_msg = converter.check_powerpoint_availability() if needs_engine else (True, None)
         if not available:
-            conversion_status[batch_id].update({
+            job_store.update(batch_id, {
                 'status': 'error',
                 'progress': 0,
                 'message': f'PowerPoint not available: {error_msg}'
             })
             return
 
-        # Update status to converting
-        conversion_status[batch_id].update({
-            'status': 'converting',
-            'progress': 10,
-            'message': f'Converting {len(uploaded_files)} files...'
-        })
-
-        time.sleep(0.5)
-
-        # Process each file
-        completed_files = 0
-        failed_files = 0
-        results = []
-
-        for i, file_info in enumerate(uploaded_files):
-            file_path = file_info['file_path']
-            original_filename = file_info['original_filename']
-
-            # Update progress for current file
-            current_progress = 10 + (i * 80 // len(uploaded_files))
-            conversion_status[batch_id].update({
-                'progress': current_progress,
-                'message': f'Converting {original_filename} ({i+1}/{len(uploaded_files)})...'
-            })
-
-            print(f"Converting file {i+1}/{len(uploaded_files)}: {original_filename}")
-
-            # Perform conversion
-            success, pdf_path, error_msg = converter.convert_ppt_to_pdf(
-                file_path,
-                original_filename
-            )
-
-            if success:
-                completed_files += 1
-                results.append({
-                    'original_filename': original_filename,
-                    'pdf_path': pdf_path,
-                    'pdf_filename': os.path.basename(pdf_path),
-                    'status': 'success'
-                })
-                print(f"✓ Conversion successful: {original_filename} -> {pdf_path}")
-            else:
-                failed_files += 1
-                results.append({
-                    'original_filename': original_filename,
-                    'error_message': error_msg,
-                    'status': 'failed'
-                })
-                print(f"✗ Conversion failed: {original_filename} - {error_msg}")
-
-            # Clean up uploaded file
-            print(f"Cleaning up uploaded file: {file_path}")
-            converter.cleanup_file(file_path)
-
-            # Update batch status
-            conversion_status[batch_id].update({
-                'completed_files': completed_files,
-                'failed_files': failed_files,
-                'results': results
+        # Reserve one result slot per file so indexes match the upload order.
+        # A batch resumed after a restart keeps the results it already has.
+        def start_converting(job):
+            if not job['results']:
+                job['results'] = [
+                    {'original_filename': file_info['original_filename'], 'status': 'pending'}
+                    for file_info in uploaded_files
+                ]
+            for result in job['results']:
+                if result['status'] == 'converting':
+                    result['status'] = 'pending'
+                    result.pop('preview_parts', None)
+                    result.pop('preview_pages', None)
+            job.update({
+                'status': 'converting',
+                'progress': 10,
+                'message': f'Converting {len(uploaded_files)} files...'
             })
+        job = job_store.modify(batch_id, start_converting)
+        if job is None:
+            print(f"Batch {batch_id} disappeared before conversion started")
+            return
+        if app.config['INCREMENTAL_BATCH_ZIP'] and os.path.exists(batch_archive_path(batch_id)):
+            rebuild_batch_archive(batch_id, job)
+
+        # Dispatch files to the shared executor, shortest first; the
+        # semaphore keeps one batch from occupying every global slot
+        batch_slots = threading.BoundedSemaphore(app.config['BATCH_MAX_PARALLEL'])
+        futures = []
+        order = sorted(range(len(uploaded_files)),
+                       key=lambda i: uploaded_files[i].get('estimated_seconds', 0))
+        for i in order:
+            file_info = uploaded_files[i]
+            if job['results'][i]['status'] != 'pending':
+                continue
+            batch_slots.acquire()
+            future = batch_executor.submit(convert_batch_item, batch_id, i, file_info)
+            future.add_done_callback(lambda _: batch_slots.release())
+            futures.append(future)
+
+        for future in futures:
+            future.result()
+
+        job = job_store.get(batch_id)
+        completed_files = job['completed_files']
+        failed_files = job['failed_files']
+
+        # The prebuilt archive now holds every successful file
+        with archive_locks_guard:
+            archive_locks.pop(batch_id, None)
+        if app.config['INCREMENTAL_BATCH_ZIP'] and not job.get('archive_failed') \
+                and os.path.exists(batch_archive_path(batch_id)):
+            job_store.update(batch_id, {'archive_path': os.path.abspath(batch_archive_path(batch_id))})
 
         # Final status update
         if failed_files == 0:
             # All files converted successfully
-            conversion_status[batch_id].update({
+            job_store.update(batch_id, {
                 'status': 'completed',
                 'progress': 100,
                 'message': f'All {completed_files} files converted successfully!'
             })
         elif completed_files == 0:
             # All files failed
-            conversion_status[batch_id].update({
+            job_store.update(batch_id, {
                 'status': 'error',
                 'progress': 0,
                 'message': f'All {failed_files} files failed to convert'
             })
         else:
             # Mixed results
-            conversion_status[batch_id].update({
+            job_store.update(batch_id, {
                 'status': 'completed_with_errors',
                 'progress': 100,
                 'message': f'Batch completed: {completed_files} successful, {failed_files} failed'
@@ -294,7 +872,7 @@ def convert_batch_background(batch_id, uploaded_files):
     except Exception as e:
         error_message = f'Batch conversion error: {str(e)}'
         print(f"Batch conversion error: {error_message}")
-        conversion_status[batch_id].update({
+        job_store.update(batch_id, {
             'status': 'error',
             'progress': 0,
             'message': error_message
@@ -308,33 +886,281 @@ def convert_batch_background(batch_id, uploaded_files):
             print(f"Error during batch cleanup: {str(cleanup_error)}")
             pass
 
+    finally:
+        notify_finished(batch_id)
+
+def job_summary(job_id, job):
+    """Public view of a job for API clients and webhooks, without server paths"""
+    files = []
+    for index, file_info in enumerate(job.get('files', [])):
+        results = job.get('results', [])
+        result = results[index] if index < len(results) else {'status': 'pending'}
+        entry = {
+            'index': index,
+            'filename': file_info['original_filename'],
+            'status': result['status'],
+        }
+        if 'preflight' in file_info:
+            entry.update(slide_count=file_info['preflight'].get('slide_count'),
+                         estimated_seconds=file_info.get('estimated_seconds'))
+        if result['status'] == 'success':
+            entry.update(
+                pdf_filename=result['pdf_filename'],
+                pdf_size=result.get('pdf_size'),
+                bytes_saved=result.get('bytes_saved', 0),
+                result_url=f'/api/jobs/{job_id}/result?file={index}'
+            )
+        elif result['status'] == 'failed':
+            entry['error'] = result.get('error_message')
+        files.append(entry)
+
+    summary = {
+        'id': job_id,
+        'status': job['status'],
+        'progress': job.get('progress', 0),
+        'message': job.get('message'),
+        'profile': job.get('profile'),
+        'total_files': job.get('total_files', len(files)),
+        'completed_files': job.get('completed_files', 0),
+        'failed_files': job.get('failed_files', 0),
+        'rejected_uploads': job.get('failed_uploads', []),
+        'files': files,
+        'created_at': job.get('created_at'),
+        'updated_at': job.get('updated_at'),
+    }
+    if job['status'] in ('completed', 'completed_with_errors'):
+        summary['result_url'] = f'/api/jobs/{job_id}/result'
+    if 'queue_position' in job:
+        summary['queue_position'] = job['queue_position']
+    if 'eta_seconds' in job:
+        summary['eta_seconds'] = job['eta_seconds']
+    return summary
+
+def notify_finished(batch_id):
+    """Send the completion webhook of a finished batch, if it asked for one"""
+    job = job_store.get(batch_id)
+    if job is not None and job.get('callback_url') and job['status'] in FINISHED_STATES:
+        webhooks.send(job['callback_url'], job_summary(batch_id, job))
+
 @app.route('/progress/<conversion_id>')
 def progress(conversion_id):
     """Show conversion progress page"""
-    if conversion_id not in conversion_status:
+    if conversion_id not in job_store:
         flash('Invalid conversion ID')
         return redirect(url_for('index'))
     
     return render_template('progress.html', conversion_id=conversion_id)
 
+def remaining_seconds(job):
+    """Estimated engine seconds until a batch has converted all its files"""
+    parallel = max(1, min(app.config['BATCH_MAX_PARALLEL'], app.config['CONVERTER_POOL_SIZE']))
+    now = time.time()
+    remaining = 0.0
+    results = job.get('results') or []
+    for index, file_info in enumerate(job.get('files', [])):
+        estimate = file_info.get('estimated_seconds')
+        if estimate is None:
+            return None  # queued before preflight estimates existed
+        result = results[index] if index < len(results) else {'status': 'pending'}
+        if result['status'] == 'pending':
+            remaining += estimate
+        elif result['status'] == 'converting':
+            remaining += max(0.0, estimate - (now - result.get('started_at', now)))
+    return remaining / parallel
+
+def public_status(conversion_id, status):
+    """Add live scheduler information and an ETA to a stored job status"""
+    if status['status'] == 'queued':
+        if job_queue is not None:
+            position = job_queue.position(conversion_id)
+            wait = None
+        else:
+            position = scheduler.position(conversion_id)
+            wait = scheduler.eta(conversion_id)
+        if position is not None:
+            status = dict(status, queue_position=position,
+                          message=f'Waiting in queue (position {position})...')
+        remaining = remaining_seconds(status)
+        if wait is not None and remaining is not None:
+            status = dict(status, eta_seconds=round(wait + remaining))
+    elif status['status'] in ACTIVE_STATES:
+        remaining = remaining_seconds(status)
+        if remaining is not None:
+            status = dict(status, eta_seconds=round(remaining))
+    return status
+
 @app.route('/status/<conversion_id>')
 def get_status(conversion_id):
     """API endpoint to get conversion status"""
-    if conversion_id not in conversion_status:
+    status = job_store.get(conversion_id)
+    if status is None:
+        return jsonify({'error': 'Invalid conversion ID'}), 404
+
+    return jsonify(public_status(conversion_id, status))
+
+def contiguous_parts(parts):
+    """Leading preview parts (sorted by slide) without a gap from slide 1"""
+    next_slide = 1
+    for part in parts:
+        if part['first_slide'] != next_slide:
+            break
+        yield part
+        next_slide = part['last_slide'] + 1
+
+@app.route('/preview/<conversion_id>/<int:page>')
+def preview_page(conversion_id, page):
+    """
+    Serve one finished page (1-based) as a single page PDF, while the rest of
+    the presentation may still be converting. ?file=<index> picks the file
+    of a batch.
+    """
+    status = job_store.get(conversion_id)
+    if status is None:
+        return jsonify({'error': 'Invalid conversion ID'}), 404
+    if not can_merge():
+        return jsonify({'error': 'Previews are not available on this server'}), 404
+
+    file_index = request.args.get('file', 0, type=int)
+    results = status.get('results') or []
+    if not 0 <= file_index < len(results) or page < 1:
+        return jsonify({'error': 'Invalid file or page'}), 404
+    result = results[file_index]
+
+    # Find the PDF holding the page: the finished file, or an early part
+    source = None
+    if result.get('status') == 'success':
+        source = (result['pdf_path'], page - 1)
+    else:
+        offset = 0
+        for part in contiguous_parts(result.get('preview_parts', [])):
+            if page <= offset + part['pages']:
+                source = (part['path'], page - offset - 1)
+                break
+            offset += part['pages']
+
+    data = None
+    if source is not None:
+        try:
+            data = extract_page(*source)
+        except Exception:
+            # Past the last page, or a part replaced by the finished PDF
+            data = None
+    if data is None:
+        return jsonify({
+            'error': 'Page not converted yet',
+            'preview_pages': result.get('preview_pages', 0)
+        }), 404
+
+    return Response(data, mimetype='application/pdf', headers={
+        'Content-Disposition': f'inline; filename="page-{page}.pdf"'
+    })
+
+def sse_event(event, data):
+    """Format one Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.route('/events/<conversion_id>')
+def status_events(conversion_id):
+    """
+    Server-Sent Events stream of status changes. The first message is the
+    full status; later messages only carry the fields and file results
+    that changed.
+    """
+    if job_store.get(conversion_id) is None:
         return jsonify({'error': 'Invalid conversion ID'}), 404
-    
-    status = conversion_status[conversion_id]
-    return jsonify(status)
+
+    def stream():
+        # Ask the browser to wait a little before reconnecting after a drop
+        yield f"retry: {app.config['SSE_RETRY_MS']}\n\n"
+
+        sent = None
+        seen_count = job_store.change_count(conversion_id)
+        last_message_at = time.time()
+        while True:
+            status = job_store.get(conversion_id)
+            if status is None:
+                yield sse_event('gone', {})
+                return
+            status = public_status(conversion_id, status)
+            status.pop('files', None)
+
+            if sent is None:
+                yield sse_event('snapshot', status)
+                last_message_at = time.time()
+            else:
+                delta = status_delta(sent, status)
+                if delta:
+                    yield sse_event('update', delta)
+                    last_message_at = time.time()
+            sent = status
+
+            if status['status'] in FINISHED_STATES:
+                return
+
+            if time.time() - last_message_at >= app.config['SSE_KEEPALIVE_SECONDS']:
+                yield ": keepalive\n\n"
+                last_message_at = time.time()
+
+            # Local changes wake us immediately; changes made by other
+            # processes are picked up by the periodic re-read
+            seen_count = job_store.wait_for_change(
+                conversion_id, seen_count, app.config['SSE_RECHECK_SECONDS'])
+
+    return Response(stream(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+def status_delta(old, new):
+    """
+    Compute the difference between two status snapshots
+
+    Returns:
+        dict: {'fields': {...}, 'results': {index: result}} or None if equal
+    """
+    delta = {}
+    fields = {
+        key: value for key, value in new.items()
+        if key != 'results' and old.get(key) != value
+    }
+    removed = [key for key in old if key not in new]
+    if fields:
+        delta['fields'] = fields
+    if removed:
+        delta['removed'] = removed
+
+    old_results = old.get('results') or []
+    new_results = new.get('results') or []
+    changed_results = {
+        index: result for index, result in enumerate(new_results)
+        if index >= len(old_results) or old_results[index] != result
+    }
+    if changed_results:
+        delta['results'] = changed_results
+        delta['results_length'] = len(new_results)
+
+    return delta or None
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus metrics endpoint"""
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/cache/stats')
+def cache_stats():
+    """API endpoint exposing conversion cache hit/miss counters"""
+    if conversion_cache is None:
+        return jsonify({'enabled': False})
+    return jsonify(dict(conversion_cache.stats(), enabled=True))
 
 @app.route('/download/<conversion_id>')
 def download_file(conversion_id):
     """Download converted PDF file or batch of files"""
-    if conversion_id not in conversion_status:
+    status = job_store.get(conversion_id)
+    if status is None:
         flash('Invalid conversion ID')
         return redirect(url_for('index'))
 
-    status = conversion_status[conversion_id]
-
     # Handle batch downloads (ZIP file)
     if status.get('batch_mode', False):
         return download_batch(conversion_id, status)
@@ -347,12 +1173,8 @@ def download_file(conversion_id):
     try:
         pdf_path = status['pdf_path']
         if os.path.exists(pdf_path):
-            return send_file(
-                pdf_path,
-                as_attachment=True,
-                download_name=status['pdf_filename'],
-                mimetype='application/pdf'
-            )
+            return serve_file(pdf_path, status['pdf_filename'], 'application/pdf',
+                              digest=status.get('pdf_sha256'))
         else:
             flash('File not found')
             return redirect(url_for('index'))
@@ -364,12 +1186,11 @@ def download_file(conversion_id):
 @app.route('/download/<conversion_id>/<int:file_index>')
 def download_individual_file(conversion_id, file_index):
     """Download individual PDF file from batch conversion"""
-    if conversion_id not in conversion_status:
+    status = job_store.get(conversion_id)
+    if status is None:
         flash('Invalid conversion ID')
         return redirect(url_for('index'))
 
-    status = conversion_status[conversion_id]
-
     # Check if it's a batch conversion
     if not status.get('batch_mode', False):
         flash('Invalid download request')
@@ -396,12 +1217,8 @@ def download_individual_file(conversion_id, file_index):
     try:
         pdf_path = result['pdf_path']
         if os.path.exists(pdf_path):
-            return send_file(
-                pdf_path,
-                as_attachment=True,
-                download_name=result['pdf_filename'],
-                mimetype='application/pdf'
-            )
+            return serve_file(pdf_path, result['pdf_filename'], 'application/pdf',
+                              digest=result.get('pdf_sha256'))
         else:
             flash(f'PDF file not found: {result["pdf_filename"]}')
             return redirect(url_for('progress', conversion_id=conversion_id))
@@ -410,41 +1227,87 @@ def download_individual_file(conversion_id, file_index):
         flash(f'Error downloading file: {str(e)}')
         return redirect(url_for('progress', conversion_id=conversion_id))
 
-def download_batch(conversion_id, status):
-    """Handle batch download - create ZIP file with all PDFs"""
-    import zipfile
-    import tempfile
+def serve_file(path, download_name, mimetype, digest=None):
+    """
+    Send a finished file as a download with a content-hash ETag. Conditional
+    requests are answered with 304 and Range requests with the requested
+    bytes; with PPT2PDF_SENDFILE the front proxy sends the file instead.
+
+    Args:
+        path: The file
+        download_name: File name offered to the client
+        mimetype: Content type
+        digest: SHA-256 of the file if already known
+    """
+    etag = etags.etag(path, digest)
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+
+    headers = offload_headers(path, app.config['SENDFILE'], app.config['X_ACCEL_PREFIX'],
+                              converter.download_folder)
+    if headers is not None:
+        response = Response(mimetype=mimetype, headers=headers)
+        response.headers['Content-Disposition'] = attachment_header(download_name)
+        response.set_etag(etag)
+        return response
 
+    try:
+        response = send_file(path, as_attachment=True, download_name=download_name, mimetype=mimetype,
+                             etag=etag, conditional=True)
+    except RequestedRangeNotSatisfiable as e:
+        return e.get_response()
+    response.accept_ranges = 'bytes'
+    return response
+
+def download_batch(conversion_id, status):
+    """Handle batch download - stream a ZIP file with all PDFs"""
     try:
         if status['status'] not in ['completed', 'completed_with_errors']:
             flash('Batch conversion not ready for download')
             return redirect(url_for('progress', conversion_id=conversion_id))
 
         # Get successful conversions
-        successful_results = [r for r in status.get('results', []) if r['status'] == 'success']
+        successful_results = [
+            r for r in status.get('results', [])
+            if r['status'] == 'success' and os.path.exists(r['pdf_path'])
+        ]
 
         if not successful_results:
             flash('No files were successfully converted')
             return redirect(url_for('progress', conversion_id=conversion_id))
 
-        # Create temporary ZIP file
-        temp_zip = tempfile.NamedTemporaryFile(delete=False, suffix='.zip')
-        temp_zip.close()
-
-        with zipfile.ZipFile(temp_zip.name, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            for result in successful_results:
-                pdf_path = result['pdf_path']
-                if os.path.exists(pdf_path):
-                    # Add file to ZIP with original name
-                    zipf.write(pdf_path, result['pdf_filename'])
-
-        # Send ZIP file
-        return send_file(
-            temp_zip.name,
-            as_attachment=True,
-            download_name=f'converted_pdfs_{conversion_id}.zip',
-            mimetype='application/zip'
+        # Serve the archive assembled during conversion when there is one
+        archive_path = status.get('archive_path')
+        if archive_path and os.path.exists(archive_path):
+            return serve_file(archive_path, f'converted_pdfs_{conversion_id}.zip', 'application/zip')
+
+        # Add files to ZIP with their original names, numbering duplicates
+        arcnames = unique_arcnames([r['pdf_filename'] for r in successful_results])
+        members = [(arcname, r['pdf_path']) for arcname, r in zip(arcnames, successful_results)]
+
+        # The same PDFs give an equivalent archive, so a weak ETag lets
+        # clients revalidate it; ranges need a file and are not offered
+        etag = combined_etag([arcname + ':' + etags.etag(r['pdf_path'], r.get('pdf_sha256'))
+                              for arcname, r in zip(arcnames, successful_results)]
+                             + [str(batch_zip_compression())])
+        if request.if_none_match.contains_weak(etag):
+            response = Response(status=304)
+            response.set_etag(etag, weak=True)
+            return response
+
+        # The archive is generated while it is sent: nothing is written to
+        # disk and the first bytes go out immediately
+        response = Response(
+            stream_zip(members, compression=batch_zip_compression()),
+            mimetype='application/zip',
+            headers={
+                'Content-Disposition': f'attachment; filename=converted_pdfs_{conversion_id}.zip'
+            }
         )
+        response.set_etag(etag, weak=True)
+        return response
 
     except Exception as e:
         flash(f'Error creating batch download: {str(e)}')
@@ -453,29 +1316,21 @@ def download_batch(conversion_id, status):
 @app.route('/cleanup/<conversion_id>')
 def cleanup_conversion(conversion_id):
     """Clean up conversion files and status"""
-    if conversion_id in conversion_status:
-        status = conversion_status[conversion_id]
-
-        # Handle batch cleanup
-        if status.get('batch_mode', False):
-            # Clean up all PDF files from batch
-            for result in status.get('results', []):
-                if result['status'] == 'success' and 'pdf_path' in result:
-                    converter.cleanup_file(result['pdf_path'])
-        else:
-            # Clean up single PDF file
-            if 'pdf_path' in status:
-                converter.cleanup_file(status['pdf_path'])
+    status = job_store.get(conversion_id)
+    if status is not None:
+        # Uploads, PDFs and the batch archive
+        for path in job_files(conversion_id, status):
+            converter.cleanup_file(path)
 
         # Remove from status tracking
-        del conversion_status[conversion_id]
+        job_store.delete(conversion_id)
 
     return redirect(url_for('index'))
 
 @app.errorhandler(413)
 def too_large(e):
     """Handle file too large error"""
-    flash('File is too large. Maximum size is 50MB.')
+    flash(f"File is too large. Maximum size is {app.config['MAX_CONTENT_LENGTH'] // (1024 * 1024)}MB.")
     return redirect(url_for('index'))
 
 @app.errorhandler(500)
@@ -489,21 +1344,25 @@ if __name__ == '__main__':
     print("=" * 50)
 
     # Create necessary directories
-    os.makedirs('uploads', exist_ok=True)
-    os.makedirs('downloads', exist_ok=True)
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    os.makedirs(app.config['DOWNLOAD_FOLDER'], exist_ok=True)
     os.makedirs('templates', exist_ok=True)
     os.makedirs('static', exist_ok=True)
     print("✓ Directories created/verified")
 
-    # Check PowerPoint availability at startup
-    print("Checking PowerPoint availability...")
-    available, error_msg = converter.check_powerpoint_availability()
-    if available:
-        print("✓ PowerPoint is available and ready")
+    if job_queue is not None:
+        # Engines run on the worker nodes, not here
+        print(f"✓ Conversions are queued for worker nodes ({app.config['JOB_QUEUE']} queue)")
     else:
-        print(f"⚠ WARNING: PowerPoint check failed: {error_msg}")
-        print("The application will start, but conversions may fail.")
-        print("Please ensure Microsoft PowerPoint is properly installed.")
+        # Check PowerPoint availability at startup
+        print("Checking PowerPoint availability...")
+        available, error_msg = converter.check_powerpoint_availability()
+        if available:
+            print("✓ PowerPoint is available and ready")
+        else:
+            print(f"⚠ WARNING: PowerPoint check failed: {error_msg}")
+            print("The application will start, but conversions may fail.")
+            print("Please ensure Microsoft PowerPoint is properly installed.")
 
     print("=" * 50)
     print("Application starting...")
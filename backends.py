@@ -0,0 +1,588 @@
+"""
+Conversion Backends
+Engines that turn a PowerPoint file into a PDF. Each backend instance owns one
+running engine (a PowerPoint application or a LibreOffice listener) and is
+driven by a single worker thread of the converter pool.
+"""
+
+import json
+import os
+import random
+import shutil
+import signal
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+
+from export_profiles import get_profile
+from metrics import OPEN_ATTEMPTS_TOTAL, span
+from split_export import count_slides
+
+try:
+    import pythoncom
+    import win32com.client
+    import win32process
+except ImportError:  # pywin32 is only available on Windows
+    pythoncom = None
+    win32com = None
+    win32process = None
+
+try:
+    import uno
+    from com.sun.star.beans import PropertyValue
+except ImportError:  # Python-UNO bridge ships with LibreOffice, not with pip
+    uno = None
+    PropertyValue = None
+
+
+class EngineFault(Exception):
+    """Raised when the engine itself is broken and must be recycled"""
+
+
+class ConversionBackend:
+    """Base class for conversion engines"""
+
+    name = 'base'
+
+    # Whether convert() can export a range of slides on its own
+    supports_slide_ranges = False
+
+    def start(self):
+        """Start the engine. Called once from the owning worker thread."""
+        raise NotImplementedError
+
+    def stop(self):
+        """Shut the engine down. Must never raise."""
+        raise NotImplementedError
+
+    def is_healthy(self):
+        """Return True if the engine is still able to accept work"""
+        raise NotImplementedError
+
+    def describe(self):
+        """Return a short human readable description of the running engine"""
+        return self.name
+
+    def kill(self):
+        """
+        Forcibly end a hung engine. Called from the watchdog thread while the
+        owning worker may be blocked inside convert(); stop() is still called
+        by the worker afterwards. Must never raise.
+        """
+
+    def convert(self, source_path, pdf_path, slide_range=None, profile=None):
+        """
+        Convert a presentation to PDF
+
+        Args:
+            source_path: Absolute path to the PPT/PPTX file
+            pdf_path: Absolute path of the PDF to create
+            slide_range: Optional (first, last) slide numbers, 1-based and
+                inclusive, to export only part of the presentation
+            profile: ExportProfile with the engine export settings (the
+                default profile if None)
+
+        Raises:
+            EngineFault: if the engine failed and has to be restarted
+            Exception: for any other conversion failure
+        """
+        raise NotImplementedError
+
+
+class PowerPointBackend(ConversionBackend):
+    """Microsoft PowerPoint driven through COM automation"""
+
+    name = 'powerpoint'
+    supports_slide_ranges = True
+
+    def __init__(self, open_attempts=3, retry_delay=0.5):
+        self.open_attempts = open_attempts
+        self.retry_delay = retry_delay
+        self.ppt = None
+        self.pid = None
+        self._com_initialized = False
+
+    def start(self):
+        if pythoncom is None:
+            raise EngineFault("pywin32 is not installed; PowerPoint automation requires Windows")
+
+        # Initialize COM for the worker thread that owns this engine
+        pythoncom.CoInitialize()
+        self._com_initialized = True
+
+        print("Starting PowerPoint application...")
+        try:
+            self.ppt = win32com.client.Dispatch("PowerPoint.Application")
+            # Note: Don't set Visible = False as it may cause issues in some PowerPoint versions
+            print(f"PowerPoint started successfully. Version: {self.ppt.Version}")
+        except Exception as e:
+            self.stop()
+            raise EngineFault(f"Failed to start PowerPoint: {str(e)}")
+
+        # Remember the process so a hung instance can be killed
+        try:
+            self.pid = win32process.GetWindowThreadProcessId(self.ppt.HWND)[1]
+        except Exception as e:
+            print(f"Could not determine the PowerPoint process: {str(e)}")
+            self.pid = None
+
+    def stop(self):
+        try:
+            if self.ppt:
+                self.ppt.Quit()
+                print("PowerPoint application closed")
+        except Exception as e:
+            print(f"Error closing PowerPoint: {str(e)}")
+        self.ppt = None
+        self.pid = None
+
+        if self._com_initialized:
+            try:
+                pythoncom.CoUninitialize()
+                print("COM uninitialized")
+            except Exception as e:
+                print(f"Error uninitializing COM: {str(e)}")
+            self._com_initialized = False
+
+    def is_healthy(self):
+        if self.ppt is None:
+            return False
+        try:
+            # Any round trip through COM proves the application is responsive
+            self.ppt.Version
+            return True
+        except Exception:
+            return False
+
+    def describe(self):
+        try:
+            return f"PowerPoint {self.ppt.Version}"
+        except Exception:
+            return self.name
+
+    def kill(self):
+        # Ends a PowerPoint stuck on a dialog; the blocked COM call then fails
+        if self.pid:
+            try:
+                os.kill(self.pid, signal.SIGTERM)
+            except OSError as e:
+                print(f"Could not kill PowerPoint process {self.pid}: {str(e)}")
+
+    def convert(self, source_path, pdf_path, slide_range=None, profile=None):
+        profile = profile or get_profile(None)
+        presentation = None
+        try:
+            # Open presentation with multiple attempts
+            print("Opening presentation...")
+            for attempt in range(self.open_attempts):
+                try:
+                    with span('open'):
+                        if attempt == 0:
+                            # First attempt: Open with minimal parameters
+                            presentation = self.ppt.Presentations.Open(source_path, ReadOnly=True, Untitled=False, WithWindow=False)
+                        elif attempt == 1:
+                            # Second attempt: Open with basic parameters
+                            presentation = self.ppt.Presentations.Open(source_path, ReadOnly=True)
+                        else:
+                            # Third attempt: Open with minimal parameters
+                            presentation = self.ppt.Presentations.Open(source_path)
+
+                    print(f"Presentation opened successfully on attempt {attempt + 1}")
+                    OPEN_ATTEMPTS_TOTAL.inc(outcome='success')
+                    break
+
+                except Exception as e:
+                    print(f"Attempt {attempt + 1} failed: {str(e)}")
+                    OPEN_ATTEMPTS_TOTAL.inc(outcome='failure')
+                    if attempt == self.open_attempts - 1:
+                        raise Exception(f"Could not open PowerPoint file after {self.open_attempts} attempts. Last error: {str(e)}")
+                    # Back off exponentially before retrying
+                    time.sleep(self.retry_delay * 2 ** attempt)
+
+            # Export to PDF
+            print("Exporting to PDF...")
+            try:
+                if slide_range:
+                    # ppPrintSlideRange, limited to a single range of slides
+                    presentation.PrintOptions.Ranges.ClearAll()
+                    print_range = presentation.PrintOptions.Ranges.Add(*slide_range)
+                    range_type = 4
+                else:
+                    print_range = None
+                    range_type = 1  # ppPrintAll
+
+                # Use positional arguments for better compatibility
+                with span('export'):
+                    presentation.ExportAsFixedFormat(
+                        pdf_path,           # OutputFileName
+                        2,                  # FixedFormatType (ppFixedFormatTypePDF)
+                        profile.intent,     # Intent (ppFixedFormatIntentScreen or ppFixedFormatIntentPrint)
+                        False,              # FrameSlides
+                        1,                  # HandoutOrder (ppPrintHandoutHorizontalFirst)
+                        1,                  # OutputType (ppPrintOutputSlides)
+                        False,              # PrintHiddenSlides
+                        print_range,        # PrintRange
+                        range_type,         # RangeType (ppPrintAll or ppPrintSlideRange)
+                        "",                 # SlideShowName
+                        True,               # IncludeDocProps
+                        True,               # KeepIRMSettings
+                        True,               # DocStructureTags
+                        True,               # BitmapMissingFonts
+                        profile.pdfa        # UseISO19005_1 (PDF/A)
+                    )
+            except Exception as e:
+                raise Exception(f"Failed to export to PDF: {str(e)}")
+
+        finally:
+            try:
+                if presentation:
+                    presentation.Close()
+                    print("Presentation closed")
+            except Exception as e:
+                print(f"Error closing presentation: {str(e)}")
+
+
+class LibreOfficeBackend(ConversionBackend):
+    """
+    LibreOffice running headless. With the Python-UNO bridge available a
+    single soffice listener is started and reused for every file; without it
+    each file is converted by a one-shot `soffice --convert-to pdf` process.
+    """
+
+    name = 'libreoffice'
+
+    def __init__(self, soffice_path='soffice', startup_timeout=30):
+        self.soffice_path = soffice_path
+        self.startup_timeout = startup_timeout
+        self.process = None
+        self.desktop = None
+        self.profile_dir = None
+        self._child = None
+
+    @property
+    def supports_slide_ranges(self):
+        # Page ranges are passed as PDF filter data through the listener
+        return uno is not None
+
+    def start(self):
+        if shutil.which(self.soffice_path) is None and not os.path.exists(self.soffice_path):
+            raise EngineFault(f"LibreOffice executable not found: {self.soffice_path}")
+
+        # Every engine gets its own profile so several can run side by side
+        self.profile_dir = tempfile.mkdtemp(prefix='ppt2pdf-lo-')
+
+        if uno is None:
+            print("Python-UNO bridge not available, using one soffice process per file")
+            return
+
+        port = _free_port()
+        self.process = subprocess.Popen(
+            [
+                self.soffice_path,
+                '--headless', '--invisible', '--nologo', '--norestore',
+                '--nodefault', '--nolockcheck',
+                f'-env:UserInstallation={_file_url(self.profile_dir)}',
+                f'--accept=socket,host=127.0.0.1,port={port};urp;StarOffice.ComponentContext',
+            ],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+
+        local_context = uno.getComponentContext()
+        resolver = local_context.ServiceManager.createInstanceWithContext(
+            'com.sun.star.bridge.UnoUrlResolver', local_context)
+
+        deadline = time.time() + self.startup_timeout
+        while True:
+            if self.process.poll() is not None:
+                raise EngineFault(f"soffice exited during startup with code {self.process.returncode}")
+            try:
+                context = resolver.resolve(
+                    f'uno:socket,host=127.0.0.1,port={port};urp;StarOffice.ComponentContext')
+                self.desktop = context.ServiceManager.createInstanceWithContext(
+                    'com.sun.star.frame.Desktop', context)
+                return
+            except Exception as e:
+                if time.time() > deadline:
+                    raise EngineFault(f"Could not connect to soffice listener: {str(e)}")
+                time.sleep(0.25)
+
+    def stop(self):
+        if self.desktop is not None:
+            try:
+                self.desktop.terminate()
+            except Exception:
+                pass
+            self.desktop = None
+
+        if self.process is not None:
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+            self.process = None
+
+        if self.profile_dir:
+            shutil.rmtree(self.profile_dir, ignore_errors=True)
+            self.profile_dir = None
+
+    def is_healthy(self):
+        if self.profile_dir is None:
+            return False
+        if uno is None:
+            return True
+        if self.process is None or self.process.poll() is not None:
+            return False
+        try:
+            self.desktop.getComponents()
+            return True
+        except Exception:
+            return False
+
+    def describe(self):
+        mode = 'UNO listener' if uno is not None else 'one-shot processes'
+        return f"LibreOffice ({mode})"
+
+    def kill(self):
+        for process in (self.process, self._child):
+            if process is not None:
+                try:
+                    process.kill()
+                except OSError:
+                    pass
+
+    def convert(self, source_path, pdf_path, slide_range=None, profile=None):
+        profile = profile or get_profile(None)
+        if uno is None:
+            if slide_range:
+                raise Exception("Slide ranges need the Python-UNO bridge")
+            self._convert_with_process(source_path, pdf_path, profile)
+        else:
+            self._convert_with_listener(source_path, pdf_path, profile, slide_range)
+
+    def _convert_with_listener(self, source_path, pdf_path, profile, slide_range=None):
+        document = None
+        try:
+            try:
+                with span('open'):
+                    document = self.desktop.loadComponentFromURL(
+                        _file_url(source_path), '_blank', 0,
+                        _properties(Hidden=True, ReadOnly=True))
+            except Exception as e:
+                if not self.is_healthy():
+                    raise EngineFault(f"soffice listener died: {str(e)}")
+                raise Exception(f"Could not open presentation: {str(e)}")
+
+            if document is None:
+                raise Exception("Could not open presentation")
+
+            filter_data = profile.libreoffice_filter_data()
+            if slide_range:
+                filter_data['PageRange'] = f"{slide_range[0]}-{slide_range[1]}"
+            export_options = {'FilterName': 'impress_pdf_Export', 'FilterData': _filter_data(**filter_data)}
+
+            try:
+                with span('export'):
+                    document.storeToURL(_file_url(pdf_path), _properties(**export_options))
+            except Exception as e:
+                raise Exception(f"Failed to export to PDF: {str(e)}")
+
+        finally:
+            if document is not None:
+                try:
+                    document.close(True)
+                except Exception as e:
+                    print(f"Error closing document: {str(e)}")
+
+    def _convert_with_process(self, source_path, pdf_path, profile):
+        out_dir = tempfile.mkdtemp(prefix='ppt2pdf-out-')
+        # Filter options as JSON are understood by LibreOffice 7.4 and later
+        filter_options = json.dumps({
+            key: {'type': _uno_type(value), 'value': str(value).lower() if isinstance(value, bool) else str(value)}
+            for key, value in profile.libreoffice_filter_data().items()
+        })
+        try:
+            with span('export'):
+                # Kept on the instance so kill() can end a hung conversion
+                self._child = subprocess.Popen(
+                    [
+                        self.soffice_path, '--headless', '--norestore',
+                        f'-env:UserInstallation={_file_url(self.profile_dir)}',
+                        '--convert-to', f'pdf:impress_pdf_Export:{filter_options}',
+                        '--outdir', out_dir, source_path,
+                    ],
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.STDOUT
+                )
+                output, _ = self._child.communicate()
+            produced = os.path.join(out_dir, os.path.splitext(os.path.basename(source_path))[0] + '.pdf')
+            if self._child.returncode != 0 or not os.path.exists(produced):
+                output = output.decode(errors='replace').strip()
+                raise Exception(f"soffice --convert-to failed ({self._child.returncode}): {output}")
+            shutil.move(produced, pdf_path)
+        finally:
+            self._child = None
+            shutil.rmtree(out_dir, ignore_errors=True)
+
+
+def _free_port():
+    """Ask the OS for an unused local TCP port"""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _file_url(path):
+    """Turn a filesystem path into a file:// URL"""
+    if uno is not None:
+        return uno.systemPathToFileUrl(os.path.abspath(path))
+    return 'file://' + os.path.abspath(path).replace(os.sep, '/')
+
+
+def _uno_type(value):
+    """UNO type name of a filter option value for --convert-to JSON options"""
+    if isinstance(value, bool):
+        return 'boolean'
+    if isinstance(value, int):
+        return 'long'
+    return 'string'
+
+
+def _properties(**values):
+    """Build a tuple of UNO PropertyValue structs"""
+    properties = []
+    for name, value in values.items():
+        prop = PropertyValue()
+        prop.Name = name
+        prop.Value = value
+        properties.append(prop)
+    return tuple(properties)
+
+
+def _filter_data(**values):
+    """
+    FilterData export option. storeToURL only reads it when the sequence is
+    typed explicitly; a plain tuple is silently ignored, page ranges and
+    quality settings included.
+    """
+    return uno.Any('[]com.sun.star.beans.PropertyValue', _properties(**values))
+
+
+class FakeBackend(ConversionBackend):
+    """
+    Engine stand-in for development and testing on machines without Office.
+    Simulates the startup and per-file cost of a real engine and writes a
+    small valid PDF.
+    """
+
+    name = 'fake'
+    supports_slide_ranges = True
+
+    def __init__(self, startup_delay=2.0, convert_delay=0.5, convert_delay_per_mb=0.0,
+                 hang_probability=0.0):
+        """
+        Args:
+            startup_delay: Seconds an engine takes to start
+            convert_delay: Fixed seconds spent on every file
+            convert_delay_per_mb: Extra seconds per MB of input, so large
+                files cost more like they do in a real engine
+            hang_probability: Share of conversions that never finish until
+                the engine is killed, for exercising the watchdog
+        """
+        self.startup_delay = startup_delay
+        self.convert_delay = convert_delay
+        self.convert_delay_per_mb = convert_delay_per_mb
+        self.hang_probability = hang_probability
+        self.running = False
+        self._killed = threading.Event()
+
+    def start(self):
+        time.sleep(self.startup_delay)
+        self._killed.clear()
+        self.running = True
+
+    def stop(self):
+        self.running = False
+
+    def kill(self):
+        self.running = False
+        self._killed.set()
+
+    def is_healthy(self):
+        return self.running
+
+    def convert(self, source_path, pdf_path, slide_range=None, profile=None):
+        if not self.running:
+            raise EngineFault("Fake engine is not running")
+        with span('export'):
+            size_mb = os.path.getsize(source_path) / (1024 * 1024)
+            title = os.path.basename(source_path)
+            slide_count = count_slides(source_path)
+            # One page per exported slide, like a real engine
+            slides = range(1, (slide_count or 1) + 1)
+            share = 1.0
+            if slide_range:
+                # A range costs its share of the whole deck
+                slides = range(slide_range[0], slide_range[1] + 1)
+                if slide_count:
+                    share = len(slides) / slide_count
+            delay = (self.convert_delay + self.convert_delay_per_mb * size_mb) * share
+            if random.random() < self.hang_probability:
+                delay = None
+            if self._killed.wait(delay):
+                raise EngineFault("Fake engine was killed")
+            write_placeholder_pdf(pdf_path, [f"{title} slide {number}" for number in slides])
+
+
+def write_placeholder_pdf(pdf_path, titles):
+    """Write a minimal PDF with one page per title, showing that title"""
+    page_ids = [4 + 2 * index for index in range(len(titles))]
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [" + b" ".join(b"%d 0 R" % page_id for page_id in page_ids)
+        + b"] /Count " + str(len(titles)).encode() + b" >>",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    for page_id, title in zip(page_ids, titles):
+        text = title.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+        stream = f"BT /F1 18 Tf 72 720 Td ({text}) Tj ET".encode('latin-1', 'replace')
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       b"/Contents " + str(page_id + 1).encode() + b" 0 R /Resources << /Font << /F1 3 0 R >> >> >>")
+        objects.append(b"<< /Length " + str(len(stream)).encode() + b" >>\nstream\n" + stream + b"\nendstream")
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+
+    xref_offset = len(output)
+    output += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for offset in offsets:
+        output += f"{offset:010d} 00000 n \n".encode()
+    output += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode()
+
+    with open(pdf_path, 'wb') as f:
+        f.write(output)
+
+
+def create_backend_factory(name, **options):
+    """
+    Return a zero argument callable that builds a fresh backend instance
+
+    Args:
+        name: Backend name ('powerpoint', 'libreoffice' or 'fake')
+        options: Keyword arguments passed to the backend constructor
+    """
+    backends = {
+        PowerPointBackend.name: PowerPointBackend,
+        LibreOfficeBackend.name: LibreOfficeBackend,
+        FakeBackend.name: FakeBackend,
+    }
+    if name not in backends:
+        raise ValueError(f"Unknown conversion backend: {name}")
+    backend_class = backends[name]
+    return lambda: backend_class(**options)
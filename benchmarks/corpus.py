@@ -0,0 +1,282 @@
+"""
+Synthetic Corpus
+Generates .pptx files of a chosen size and slide count for benchmarking.
+The files are small but structurally valid OOXML presentations: every slide
+has a title and a picture, and the pictures are PNGs of random pixels so the
+requested size is reached with data that does not compress away.
+
+Usage:
+    python benchmarks/corpus.py OUTPUT_DIR --count 20 --size-mix 0.1:6,2:3,10:1
+"""
+
+import argparse
+import os
+import random
+import struct
+import zipfile
+import zlib
+
+NS_A = 'http://schemas.openxmlformats.org/drawingml/2006/main'
+NS_R = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+NS_P = 'http://schemas.openxmlformats.org/presentationml/2006/main'
+REL = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+CT = 'application/vnd.openxmlformats-officedocument.presentationml'
+
+SLIDE_WIDTH = 12192000
+SLIDE_HEIGHT = 6858000
+
+XML_HEADER = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+
+
+def parse_mix(spec, cast=float):
+    """
+    Parse a weighted mix like "0.1:6,2:3,10:1" into [(value, weight), ...]
+
+    A value without a weight counts once.
+    """
+    mix = []
+    for item in spec.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        value, _, weight = item.partition(':')
+        mix.append((cast(value), float(weight or 1)))
+    if not mix:
+        raise ValueError(f"Empty mix: {spec!r}")
+    return mix
+
+
+def pick(mix, rng=random):
+    """Choose a value from a parsed mix according to its weights"""
+    values = [value for value, _ in mix]
+    weights = [weight for _, weight in mix]
+    return rng.choices(values, weights=weights)[0]
+
+
+def _png(width, height, rng):
+    """Return an RGB PNG of random pixels"""
+    def chunk(kind, data):
+        body = kind + data
+        return struct.pack('>I', len(data)) + body + struct.pack('>I', zlib.crc32(body) & 0xffffffff)
+
+    row_bytes = width * 3
+    # Filter byte 0 (None) before every row
+    raw = b''.join(b'\x00' + rng.randbytes(row_bytes) for _ in range(height))
+    header = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header)
+            + chunk(b'IDAT', zlib.compress(raw, 1)) + chunk(b'IEND', b''))
+
+
+def _rels(relationships):
+    items = ''.join(
+        f'<Relationship Id="{rid}" Type="{REL}/{kind}" Target="{target}"/>'
+        for rid, kind, target in relationships
+    )
+    return (XML_HEADER + '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            + items + '</Relationships>')
+
+
+def _content_types(slide_count):
+    overrides = [
+        ('/ppt/presentation.xml', f'{CT}.presentation.main+xml'),
+        ('/ppt/slideMasters/slideMaster1.xml', f'{CT}.slideMaster+xml'),
+        ('/ppt/slideLayouts/slideLayout1.xml', f'{CT}.slideLayout+xml'),
+        ('/ppt/theme/theme1.xml', 'application/vnd.openxmlformats-officedocument.theme+xml'),
+    ]
+    overrides += [(f'/ppt/slides/slide{n}.xml', f'{CT}.slide+xml') for n in range(1, slide_count + 1)]
+    return (XML_HEADER
+            + '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            + '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            + '<Default Extension="xml" ContentType="application/xml"/>'
+            + '<Default Extension="png" ContentType="image/png"/>'
+            + ''.join(f'<Override PartName="{name}" ContentType="{kind}"/>' for name, kind in overrides)
+            + '</Types>')
+
+
+def _presentation(slide_count):
+    slide_ids = ''.join(
+        f'<p:sldId id="{255 + n}" r:id="rId{n + 1}"/>' for n in range(1, slide_count + 1)
+    )
+    return (XML_HEADER
+            + f'<p:presentation xmlns:a="{NS_A}" xmlns:r="{NS_R}" xmlns:p="{NS_P}">'
+            + '<p:sldMasterIdLst><p:sldMasterId id="2147483648" r:id="rId1"/></p:sldMasterIdLst>'
+            + f'<p:sldIdLst>{slide_ids}</p:sldIdLst>'
+            + f'<p:sldSz cx="{SLIDE_WIDTH}" cy="{SLIDE_HEIGHT}"/>'
+            + '<p:notesSz cx="6858000" cy="9144000"/>'
+            + '</p:presentation>')
+
+
+EMPTY_TREE = ('<p:spTree><p:nvGrpSpPr><p:cNvPr id="1" name=""/><p:cNvGrpSpPr/><p:nvPr/></p:nvGrpSpPr>'
+              '<p:grpSpPr/>{shapes}</p:spTree>')
+
+
+def _slide_master():
+    return (XML_HEADER
+            + f'<p:sldMaster xmlns:a="{NS_A}" xmlns:r="{NS_R}" xmlns:p="{NS_P}">'
+            + '<p:cSld>' + EMPTY_TREE.format(shapes='') + '</p:cSld>'
+            + '<p:clrMap bg1="lt1" tx1="dk1" bg2="lt2" tx2="dk2" accent1="accent1" accent2="accent2" '
+              'accent3="accent3" accent4="accent4" accent5="accent5" accent6="accent6" hlink="hlink" '
+              'folHlink="folHlink"/>'
+            + '<p:sldLayoutIdLst><p:sldLayoutId id="2147483649" r:id="rId1"/></p:sldLayoutIdLst>'
+            + '</p:sldMaster>')
+
+
+def _slide_layout():
+    return (XML_HEADER
+            + f'<p:sldLayout xmlns:a="{NS_A}" xmlns:r="{NS_R}" xmlns:p="{NS_P}" type="blank">'
+            + '<p:cSld name="Blank">' + EMPTY_TREE.format(shapes='') + '</p:cSld>'
+            + '<p:clrMapOvr><a:masterClrMapping/></p:clrMapOvr>'
+            + '</p:sldLayout>')
+
+
+def _theme():
+    colors = ''.join(
+        f'<a:{name}><a:srgbClr val="{value}"/></a:{name}>'
+        for name, value in [
+            ('dk1', '000000'), ('lt1', 'FFFFFF'), ('dk2', '44546A'), ('lt2', 'E7E6E6'),
+            ('accent1', '4472C4'), ('accent2', 'ED7D31'), ('accent3', 'A5A5A5'),
+            ('accent4', 'FFC000'), ('accent5', '5B9BD5'), ('accent6', '70AD47'),
+            ('hlink', '0563C1'), ('folHlink', '954F72'),
+        ]
+    )
+    fonts = '<a:latin typeface="Calibri"/><a:ea typeface=""/><a:cs typeface=""/>'
+    fill = '<a:solidFill><a:schemeClr val="phClr"/></a:solidFill>'
+    line = f'<a:ln w="9525">{fill}</a:ln>'
+    effect = '<a:effectStyle><a:effectLst/></a:effectStyle>'
+    return (XML_HEADER
+            + f'<a:theme xmlns:a="{NS_A}" name="Benchmark"><a:themeElements>'
+            + f'<a:clrScheme name="Benchmark">{colors}</a:clrScheme>'
+            + f'<a:fontScheme name="Benchmark"><a:majorFont>{fonts}</a:majorFont>'
+            + f'<a:minorFont>{fonts}</a:minorFont></a:fontScheme>'
+            + '<a:fmtScheme name="Benchmark">'
+            + f'<a:fillStyleLst>{fill * 3}</a:fillStyleLst>'
+            + f'<a:lnStyleLst>{line * 3}</a:lnStyleLst>'
+            + f'<a:effectStyleLst>{effect * 3}</a:effectStyleLst>'
+            + f'<a:bgFillStyleLst>{fill * 3}</a:bgFillStyleLst>'
+            + '</a:fmtScheme></a:themeElements></a:theme>')
+
+
+def _slide(number, with_picture):
+    title = (
+        '<p:sp><p:nvSpPr><p:cNvPr id="2" name="Title"/><p:cNvSpPr txBox="1"/><p:nvPr/></p:nvSpPr>'
+        '<p:spPr><a:xfrm><a:off x="457200" y="274638"/><a:ext cx="11277600" cy="1143000"/></a:xfrm>'
+        '<a:prstGeom prst="rect"><a:avLst/></a:prstGeom></p:spPr>'
+        f'<p:txBody><a:bodyPr/><a:lstStyle/><a:p><a:r><a:rPr lang="en-US" sz="4000"/>'
+        f'<a:t>Benchmark slide {number}</a:t></a:r></a:p></p:txBody></p:sp>'
+    )
+    picture = ''
+    if with_picture:
+        picture = (
+            '<p:pic><p:nvPicPr><p:cNvPr id="3" name="Picture"/><p:cNvPicPr/><p:nvPr/></p:nvPicPr>'
+            '<p:blipFill><a:blip r:embed="rId2"/><a:stretch><a:fillRect/></a:stretch></p:blipFill>'
+            '<p:spPr><a:xfrm><a:off x="1524000" y="1600200"/><a:ext cx="9144000" cy="4800600"/></a:xfrm>'
+            '<a:prstGeom prst="rect"><a:avLst/></a:prstGeom></p:spPr></p:pic>'
+        )
+    return (XML_HEADER
+            + f'<p:sld xmlns:a="{NS_A}" xmlns:r="{NS_R}" xmlns:p="{NS_P}">'
+            + '<p:cSld>' + EMPTY_TREE.format(shapes=title + picture) + '</p:cSld>'
+            + '<p:clrMapOvr><a:masterClrMapping/></p:clrMapOvr>'
+            + '</p:sld>')
+
+
+def generate_pptx(path, size_bytes, slide_count=10, seed=None):
+    """
+    Write a synthetic presentation of roughly size_bytes
+
+    Args:
+        path: Output .pptx path
+        size_bytes: Target file size; the picture data is sized to reach it
+        slide_count: Number of slides
+        seed: Seed for the random pixel data (None for a unique file)
+
+    Returns:
+        int: actual size of the written file
+    """
+    rng = random.Random(seed)
+    slide_count = max(1, slide_count)
+
+    # Spread the payload over one picture per slide; skip pictures when the
+    # target is too small to hold them
+    payload = max(0, size_bytes - 8 * 1024 - 1500 * slide_count)
+    per_picture = payload // slide_count
+    side = int((per_picture / 3) ** 0.5)
+    with_pictures = side >= 8
+
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('[Content_Types].xml', _content_types(slide_count))
+        archive.writestr('_rels/.rels', _rels([('rId1', 'officeDocument', 'ppt/presentation.xml')]))
+        archive.writestr('ppt/presentation.xml', _presentation(slide_count))
+        archive.writestr('ppt/_rels/presentation.xml.rels', _rels(
+            [('rId1', 'slideMaster', 'slideMasters/slideMaster1.xml')]
+            + [(f'rId{n + 1}', 'slide', f'slides/slide{n}.xml') for n in range(1, slide_count + 1)]
+            + [(f'rId{slide_count + 2}', 'theme', 'theme/theme1.xml')]
+        ))
+        archive.writestr('ppt/slideMasters/slideMaster1.xml', _slide_master())
+        archive.writestr('ppt/slideMasters/_rels/slideMaster1.xml.rels', _rels([
+            ('rId1', 'slideLayout', '../slideLayouts/slideLayout1.xml'),
+            ('rId2', 'theme', '../theme/theme1.xml'),
+        ]))
+        archive.writestr('ppt/slideLayouts/slideLayout1.xml', _slide_layout())
+        archive.writestr('ppt/slideLayouts/_rels/slideLayout1.xml.rels', _rels([
+            ('rId1', 'slideMaster', '../slideMasters/slideMaster1.xml'),
+        ]))
+        archive.writestr('ppt/theme/theme1.xml', _theme())
+
+        for n in range(1, slide_count + 1):
+            relationships = [('rId1', 'slideLayout', '../slideLayouts/slideLayout1.xml')]
+            if with_pictures:
+                relationships.append(('rId2', 'image', f'../media/image{n}.png'))
+                # Already compressed; storing avoids paying for deflate twice
+                archive.writestr(f'ppt/media/image{n}.png', _png(side, side, rng),
+                                 compress_type=zipfile.ZIP_STORED)
+            archive.writestr(f'ppt/slides/slide{n}.xml', _slide(n, with_pictures))
+            archive.writestr(f'ppt/slides/_rels/slide{n}.xml.rels', _rels(relationships))
+
+    return os.path.getsize(path)
+
+
+def generate_corpus(output_dir, count, size_mix, slide_mix=((10, 1),), seed=0):
+    """
+    Generate count presentations with sizes and slide counts drawn from mixes
+
+    Args:
+        output_dir: Directory for the files
+        count: Number of files
+        size_mix: [(size in MB, weight), ...]
+        slide_mix: [(slide count, weight), ...]
+        seed: Makes the corpus reproducible between runs
+
+    Returns:
+        list: paths of the generated files
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    rng = random.Random(seed)
+    paths = []
+    for index in range(count):
+        size_mb = pick(size_mix, rng)
+        slides = int(pick(slide_mix, rng))
+        path = os.path.join(output_dir, f"deck_{index:04d}_{size_mb:g}mb.pptx")
+        generate_pptx(path, int(size_mb * 1024 * 1024), slides, seed=rng.random())
+        paths.append(path)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate synthetic .pptx files for benchmarking')
+    parser.add_argument('output_dir')
+    parser.add_argument('--count', type=int, default=20, help='Number of files (default: 20)')
+    parser.add_argument('--size-mix', default='0.1:6,2:3,10:1',
+                        help='Sizes in MB with weights (default: 0.1:6,2:3,10:1)')
+    parser.add_argument('--slide-mix', default='10',
+                        help='Slide counts with weights (default: 10)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    paths = generate_corpus(args.output_dir, args.count, parse_mix(args.size_mix),
+                            parse_mix(args.slide_mix, int), args.seed)
+    total = sum(os.path.getsize(path) for path in paths)
+    print(f"Wrote {len(paths)} files ({total / (1024 * 1024):.1f} MB) to {args.output_dir}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,434 @@
+"""
+Load Test
+Drives the upload -> status -> download pipeline of the web application with
+concurrent clients and reports latency percentiles, throughput and the peak
+memory of the server.
+
+By default the application is started in a scratch directory with the fake
+conversion backend, so the benchmark runs anywhere (including Linux CI)
+without Office. Results are written to benchmarks/results/ as JSON, named by
+time and git revision, and compared with the last run of the same scenario.
+
+Usage:
+    python benchmarks/load_test.py --uploads 50 --concurrency 8
+    python benchmarks/load_test.py --size-mix 0.1:6,2:3,10:1 --files-per-upload 1:8,5:2
+    python benchmarks/load_test.py --url http://localhost:5000   # existing server
+"""
+
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from corpus import generate_corpus, parse_mix, pick
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARK_DIR)
+RESULTS_DIR = os.path.join(BENCHMARK_DIR, 'results')
+
+FINISHED_STATES = ('completed', 'completed_with_errors', 'error')
+
+# Started in the scratch directory so uploads, downloads, cache and job
+# database of the run stay out of the working tree
+SERVER_SCRIPT = """
+import sys
+sys.path.insert(0, {repo!r})
+from app import app
+app.run(host='127.0.0.1', port={port}, threaded=True, debug=False, use_reloader=False)
+"""
+
+
+def percentile(values, p):
+    """Linearly interpolated percentile of a list of numbers (p in 0..100)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * p / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+def summarize(values):
+    """p50/p95/p99/mean/max of a list of latencies, in seconds"""
+    if not values:
+        return {'count': 0}
+    return {
+        'count': len(values),
+        'mean': round(sum(values) / len(values), 4),
+        'p50': round(percentile(values, 50), 4),
+        'p95': round(percentile(values, 95), 4),
+        'p99': round(percentile(values, 99), 4),
+        'max': round(max(values), 4),
+    }
+
+
+def git_revision():
+    """Short commit hash of the working tree, marked -dirty if it has changes"""
+    try:
+        revision = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR,
+                                  capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'diff', '--quiet', 'HEAD'], cwd=REPO_DIR).returncode != 0
+        return revision + ('-dirty' if dirty else '')
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+class Client:
+    """Minimal HTTP client; one connection per request, redirects not followed"""
+
+    def __init__(self, base_url, timeout=300):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.timeout = timeout
+
+    def request(self, method, path, body=None, headers=None):
+        """
+        Returns:
+            tuple: (status code, response headers, body bytes)
+        """
+        connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        try:
+            connection.request(method, path, body=body, headers=headers or {})
+            response = connection.getresponse()
+            return response.status, dict(response.getheaders()), response.read()
+        finally:
+            connection.close()
+
+    def upload(self, paths):
+        """POST files to /upload as multipart/form-data"""
+        boundary = uuid.uuid4().hex
+        parts = []
+        for path in paths:
+            with open(path, 'rb') as f:
+                data = f.read()
+            parts.append(
+                f'--{boundary}\r\n'
+                f'Content-Disposition: form-data; name="files"; filename="{os.path.basename(path)}"\r\n'
+                f'Content-Type: application/vnd.openxmlformats-officedocument.presentationml.presentation\r\n'
+                f'\r\n'.encode() + data + b'\r\n'
+            )
+        body = b''.join(parts) + f'--{boundary}--\r\n'.encode()
+        return self.request('POST', '/upload', body, {
+            'Content-Type': f'multipart/form-data; boundary={boundary}',
+            'Content-Length': str(len(body)),
+        })
+
+    def wait_until_ready(self, timeout=60):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            try:
+                status, _, _ = self.request('GET', '/cache/stats')
+                if status == 200:
+                    return True
+            except OSError:
+                pass
+            time.sleep(0.2)
+        return False
+
+
+def run_upload(client, paths, poll_interval):
+    """
+    Push one upload through the whole pipeline
+
+    Returns:
+        dict: timings in seconds and the outcome
+    """
+    record = {'files': len(paths), 'bytes': sum(os.path.getsize(path) for path in paths)}
+    started = time.perf_counter()
+
+    status, headers, _ = client.upload(paths)
+    uploaded = time.perf_counter()
+    record['upload'] = uploaded - started
+
+    if status == 429:
+        record['outcome'] = 'rejected'
+        return record
+    match = re.search(r'/progress/([^/?#]+)', headers.get('Location', ''))
+    if status != 302 or not match:
+        record['outcome'] = f'upload_failed_{status}'
+        return record
+    conversion_id = match.group(1)
+
+    while True:
+        status, _, body = client.request('GET', f'/status/{conversion_id}')
+        if status != 200:
+            record['outcome'] = f'status_failed_{status}'
+            return record
+        job = json.loads(body)
+        if job.get('status') in FINISHED_STATES:
+            break
+        time.sleep(poll_interval)
+    converted = time.perf_counter()
+    record['convert'] = converted - uploaded
+
+    if job['status'] == 'error':
+        record['outcome'] = 'conversion_failed'
+        return record
+
+    status, _, body = client.request('GET', f'/download/{conversion_id}')
+    finished = time.perf_counter()
+    if status != 200:
+        record['outcome'] = f'download_failed_{status}'
+        return record
+    record['download'] = finished - converted
+    record['end_to_end'] = finished - started
+    record['downloaded_bytes'] = len(body)
+    record['failed_files'] = job.get('failed_files', 0)
+    record['outcome'] = 'ok'
+
+    client.request('GET', f'/cleanup/{conversion_id}')
+    return record
+
+
+def start_server(args, workdir):
+    """Start the application with the fake backend in workdir"""
+    port = free_port()
+    env = dict(os.environ)
+    env.update({
+        'PPT2PDF_BACKEND': 'fake',
+        'PPT2PDF_FAKE_STARTUP_DELAY': str(args.startup_delay),
+        'PPT2PDF_FAKE_CONVERT_DELAY': str(args.convert_delay),
+        'PPT2PDF_FAKE_CONVERT_DELAY_PER_MB': str(args.convert_delay_per_mb),
+        'PPT2PDF_POOL_SIZE': str(args.pool_size),
+        'PPT2PDF_CACHE_ENABLED': '1' if args.cache else '0',
+        'PPT2PDF_JOB_STORE_PATH': os.path.join(workdir, 'jobs.db'),
+    })
+    for setting in args.env:
+        key, _, value = setting.partition('=')
+        env[key] = value
+
+    log = open(os.path.join(workdir, 'server.log'), 'w')
+    process = subprocess.Popen(
+        [sys.executable, '-c', SERVER_SCRIPT.format(repo=REPO_DIR, port=port)],
+        cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT
+    )
+    return process, log, f'http://127.0.0.1:{port}'
+
+
+def stop_server(process, log):
+    """
+    Stop the server and return its peak resident memory in MB
+
+    ru_maxrss of reaped children is the high-water mark of the largest one;
+    the server is the only child this script starts.
+    """
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+    log.close()
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    divisor = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return round(peak / divisor, 1)
+
+
+def run_benchmark(args, base_url, corpus):
+    client = Client(base_url)
+    if not client.wait_until_ready():
+        raise RuntimeError(f"Server at {base_url} did not become ready")
+
+    file_mix = parse_mix(args.files_per_upload, int)
+    rng = random.Random(args.seed)
+    uploads = [rng.sample(corpus, min(int(pick(file_mix, rng)), len(corpus)))
+               for _ in range(args.uploads)]
+
+    # Starts the conversion engines so startup is not counted as latency
+    for paths in uploads[:args.warmup]:
+        run_upload(client, paths, args.poll_interval)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        records = list(pool.map(lambda paths: run_upload(client, paths, args.poll_interval), uploads))
+    elapsed = time.perf_counter() - started
+    return records, elapsed
+
+
+def build_report(args, records, elapsed, peak_rss_mb):
+    ok = [record for record in records if record['outcome'] == 'ok']
+    outcomes = {}
+    for record in records:
+        outcomes[record['outcome']] = outcomes.get(record['outcome'], 0) + 1
+    converted_files = sum(record['files'] - record.get('failed_files', 0) for record in ok)
+    converted_mb = sum(record['bytes'] for record in ok) / (1024 * 1024)
+
+    return {
+        'revision': git_revision(),
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'host': {'platform': platform.platform(), 'python': platform.python_version(),
+                 'cpus': os.cpu_count()},
+        'scenario': scenario(args),
+        'elapsed_seconds': round(elapsed, 3),
+        'outcomes': outcomes,
+        'files_per_second': round(converted_files / elapsed, 3) if elapsed else None,
+        'megabytes_per_second': round(converted_mb / elapsed, 3) if elapsed else None,
+        'latency': {
+            stage: summarize([record[stage] for record in ok])
+            for stage in ('upload', 'convert', 'download', 'end_to_end')
+        },
+        'peak_rss_mb': peak_rss_mb,
+    }
+
+
+def scenario(args):
+    """The settings that make two runs comparable"""
+    return {
+        'target': 'external' if args.url else 'fake',
+        'uploads': args.uploads,
+        'concurrency': args.concurrency,
+        'size_mix': args.size_mix,
+        'slide_mix': args.slide_mix,
+        'files_per_upload': args.files_per_upload,
+        'corpus_size': args.corpus_size,
+        'convert_delay': args.convert_delay,
+        'convert_delay_per_mb': args.convert_delay_per_mb,
+        'pool_size': args.pool_size,
+        'cache': args.cache,
+        'env': sorted(args.env),
+    }
+
+
+def save_report(report):
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    stamp = report['timestamp'].replace(':', '').replace('-', '').replace('+0000', 'Z')
+    path = os.path.join(RESULTS_DIR, f"{stamp}_{report['revision']}.json")
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+    return path
+
+
+def previous_report(report):
+    """Most recent stored result of the same scenario from another run"""
+    if not os.path.isdir(RESULTS_DIR):
+        return None
+    for name in sorted(os.listdir(RESULTS_DIR), reverse=True):
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(RESULTS_DIR, name)) as f:
+                other = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if other.get('scenario') == report['scenario'] and other.get('timestamp') != report['timestamp']:
+            return other
+    return None
+
+
+def change(current, baseline):
+    if current is None or not baseline:
+        return ''
+    return f" ({(current - baseline) / baseline * 100:+.1f}% vs {baseline:g})"
+
+
+def print_report(report, baseline=None):
+    print("=" * 60)
+    print(f"Revision {report['revision']}  {report['timestamp']}")
+    print(f"Outcomes: {report['outcomes']}  elapsed {report['elapsed_seconds']}s")
+    base = baseline or {}
+    print(f"Throughput: {report['files_per_second']} files/s"
+          f"{change(report['files_per_second'], base.get('files_per_second'))}, "
+          f"{report['megabytes_per_second']} MB/s")
+    print(f"{'stage':<12}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}")
+    for stage, stats in report['latency'].items():
+        if not stats['count']:
+            continue
+        print(f"{stage:<12}" + ''.join(f"{stats[key]:>10.3f}" for key in ('p50', 'p95', 'p99', 'max')))
+        if baseline:
+            old = baseline['latency'].get(stage, {})
+            if old.get('count'):
+                print(f"{'  previous':<12}" + ''.join(f"{old[key]:>10.3f}" for key in ('p50', 'p95', 'p99', 'max')))
+    if report['peak_rss_mb'] is not None:
+        print(f"Peak server RSS: {report['peak_rss_mb']} MB"
+              f"{change(report['peak_rss_mb'], base.get('peak_rss_mb'))}")
+    if baseline:
+        print(f"Compared with {baseline['revision']} ({baseline['timestamp']})")
+    print("=" * 60)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the upload -> convert -> download pipeline')
+    parser.add_argument('--url', help='Benchmark a running server instead of starting one')
+    parser.add_argument('--uploads', type=int, default=40, help='Number of uploads (default: 40)')
+    parser.add_argument('--concurrency', type=int, default=4, help='Concurrent clients (default: 4)')
+    parser.add_argument('--warmup', type=int, default=1, help='Uploads run before measuring (default: 1)')
+    parser.add_argument('--corpus-size', type=int, default=20, help='Distinct files generated (default: 20)')
+    parser.add_argument('--size-mix', default='0.1:6,2:3,10:1',
+                        help='File sizes in MB with weights (default: 0.1:6,2:3,10:1)')
+    parser.add_argument('--slide-mix', default='10', help='Slide counts with weights (default: 10)')
+    parser.add_argument('--files-per-upload', default='1',
+                        help='Files per upload with weights, e.g. 1:8,5:2 (default: 1)')
+    parser.add_argument('--poll-interval', type=float, default=0.1, help='Seconds between /status polls')
+    parser.add_argument('--convert-delay', type=float, default=0.2,
+                        help='Fake engine seconds per file (default: 0.2)')
+    parser.add_argument('--convert-delay-per-mb', type=float, default=0.05,
+                        help='Fake engine extra seconds per MB (default: 0.05)')
+    parser.add_argument('--startup-delay', type=float, default=0.5,
+                        help='Fake engine startup seconds (default: 0.5)')
+    parser.add_argument('--pool-size', type=int, default=2, help='Fake engines (default: 2)')
+    parser.add_argument('--cache', action='store_true',
+                        help='Leave the conversion cache on (repeat files become cache hits)')
+    parser.add_argument('--env', action='append', default=[], metavar='KEY=VALUE',
+                        help='Extra environment for the server, e.g. PPT2PDF_INCREMENTAL_BATCH_ZIP=1')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-save', action='store_true', help='Do not store the result')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='ppt2pdf-bench-')
+    try:
+        print(f"Generating {args.corpus_size} files ({args.size_mix} MB)...")
+        corpus = generate_corpus(os.path.join(workdir, 'corpus'), args.corpus_size,
+                                 parse_mix(args.size_mix), parse_mix(args.slide_mix, int), args.seed)
+
+        process = log = None
+        base_url = args.url
+        if not base_url:
+            process, log, base_url = start_server(args, workdir)
+
+        peak_rss_mb = None
+        try:
+            print(f"Running {args.uploads} uploads with {args.concurrency} clients against {base_url}...")
+            records, elapsed = run_benchmark(args, base_url, corpus)
+        finally:
+            if process is not None:
+                peak_rss_mb = stop_server(process, log)
+
+        report = build_report(args, records, elapsed, peak_rss_mb)
+        print_report(report, previous_report(report))
+        if not args.no_save:
+            print(f"Result saved to {save_report(report)}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
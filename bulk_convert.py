@@ -0,0 +1,306 @@
+"""
+Bulk Conversion
+Command-line conversion of whole directory trees without the web server:
+
+    python -m simple_converter convert <src-dir> <dst-dir> --workers 4
+
+Every .ppt/.pptx below src-dir is converted to a PDF at the same relative
+path below dst-dir, several at a time on a pool of warm engines. A manifest
+in dst-dir records the size, modification time and hash of each converted
+source, so files whose PDF is up to date are skipped and an interrupted run
+picks up where it stopped. A throughput summary is printed at the end.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from conversion_cache import hash_file
+from export_profiles import PROFILES
+
+MANIFEST_NAME = '.ppt2pdf-manifest.json'
+WORK_DIR_NAME = '.ppt2pdf-work'
+
+# Seconds between manifest saves while a run is in progress
+MANIFEST_SAVE_INTERVAL = 5
+
+
+class Manifest:
+    """Record of converted sources, saved atomically as JSON"""
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self._lock = threading.Lock()
+        self._saved_at = time.monotonic()
+        if os.path.exists(path):
+            try:
+                with open(path, encoding='utf-8') as f:
+                    self.entries = json.load(f).get('files', {})
+            except (OSError, ValueError) as e:
+                print(f"Ignoring unreadable manifest {path}: {str(e)}")
+
+    def get(self, key):
+        with self._lock:
+            return self.entries.get(key)
+
+    def set(self, key, entry):
+        with self._lock:
+            self.entries[key] = entry
+            due = time.monotonic() - self._saved_at >= MANIFEST_SAVE_INTERVAL
+        if due:
+            self.save()
+
+    def save(self):
+        with self._lock:
+            data = json.dumps({'version': 1, 'files': self.entries}, indent=1, sort_keys=True)
+            self._saved_at = time.monotonic()
+            temp_path = self.path + '.tmp'
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                f.write(data)
+            os.replace(temp_path, self.path)
+
+
+def find_presentations(src_dir, allowed_extensions):
+    """
+    Walk src_dir for presentations
+
+    Returns:
+        list: (relative source path, relative PDF path), sorted
+    """
+    found = []
+    for directory, dirnames, filenames in os.walk(src_dir):
+        dirnames[:] = sorted(name for name in dirnames if not name.startswith('.'))
+        for name in filenames:
+            stem, ext = os.path.splitext(name)
+            # ~$ files are PowerPoint's lock files of open presentations
+            if name.startswith('~$') or ext[1:].lower() not in allowed_extensions:
+                continue
+            found.append(os.path.relpath(os.path.join(directory, name), src_dir))
+
+    # deck.ppt and deck.pptx side by side keep their extension in the PDF name
+    stems = {}
+    for rel_path in found:
+        stem = os.path.splitext(rel_path)[0].lower()
+        stems[stem] = stems.get(stem, 0) + 1
+    pairs = []
+    for rel_path in sorted(found):
+        stem = os.path.splitext(rel_path)[0]
+        pairs.append((rel_path, (rel_path if stems[stem.lower()] > 1 else stem) + '.pdf'))
+    return pairs
+
+
+def is_up_to_date(entry, stat, options, pdf_path):
+    """Check a manifest entry against the source's size and mtime"""
+    return (entry is not None and entry.get('status') == 'ok'
+            and entry.get('size') == stat.st_size and entry.get('mtime_ns') == stat.st_mtime_ns
+            and entry.get('options') == options and os.path.exists(pdf_path))
+
+
+def percentile(values, share):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+def convert_tree(converter, src_dir, dst_dir, profile=None, force=False, workers=1, out=None):
+    """
+    Convert every presentation below src_dir into dst_dir
+
+    Args:
+        converter: SimplePPTConverter whose download folder is on the same
+            filesystem as dst_dir
+        profile: Export profile name
+        force: Convert files even if their PDF is up to date
+        workers: Files handed to the engine pool at a time
+        out: Stream for progress lines (stdout if None)
+
+    Returns:
+        dict: counts, byte totals, elapsed seconds and per file times
+    """
+    out = out or sys.stdout
+    manifest = Manifest(os.path.join(dst_dir, MANIFEST_NAME))
+    options = converter.export_options(profile)
+    summary = {'total': 0, 'converted': 0, 'skipped': 0, 'failed': 0,
+               'bytes_in': 0, 'bytes_out': 0, 'bytes_saved': 0, 'durations': []}
+    summary_lock = threading.Lock()
+
+    pending = []
+    for rel_source, rel_pdf in find_presentations(src_dir, converter.allowed_extensions):
+        summary['total'] += 1
+        source_path = os.path.join(src_dir, rel_source)
+        stat = os.stat(source_path)
+        if not force and is_up_to_date(manifest.get(rel_source), stat, options, os.path.join(dst_dir, rel_pdf)):
+            summary['skipped'] += 1
+        else:
+            pending.append((rel_source, rel_pdf, stat))
+
+    print(f"{summary['total']} presentations found, {summary['skipped']} up to date, "
+          f"{len(pending)} to convert", file=out)
+
+    def convert_one(rel_source, rel_pdf, stat):
+        source_path = os.path.join(src_dir, rel_source)
+        pdf_path = os.path.join(dst_dir, rel_pdf)
+        started = time.perf_counter()
+        file_hash = hash_file(source_path)
+        entry = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': file_hash,
+                 'options': options, 'pdf': rel_pdf}
+
+        # Touched but unchanged files keep their PDF
+        previous = manifest.get(rel_source)
+        if not force and previous and previous.get('status') == 'ok' and previous.get('sha256') == file_hash \
+                and previous.get('options') == options and os.path.exists(pdf_path):
+            manifest.set(rel_source, dict(previous, size=stat.st_size, mtime_ns=stat.st_mtime_ns))
+            return 'skipped', 0, None
+
+        saved = []
+        success, produced_path, error_msg = converter.convert_ppt_to_pdf(
+            source_path,
+            os.path.basename(rel_pdf),
+            file_hash=file_hash,
+            profile=profile,
+            on_optimized=lambda before, after: saved.append(before - after)
+        )
+        if not success:
+            manifest.set(rel_source, dict(entry, status='failed', error=error_msg))
+            return 'failed', time.perf_counter() - started, error_msg
+
+        os.makedirs(os.path.dirname(pdf_path) or '.', exist_ok=True)
+        os.replace(produced_path, pdf_path)
+        converter.cleanup_file(produced_path)  # removes its now empty work folder
+        manifest.set(rel_source, dict(entry, status='ok', converted_at=time.time()))
+        with summary_lock:
+            summary['bytes_in'] += stat.st_size
+            summary['bytes_out'] += os.path.getsize(pdf_path)
+            summary['bytes_saved'] += sum(saved)
+        return 'converted', time.perf_counter() - started, None
+
+    started = time.perf_counter()
+    executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='bulk')
+    try:
+        futures = {executor.submit(convert_one, *item): item[0] for item in pending}
+        for done, future in enumerate(as_completed(futures), start=1):
+            rel_source = futures[future]
+            try:
+                outcome, seconds, error_msg = future.result()
+            except Exception as e:
+                outcome, seconds, error_msg = 'failed', 0, str(e)
+            with summary_lock:
+                summary[outcome] += 1
+                if outcome == 'converted':
+                    summary['durations'].append(seconds)
+            detail = f" - {error_msg}" if error_msg else f" ({seconds:.1f}s)" if seconds else ''
+            print(f"[{done}/{len(pending)}] {outcome} {rel_source}{detail}", file=out)
+    except KeyboardInterrupt:
+        print("Interrupted; finished files are kept and the next run resumes from here", file=out)
+        for future in futures:
+            future.cancel()
+        raise
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+        manifest.save()
+        summary['elapsed'] = time.perf_counter() - started
+    return summary
+
+
+def print_summary(summary, out=None):
+    out = out or sys.stdout
+    elapsed = max(summary['elapsed'], 1e-9)
+    mb_in = summary['bytes_in'] / (1024 * 1024)
+    mb_out = summary['bytes_out'] / (1024 * 1024)
+    print(f"Converted {summary['converted']}, skipped {summary['skipped']} (up to date), "
+          f"failed {summary['failed']} of {summary['total']} files in {summary['elapsed']:.1f}s", file=out)
+    print(f"Throughput: {summary['converted'] / elapsed:.2f} files/s, {mb_in / elapsed:.2f} MB/s of input "
+          f"({mb_in:.1f} MB in, {mb_out:.1f} MB of PDF out)", file=out)
+    if summary['durations']:
+        print(f"Per file: p50 {percentile(summary['durations'], 0.5):.2f}s, "
+              f"p95 {percentile(summary['durations'], 0.95):.2f}s", file=out)
+    if summary['bytes_saved']:
+        print(f"Optimization saved {summary['bytes_saved'] / (1024 * 1024):.1f} MB", file=out)
+
+
+def backend_options(args):
+    """Constructor options for the chosen backend, defaults from PPT2PDF_* variables"""
+    if args.backend == 'libreoffice':
+        return {'soffice_path': args.soffice_path}
+    if args.backend == 'fake':
+        return {
+            'startup_delay': float(os.environ.get('PPT2PDF_FAKE_STARTUP_DELAY', '2.0')),
+            'convert_delay': float(os.environ.get('PPT2PDF_FAKE_CONVERT_DELAY', '0.5')),
+            'convert_delay_per_mb': float(os.environ.get('PPT2PDF_FAKE_CONVERT_DELAY_PER_MB', '0')),
+        }
+    return {}
+
+
+def main(argv=None):
+    from simple_converter import SimplePPTConverter
+
+    parser = argparse.ArgumentParser(prog='python -m simple_converter',
+                                     description='Convert PowerPoint files to PDF without the web server')
+    commands = parser.add_subparsers(dest='command', required=True)
+    convert = commands.add_parser('convert', help='Convert every presentation in a directory tree')
+    convert.add_argument('src_dir')
+    convert.add_argument('dst_dir')
+    convert.add_argument('--workers', type=int, default=int(os.environ.get('PPT2PDF_POOL_SIZE', '1')),
+                         help='Conversion engines run in parallel (default: PPT2PDF_POOL_SIZE or 1; '
+                              'keep 1 for PowerPoint)')
+    convert.add_argument('--backend', default=os.environ.get('PPT2PDF_BACKEND', 'powerpoint'),
+                         choices=('powerpoint', 'libreoffice', 'fake'))
+    convert.add_argument('--soffice-path', default=os.environ.get('PPT2PDF_SOFFICE_PATH', 'soffice'))
+    convert.add_argument('--profile', default=os.environ.get('PPT2PDF_EXPORT_PROFILE', 'screen'),
+                         choices=sorted(PROFILES))
+    convert.add_argument('--no-optimize', action='store_true', help='Skip PDF post-processing')
+    convert.add_argument('--slim-media', action='store_true',
+                         default=os.environ.get('PPT2PDF_SLIM_MEDIA', '0') == '1',
+                         help='Replace video with poster frames and downsample pictures before converting')
+    convert.add_argument('--force', action='store_true', help='Convert files even if their PDF is up to date')
+    convert.add_argument('--max-file-mb', type=int, default=1024, help='Skip larger files (default: 1024)')
+    convert.add_argument('--timeout-max', type=float,
+                         default=float(os.environ.get('PPT2PDF_CONVERT_TIMEOUT_MAX', '1800')),
+                         help='Longest time one file may take, in seconds')
+    convert.add_argument('-q', '--quiet', action='store_true', help='Only print progress and the summary')
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.src_dir):
+        parser.error(f"{args.src_dir} is not a directory")
+    os.makedirs(args.dst_dir, exist_ok=True)
+
+    # PDFs are produced in a work folder next to the output and moved into
+    # place when complete, so an interrupted run never leaves partial PDFs
+    work_dir = os.path.join(args.dst_dir, WORK_DIR_NAME)
+    shutil.rmtree(work_dir, ignore_errors=True)
+
+    out = sys.stdout
+    chatter = open(os.devnull, 'w') if args.quiet else contextlib.nullcontext(sys.stdout)
+    with chatter as converter_out, contextlib.redirect_stdout(converter_out):
+        converter = SimplePPTConverter(
+            upload_folder=work_dir,
+            download_folder=work_dir,
+            backend=args.backend,
+            backend_options=backend_options(args),
+            pool_size=max(1, args.workers),
+            max_file_size=args.max_file_mb * 1024 * 1024,
+            max_timeout=args.timeout_max,
+            default_profile=args.profile,
+            optimize=not args.no_optimize,
+            slim_media=args.slim_media
+        )
+        try:
+            summary = convert_tree(converter, args.src_dir, args.dst_dir, profile=args.profile,
+                                   force=args.force, workers=max(1, args.workers) * 2, out=out)
+        except KeyboardInterrupt:
+            return 130
+        finally:
+            if converter._pool is not None:
+                converter.pool.shutdown()
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    print_summary(summary, out)
+    return 1 if summary['failed'] else 0
@@ -0,0 +1,331 @@
+"""
+Chunked Uploads
+Resumable uploads of large presentations. A client creates an upload
+session for a file, PUTs its chunks at their offsets (in any order and in
+parallel, each one a short request) and finalizes the session once every
+chunk has arrived; the assembled file is then moved into the upload folder
+and converted like any other upload. A dropped connection only costs the
+chunks in flight: the session lists the chunks it holds, so the client
+resends the rest.
+
+Each session is a folder below the session directory holding the session
+description, the file data (created at its full, sparse size so chunks are
+written in place) and a marker file per received chunk holding its
+SHA-256, so concurrent chunk requests from several web workers need no
+locking.
+"""
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+
+from upload_stream import SIGNATURE_SIZE, check_signature
+
+SESSION_FILE = 'session.json'
+DATA_FILE = 'data'
+CHUNKS_DIR = 'chunks'
+
+# Bytes read from the request body at a time
+READ_SIZE = 256 * 1024
+
+# Seconds between sweeps for abandoned sessions
+EXPIRY_INTERVAL = 60
+
+UPLOAD_ID_PATTERN = re.compile(r'[0-9a-f]{32}')
+
+
+class UploadError(Exception):
+    """A chunked upload request that cannot be served"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class UploadSessions:
+    """Upload sessions kept on disk, shared by all web workers of a host"""
+
+    def __init__(self, session_dir='upload_sessions', chunk_size=8 * 1024 * 1024,
+                 max_file_size=500 * 1024 * 1024, ttl=86400, max_sessions=200):
+        """
+        Args:
+            session_dir: Folder holding the sessions
+            chunk_size: Size of every chunk but the last
+            max_file_size: Largest file accepted
+            ttl: Seconds an idle session is kept before it is discarded
+            max_sessions: Most sessions open at once
+        """
+        self.session_dir = session_dir
+        self.chunk_size = chunk_size
+        self.max_file_size = max_file_size
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._last_expiry = 0
+        self._expiry_lock = threading.Lock()
+        os.makedirs(session_dir, exist_ok=True)
+
+    def create(self, filename, size, sha256=None):
+        """
+        Open a session for one file
+
+        Args:
+            filename: Original file name
+            size: File size in bytes
+            sha256: Optional SHA-256 of the whole file, checked on finalize
+
+        Returns:
+            dict: the session state (see state())
+
+        Raises:
+            UploadError: for a size out of range or too many open sessions
+        """
+        if not isinstance(size, int) or size <= 0:
+            raise UploadError("File is empty")
+        if size > self.max_file_size:
+            raise UploadError(f"File is too large (over {self.max_file_size // (1024 * 1024)}MB)", 413)
+        if sha256 is not None and not re.fullmatch(r'[0-9a-fA-F]{64}', str(sha256)):
+            raise UploadError("sha256 must be a hex SHA-256 digest")
+
+        self.expire()
+        if len(self._session_ids()) >= self.max_sessions:
+            raise UploadError("Too many uploads in progress, please try again later", 429)
+
+        upload_id = uuid.uuid4().hex
+        folder = self._folder(upload_id)
+        os.makedirs(os.path.join(folder, CHUNKS_DIR))
+        # Sparse until the chunks arrive; each chunk is written in place
+        with open(os.path.join(folder, DATA_FILE), 'wb') as f:
+            f.truncate(size)
+        session = {
+            'filename': filename,
+            'size': size,
+            'chunk_size': self.chunk_size,
+            'sha256': sha256.lower() if sha256 else None,
+            'created_at': time.time()
+        }
+        temp_path = os.path.join(folder, SESSION_FILE + '.tmp')
+        with open(temp_path, 'w') as f:
+            json.dump(session, f)
+        os.replace(temp_path, os.path.join(folder, SESSION_FILE))
+        return self.state(upload_id, session)
+
+    def get(self, upload_id):
+        """Session state of an upload, or None if it is unknown or expired"""
+        session = self._load(upload_id)
+        return None if session is None else self.state(upload_id, session)
+
+    def state(self, upload_id, session):
+        """
+        Public description of a session
+
+        Returns:
+            dict: upload_id, filename, size, chunk_size, chunk_count, the
+            indexes of the received chunks and whether the upload is complete
+        """
+        chunk_count = self._chunk_count(session)
+        received = self._received(upload_id)
+        return {
+            'upload_id': upload_id,
+            'filename': session['filename'],
+            'size': session['size'],
+            'chunk_size': session['chunk_size'],
+            'chunk_count': chunk_count,
+            'received': received,
+            'received_bytes': sum(self._chunk_length(session, index) for index in received),
+            'complete': len(received) == chunk_count
+        }
+
+    def write_chunk(self, upload_id, offset, stream, length, sha256=None):
+        """
+        Store one chunk. Chunks start at multiples of the chunk size and
+        are chunk_size bytes long, except the last; sending a chunk again
+        replaces it.
+
+        Args:
+            upload_id: The session
+            offset: Byte offset of the chunk in the file
+            stream: Readable request body
+            length: Content length of the request
+            sha256: Optional SHA-256 of the chunk, checked before it counts
+
+        Returns:
+            dict: the session state after the chunk was stored
+
+        Raises:
+            UploadError: for an unknown session, a misaligned or short chunk,
+            a digest mismatch or a file that is not a presentation
+        """
+        session = self._load(upload_id)
+        if session is None:
+            raise UploadError("Unknown or expired upload", 404)
+        if offset < 0 or offset >= session['size'] or offset % session['chunk_size']:
+            raise UploadError(f"Offset must be a multiple of {session['chunk_size']} within the file", 416)
+        index = offset // session['chunk_size']
+        expected = self._chunk_length(session, index)
+        if length != expected:
+            raise UploadError(f"Chunk {index} must be {expected} bytes, got {length}")
+
+        folder = self._folder(upload_id)
+        marker = os.path.join(folder, CHUNKS_DIR, str(index))
+        # A chunk sent again no longer counts until its new bytes pass the
+        # checks below; they overwrite the data the old marker vouched for
+        try:
+            os.remove(marker)
+        except FileNotFoundError:
+            pass
+
+        hasher = hashlib.sha256()
+        written = 0
+        header = b''
+        try:
+            f = open(os.path.join(folder, DATA_FILE), 'r+b')
+        except FileNotFoundError:
+            raise UploadError("Upload was finalized or cancelled", 409)
+        with f:
+            f.seek(offset)
+            while written < expected:
+                data = stream.read(min(READ_SIZE, expected - written))
+                if not data:
+                    break
+                if index == 0 and len(header) < SIGNATURE_SIZE:
+                    header += data[:SIGNATURE_SIZE - len(header)]
+                hasher.update(data)
+                f.write(data)
+                written += len(data)
+        if written != expected:
+            raise UploadError(f"Chunk {index} is incomplete ({written} of {expected} bytes)")
+        digest = hasher.hexdigest()
+        if sha256 and sha256.lower() != digest:
+            raise UploadError(f"Chunk {index} does not match its SHA-256", 422)
+
+        # The first bytes already tell whether this is a presentation
+        if index == 0:
+            error = check_signature(header)
+            if error:
+                self.discard(upload_id)
+                raise UploadError(error, 415)
+
+        try:
+            with open(marker + '.tmp', 'w') as f:
+                f.write(digest)
+            os.replace(marker + '.tmp', marker)
+        except FileNotFoundError:
+            raise UploadError("Upload was finalized or cancelled", 409)
+        return self.state(upload_id, session)
+
+    def assemble(self, upload_id, dest_path):
+        """
+        Move a complete upload to its final location
+
+        Args:
+            upload_id: The session
+            dest_path: Where the file goes (e.g. the converter's upload folder)
+
+        Returns:
+            tuple: (original file name, SHA-256 of the file)
+
+        Raises:
+            UploadError: if chunks are missing or the file does not match
+            the digest given when the session was created
+        """
+        session = self._load(upload_id)
+        if session is None:
+            raise UploadError("Unknown or expired upload", 404)
+        missing = self._chunk_count(session) - len(self._received(upload_id))
+        if missing:
+            raise UploadError(f"{missing} chunks have not been uploaded yet", 409)
+
+        folder = self._folder(upload_id)
+        # Claim the data first so a second finalize of the same session fails
+        claimed_path = os.path.join(folder, DATA_FILE + '.assembling')
+        try:
+            os.rename(os.path.join(folder, DATA_FILE), claimed_path)
+        except FileNotFoundError:
+            raise UploadError("Upload is already being finalized", 409)
+
+        try:
+            hasher = hashlib.sha256()
+            with open(claimed_path, 'rb') as f:
+                for block in iter(lambda: f.read(1024 * 1024), b''):
+                    hasher.update(block)
+            digest = hasher.hexdigest()
+            if session['sha256'] and session['sha256'] != digest:
+                raise UploadError("File does not match its SHA-256", 422)
+            shutil.move(claimed_path, dest_path)
+        finally:
+            self.discard(upload_id)
+        return session['filename'], digest
+
+    def discard(self, upload_id):
+        """Delete a session and everything received for it"""
+        if UPLOAD_ID_PATTERN.fullmatch(upload_id or ''):
+            shutil.rmtree(self._folder(upload_id), ignore_errors=True)
+
+    def expire(self, force=False):
+        """
+        Discard sessions idle for longer than the time to live. Runs at most
+        once a minute unless forced.
+
+        Returns:
+            int: number of sessions discarded
+        """
+        now = time.time()
+        with self._expiry_lock:
+            if not force and now - self._last_expiry < EXPIRY_INTERVAL:
+                return 0
+            self._last_expiry = now
+
+        expired = 0
+        for upload_id in self._session_ids():
+            folder = self._folder(upload_id)
+            try:
+                # Writing a chunk updates the data file or the chunk folder
+                last_active = max(os.path.getmtime(os.path.join(folder, name))
+                                  for name in (SESSION_FILE, DATA_FILE, CHUNKS_DIR)
+                                  if os.path.exists(os.path.join(folder, name)))
+            except (OSError, ValueError):
+                last_active = 0
+            if now - last_active > self.ttl:
+                self.discard(upload_id)
+                expired += 1
+        if expired:
+            print(f"Discarded {expired} abandoned upload sessions")
+        return expired
+
+    def _folder(self, upload_id):
+        return os.path.join(self.session_dir, upload_id)
+
+    def _session_ids(self):
+        try:
+            return [name for name in os.listdir(self.session_dir) if UPLOAD_ID_PATTERN.fullmatch(name)]
+        except OSError:
+            return []
+
+    def _load(self, upload_id):
+        if not UPLOAD_ID_PATTERN.fullmatch(upload_id or ''):
+            return None
+        try:
+            with open(os.path.join(self._folder(upload_id), SESSION_FILE)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _received(self, upload_id):
+        try:
+            names = os.listdir(os.path.join(self._folder(upload_id), CHUNKS_DIR))
+        except OSError:
+            return []
+        return sorted(int(name) for name in names if name.isdigit())
+
+    @staticmethod
+    def _chunk_count(session):
+        return -(-session['size'] // session['chunk_size'])
+
+    @staticmethod
+    def _chunk_length(session, index):
+        return min(session['chunk_size'], session['size'] - index * session['chunk_size'])
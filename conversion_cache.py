@@ -0,0 +1,193 @@
+"""
+Conversion Cache
+Disk-backed store of finished PDFs keyed on the SHA-256 of the uploaded
+presentation plus the export options. Least recently used entries are
+evicted once the cache grows past its size limit.
+
+The directory may be shared by several processes (gunicorn workers, worker
+nodes on shared storage). Recency is kept in the file modification times and
+every put() rescans the directory, so the size limit applies to the
+directory as a whole rather than to each process's view of it.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Temporary files older than this are left over from a crashed put()
+STALE_TEMP_SECONDS = 3600
+
+
+def hash_file(file_path):
+    """Return the SHA-256 hex digest of a file, read in chunks"""
+    hasher = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+class ConversionCache:
+    """Size-bounded LRU cache of converted PDFs"""
+
+    def __init__(self, cache_dir='cache', max_bytes=1024 * 1024 * 1024):
+        """
+        Args:
+            cache_dir: Directory holding the cached PDFs
+            max_bytes: Total size the cache may occupy before evicting
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> size, least recently used first
+        self._total_bytes = 0
+
+        os.makedirs(cache_dir, exist_ok=True)
+        with self._lock:
+            self._scan_locked()
+            self._evict_locked()
+
+    @staticmethod
+    def make_key(file_hash, options=None):
+        """Combine a content hash and export options into a cache key"""
+        encoded_options = json.dumps(options or {}, sort_keys=True)
+        return hashlib.sha256(f"{file_hash}:{encoded_options}".encode()).hexdigest()
+
+    def contains(self, key):
+        """Check for an entry without counting a hit or miss"""
+        return os.path.exists(self._path(key))
+
+    def get(self, key, dest_path):
+        """
+        Copy a cached PDF to dest_path
+
+        Returns:
+            bool: True on a cache hit
+        """
+        with self._lock:
+            # Entries may have been added by another process since the last scan
+            if key not in self._entries and not self._adopt_locked(key):
+                self.misses += 1
+                return False
+            self._entries.move_to_end(key)
+            self.hits += 1
+
+        cached_path = self._path(key)
+        try:
+            link_or_copy(cached_path, dest_path)
+            os.utime(cached_path)
+            return True
+        except OSError as e:
+            print(f"Cache entry {key} unreadable, dropping it: {str(e)}")
+            with self._lock:
+                self.hits -= 1
+                self.misses += 1
+                self._forget_locked(key)
+            return False
+
+    def put(self, key, pdf_path):
+        """Store a copy of a finished PDF under key"""
+        size = os.path.getsize(pdf_path)
+        if size > self.max_bytes:
+            return
+
+        # Copy under a temporary name so readers never see a partial file
+        temp_path = os.path.join(self.cache_dir, f".{uuid.uuid4().hex}.tmp")
+        try:
+            shutil.copyfile(pdf_path, temp_path)
+            os.replace(temp_path, self._path(key))
+        except OSError as e:
+            print(f"Could not add {pdf_path} to cache: {str(e)}")
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            return
+
+        with self._lock:
+            # Other processes add and evict too: size up the whole directory
+            self._scan_locked()
+            self._evict_locked()
+
+    def stats(self):
+        """Return hit/miss counters and current size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self._total_bytes,
+                'max_bytes': self.max_bytes,
+            }
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + '.pdf')
+
+    def _scan_locked(self):
+        """Rebuild the LRU order and total size from the files on disk"""
+        entries = []
+        now = time.time()
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue  # evicted by another process meanwhile
+            if name.startswith('.') and name.endswith('.tmp'):
+                # Left over from an interrupted put(); recent ones may be
+                # another process's copy in progress
+                if now - stat.st_mtime > STALE_TEMP_SECONDS:
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                continue
+            if name.endswith('.pdf'):
+                entries.append((stat.st_mtime, name[:-4], stat.st_size))
+
+        self._entries = OrderedDict((key, size) for _, key, size in sorted(entries))
+        self._total_bytes = sum(self._entries.values())
+
+    def _adopt_locked(self, key):
+        """Index an entry another process stored; False if there is none"""
+        try:
+            size = os.path.getsize(self._path(key))
+        except OSError:
+            return False
+        self._entries[key] = size
+        self._total_bytes += size
+        return True
+
+    def _evict_locked(self):
+        while self._total_bytes > self.max_bytes and self._entries:
+            key = next(iter(self._entries))
+            self._forget_locked(key)
+            self.evictions += 1
+
+    def _forget_locked(self, key):
+        self._total_bytes -= self._entries.pop(key, 0)
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+
+def link_or_copy(source, dest):
+    """Hard link when possible (instant, no extra disk), copy otherwise"""
+    try:
+        os.link(source, dest)
+    except OSError:
+        shutil.copyfile(source, dest)
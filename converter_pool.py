@@ -0,0 +1,397 @@
+"""
+Converter Pool
+A fixed set of long-lived worker threads, each owning one pre-started
+conversion engine. Jobs are handed to the workers over a queue so the engine
+startup cost is paid once per worker instead of once per file. A watchdog
+gives every job a deadline based on its size and kills engines that hang.
+"""
+
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, InvalidStateError
+
+from backends import EngineFault
+from metrics import ENGINE_RECYCLES_TOTAL, ENGINE_TIMEOUTS_TOTAL, QUEUE_WAIT_SECONDS, STAGE_SECONDS
+from split_export import count_slides
+
+
+class ConversionTimeout(Exception):
+    """Raised when a conversion ran past its deadline and its engine was killed"""
+
+
+class DeadlineModel:
+    """
+    Learns how long conversions take per MB from finished jobs and turns a
+    file size into a deadline
+    """
+
+    def __init__(self, min_timeout=60, max_timeout=1800, factor=4, history=200, min_samples=10):
+        """
+        Args:
+            min_timeout: Shortest deadline given to any job
+            max_timeout: Longest deadline, also used until enough jobs finished
+            factor: Headroom over the slow end of the observed conversion times
+            history: Number of recent jobs the estimate is based on
+            min_samples: Finished jobs needed before deadlines are learned
+        """
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.factor = factor
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=history)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _weight(size_bytes):
+        # Fixed cost of opening any file counts like one extra MB
+        return 1 + size_bytes / (1024 * 1024)
+
+    def observe(self, size_bytes, seconds):
+        """Record the duration of a successful conversion"""
+        with self._lock:
+            self._samples.append(seconds / self._weight(size_bytes))
+
+    def timeout_for(self, size_bytes):
+        """Seconds a job of this size may run before it is considered hung"""
+        with self._lock:
+            samples = sorted(self._samples)
+        if len(samples) < self.min_samples:
+            return self.max_timeout
+        slow = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+        timeout = self.factor * slow * self._weight(size_bytes)
+        return max(self.min_timeout, min(self.max_timeout, timeout))
+
+
+class ConversionJob:
+    """A single queued conversion"""
+
+    def __init__(self, source_path, pdf_path, slide_range=None, profile=None):
+        self.source_path = source_path
+        self.pdf_path = pdf_path
+        self.slide_range = slide_range
+        self.profile = profile
+        self.future = Future()
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.deadline = None
+        self.timed_out = False
+        self.lock = threading.Lock()
+        self.size = self._cost_size()
+
+    def _cost_size(self):
+        """Input bytes the job is expected to process, for its deadline"""
+        try:
+            size = os.path.getsize(self.source_path)
+        except OSError:
+            return 0
+        if self.slide_range:
+            slide_count = count_slides(self.source_path)
+            if slide_count:
+                size = size * (self.slide_range[1] - self.slide_range[0] + 1) // slide_count
+        return size
+
+    def resolve(self, result=None, error=None):
+        """Complete the future unless the watchdog already failed it"""
+        with self.lock:
+            if self.timed_out:
+                return False
+            try:
+                if error is not None:
+                    self.future.set_exception(error)
+                else:
+                    self.future.set_result(result)
+            except InvalidStateError:
+                return False
+            return True
+
+
+class PoolWorker(threading.Thread):
+    """Worker thread that owns one engine and recycles it when needed"""
+
+    def __init__(self, pool, index):
+        super().__init__(name=f"converter-worker-{index}", daemon=True)
+        self.pool = pool
+        self.index = index
+        self.backend = None
+        self.healthy = False
+        self.jobs_done = 0
+        self.recycles = 0
+        self.failed_starts = 0
+        self.last_error = None
+        self.busy = False
+        self.current_job = None
+        self.abandoned = False
+        self.started_event = threading.Event()
+
+    def run(self):
+        while not self.pool.stopping and not self.abandoned:
+            if self.backend is None and not self._start_engine():
+                continue
+
+            try:
+                job = self.pool.jobs.get(timeout=self.pool.health_check_interval)
+            except queue.Empty:
+                # Idle: make sure the engine is still alive before the next job arrives
+                if not self.backend.is_healthy():
+                    print(f"{self.name}: engine failed health check, recycling")
+                    ENGINE_RECYCLES_TOTAL.inc(reason='health_check')
+                    self._stop_engine()
+                continue
+
+            if job is None:
+                break
+
+            self.busy = True
+            try:
+                self._run_job(job)
+            finally:
+                self.busy = False
+
+        if not self.abandoned:
+            self._stop_engine()
+
+    def _start_engine(self):
+        """Start a fresh engine, backing off after repeated failures"""
+        backend = self.pool.backend_factory()
+        try:
+            started = time.time()
+            backend.start()
+            STAGE_SECONDS.observe(time.time() - started, stage='engine_start')
+            self.backend = backend
+            self.healthy = True
+            self.last_error = None
+            self.jobs_done = 0
+            self.failed_starts = 0
+            print(f"{self.name}: {backend.describe()} ready in {time.time() - started:.2f}s")
+            return True
+        except Exception as e:
+            self.healthy = False
+            self.last_error = str(e)
+            print(f"{self.name}: failed to start engine: {str(e)}")
+            try:
+                backend.stop()
+            except Exception:
+                pass
+            delay = min(self.pool.max_restart_delay, 2 ** min(self.failed_starts, 5))
+            self.failed_starts += 1
+            time.sleep(delay)
+            return False
+        finally:
+            self.started_event.set()
+
+    def _stop_engine(self):
+        if self.backend is not None:
+            self.backend.stop()
+            self.recycles += 1
+        self.backend = None
+        self.healthy = False
+
+    def _run_job(self, job):
+        if not job.future.set_running_or_notify_cancel():
+            return
+        QUEUE_WAIT_SECONDS.observe(time.time() - job.submitted_at, queue='engine')
+
+        job.started_at = time.time()
+        job.deadline = job.started_at + self.pool.deadlines.timeout_for(job.size)
+        self.current_job = job
+        try:
+            self.backend.convert(job.source_path, job.pdf_path, slide_range=job.slide_range,
+                                 profile=job.profile)
+            if job.resolve(result=job.pdf_path):
+                self.pool.deadlines.observe(job.size, time.time() - job.started_at)
+        except EngineFault as e:
+            if job.resolve(error=e):
+                print(f"{self.name}: engine fault, recycling: {str(e)}")
+                ENGINE_RECYCLES_TOTAL.inc(reason='fault')
+                self._stop_engine()
+                return
+        except Exception as e:
+            job.resolve(error=e)
+            # A failed job may have taken the engine down with it
+            if not job.timed_out and not self.backend.is_healthy():
+                print(f"{self.name}: engine unhealthy after failure, recycling")
+                ENGINE_RECYCLES_TOTAL.inc(reason='fault')
+                self._stop_engine()
+                return
+        finally:
+            self.current_job = None
+
+        if job.timed_out:
+            # The watchdog killed the engine; start a fresh one
+            ENGINE_RECYCLES_TOTAL.inc(reason='timeout')
+            if not self.abandoned:
+                self._stop_engine()
+            return
+
+        self.jobs_done += 1
+        if self.jobs_done >= self.pool.max_jobs_per_worker:
+            print(f"{self.name}: recycling engine after {self.jobs_done} jobs")
+            ENGINE_RECYCLES_TOTAL.inc(reason='max_jobs')
+            self._stop_engine()
+
+
+class ConverterPool:
+    """Pool of warm conversion engines fed from a shared job queue"""
+
+    def __init__(self, backend_factory, size=1, max_jobs_per_worker=100,
+                 health_check_interval=30, max_restart_delay=30, deadlines=None,
+                 kill_grace=30):
+        """
+        Args:
+            backend_factory: Callable returning a new ConversionBackend
+            size: Number of engines to keep running
+            max_jobs_per_worker: Jobs an engine handles before it is restarted
+            health_check_interval: Seconds between health checks of idle engines
+            max_restart_delay: Upper bound for the back-off between failed starts
+            deadlines: DeadlineModel giving each job its time limit
+            kill_grace: Seconds a worker may stay stuck after its engine was
+                killed before it is abandoned and replaced
+        """
+        self.backend_factory = backend_factory
+        self.size = max(1, int(size))
+        self.max_jobs_per_worker = max(1, int(max_jobs_per_worker))
+        self.health_check_interval = health_check_interval
+        self.max_restart_delay = max_restart_delay
+        self.deadlines = deadlines or DeadlineModel()
+        self.kill_grace = kill_grace
+        self.jobs = queue.Queue()
+        self.workers = []
+        self.stopping = False
+        self.timeouts = 0
+        self._lock = threading.Lock()
+        self._watchdog = None
+
+    def start(self):
+        """Start the workers; each one launches its engine in the background"""
+        with self._lock:
+            if self.workers:
+                return
+            self.stopping = False
+            for index in range(self.size):
+                worker = PoolWorker(self, index)
+                worker.start()
+                self.workers.append(worker)
+            self._watchdog = threading.Thread(target=self._watch, name='converter-watchdog', daemon=True)
+            self._watchdog.start()
+
+    def _watch(self):
+        """Fail jobs that run past their deadline and kill their engines"""
+        while not self.stopping:
+            time.sleep(1)
+            now = time.time()
+            with self._lock:
+                workers = list(self.workers)
+            for worker in workers:
+                job = worker.current_job
+                if job is None or job.deadline is None:
+                    continue
+                if not job.timed_out and now > job.deadline:
+                    self._time_out(worker, job)
+                elif job.timed_out and now > job.deadline + self.kill_grace:
+                    self._replace(worker)
+
+    def _time_out(self, worker, job):
+        with job.lock:
+            if job.future.done():
+                return
+            job.timed_out = True
+            limit = job.deadline - job.started_at
+            job.future.set_exception(ConversionTimeout(
+                f"Conversion did not finish within {limit:.0f}s; the engine was restarted"))
+        self.timeouts += 1
+        ENGINE_TIMEOUTS_TOTAL.inc()
+        print(f"{worker.name}: {job.source_path} timed out after {limit:.0f}s, killing engine")
+        backend = worker.backend
+        if backend is not None:
+            try:
+                backend.kill()
+            except Exception as e:
+                print(f"{worker.name}: could not kill engine: {str(e)}")
+
+    def _replace(self, worker):
+        """Give up on a worker whose thread is still stuck in a killed engine"""
+        with self._lock:
+            if worker.abandoned or worker not in self.workers or self.stopping:
+                return
+            worker.abandoned = True
+            replacement = PoolWorker(self, worker.index)
+            self.workers[self.workers.index(worker)] = replacement
+            replacement.start()
+        print(f"{worker.name}: still stuck after kill, replaced by a new worker")
+
+    def submit(self, source_path, pdf_path, slide_range=None, profile=None):
+        """
+        Queue a conversion
+
+        Args:
+            slide_range: Optional (first, last) slides to export
+            profile: Optional ExportProfile passed to the engine
+
+        Returns:
+            Future: resolves to pdf_path, or raises the conversion error
+        """
+        self.start()
+        job = ConversionJob(source_path, pdf_path, slide_range, profile)
+        self.jobs.put(job)
+        return job.future
+
+    def convert(self, source_path, pdf_path, timeout=None):
+        """
+        Convert a file and wait for the result
+
+        Returns:
+            tuple: (success: bool, error_message: str)
+        """
+        future = self.submit(source_path, pdf_path)
+        try:
+            future.result(timeout=timeout)
+            return True, None
+        except Exception as e:
+            return False, str(e)
+
+    def is_available(self, wait=None):
+        """
+        Check whether at least one engine is running
+
+        Args:
+            wait: Seconds to wait for the first engine start attempts to finish
+
+        Returns:
+            tuple: (available: bool, error_message: str)
+        """
+        self.start()
+        deadline = time.time() + (wait or 0)
+        for worker in self.workers:
+            worker.started_event.wait(max(0, deadline - time.time()))
+
+        if any(worker.healthy for worker in self.workers):
+            return True, None
+
+        errors = [worker.last_error for worker in self.workers if worker.last_error]
+        if errors:
+            return False, errors[-1]
+        return False, "No conversion engine has started yet"
+
+    def stats(self):
+        """Return a snapshot of the pool state"""
+        return {
+            'size': self.size,
+            'queued': self.jobs.qsize(),
+            'healthy_workers': sum(1 for worker in self.workers if worker.healthy),
+            'busy_workers': sum(1 for worker in self.workers if worker.busy),
+            'recycles': sum(worker.recycles for worker in self.workers),
+            'timeouts': self.timeouts,
+        }
+
+    def shutdown(self):
+        """Stop all workers and their engines"""
+        with self._lock:
+            self.stopping = True
+            for _ in self.workers:
+                self.jobs.put(None)
+            for worker in self.workers:
+                worker.join(timeout=30)
+            self.workers = []
@@ -0,0 +1,266 @@
+"""
+Export Profiles
+Named size/quality presets for the produced PDFs. A profile sets how the
+engine exports (PowerPoint intent and PDF/A, LibreOffice image settings) and
+how the optional post-processing stage rewrites the PDF: identical images
+and fonts are stored once, images larger than the profile's resolution are
+downsampled and the file is linearized for fast web view. Post-processing
+needs pikepdf, downsampling also Pillow; without them PDFs are kept as the
+engine wrote them.
+"""
+
+import hashlib
+import io
+import os
+import zlib
+
+try:
+    import pikepdf
+except ImportError:  # post-processing is skipped without pikepdf
+    pikepdf = None
+
+try:
+    from PIL import Image
+except ImportError:  # images are not downsampled without Pillow
+    Image = None
+
+# ppFixedFormatIntent values of PowerPoint's ExportAsFixedFormat
+PP_INTENT_SCREEN = 1
+PP_INTENT_PRINT = 2
+
+# Image XObjects and embedded font programs are candidates for sharing
+FONT_FILE_KEYS = ('/FontFile', '/FontFile2', '/FontFile3')
+
+
+class ExportProfile:
+    """Engine export settings and post-processing of one profile"""
+
+    def __init__(self, name, description, intent=PP_INTENT_PRINT, pdfa=False,
+                 image_dpi=None, jpeg_quality=85, optimize=True):
+        """
+        Args:
+            name: Profile name used in forms, job records and cache keys
+            description: Short text shown next to the choice
+            intent: PowerPoint ppFixedFormatIntent
+            pdfa: Export PDF/A-1 for long-term archiving
+            image_dpi: Resolution images are reduced to, relative to the
+                page they are shown on (None keeps every image)
+            jpeg_quality: JPEG quality of reduced images
+            optimize: Run the post-processing stage
+        """
+        self.name = name
+        self.description = description
+        self.intent = intent
+        self.pdfa = pdfa
+        self.image_dpi = image_dpi
+        self.jpeg_quality = jpeg_quality
+        self.optimize = optimize
+
+    def libreoffice_filter_data(self):
+        """FilterData of LibreOffice's impress_pdf_Export for this profile"""
+        data = {'Quality': self.jpeg_quality}
+        if self.image_dpi:
+            data['ReduceImageResolution'] = True
+            data['MaxImageResolution'] = self.image_dpi
+        if self.pdfa:
+            data['SelectPdfVersion'] = 1  # PDF/A-1b
+        return data
+
+
+PROFILES = {
+    profile.name: profile for profile in (
+        ExportProfile('screen', 'Small files for reading on screen',
+                      intent=PP_INTENT_SCREEN, image_dpi=150, jpeg_quality=75),
+        ExportProfile('print', 'Full quality for printing',
+                      intent=PP_INTENT_PRINT, jpeg_quality=90),
+        # Rewriting a PDF/A file could break its conformance
+        ExportProfile('archive', 'PDF/A for long-term archiving',
+                      intent=PP_INTENT_PRINT, pdfa=True, jpeg_quality=90, optimize=False),
+    )
+}
+DEFAULT_PROFILE = 'screen'
+
+
+def get_profile(name):
+    """
+    Look up a profile by name
+
+    Raises:
+        ValueError: for an unknown profile name
+    """
+    profile = PROFILES.get(name or DEFAULT_PROFILE)
+    if profile is None:
+        raise ValueError(f"Unknown export profile: {name}")
+    return profile
+
+
+def can_optimize():
+    """Return True if the post-processing stage is available"""
+    return pikepdf is not None
+
+
+def optimize_pdf(pdf_path, profile):
+    """
+    Rewrite a PDF in place according to the profile's post-processing
+
+    Returns:
+        tuple: (size before, size after) in bytes, or None if the PDF was
+            left untouched because rewriting it saved nothing
+    """
+    if pikepdf is None or not profile.optimize:
+        return None
+
+    original_size = os.path.getsize(pdf_path)
+    temp_path = pdf_path + '.optimized'
+    try:
+        with pikepdf.open(pdf_path) as pdf:
+            images = _share_identical_streams(pdf)
+            if profile.image_dpi and Image is not None:
+                _downsample_images(pdf, images, profile)
+            pdf.remove_unreferenced_resources()
+            pdf.save(temp_path, linearize=True, compress_streams=True,
+                     object_stream_mode=pikepdf.ObjectStreamMode.generate)
+
+        optimized_size = os.path.getsize(temp_path)
+        if optimized_size >= original_size:
+            return None
+        os.replace(temp_path, pdf_path)
+        return original_size, optimized_size
+    finally:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+
+
+def _stream_key(stream):
+    """Digest of a stream's data and dictionary, ignoring its object number"""
+    digest = hashlib.sha256(stream.read_raw_bytes())
+    for key in sorted(stream.keys()):
+        if key == '/Length':
+            continue
+        value = stream[key]
+        digest.update(key.encode())
+        digest.update(_stream_key(value).encode() if isinstance(value, pikepdf.Stream) else repr(value).encode())
+    return digest.hexdigest()
+
+
+def _resource_dicts(pdf):
+    """Resource dictionaries of all pages and the forms drawn on them"""
+    seen = set()
+    pending = [page.obj.get('/Resources') for page in pdf.pages]
+    while pending:
+        resources = pending.pop()
+        if not isinstance(resources, pikepdf.Dictionary):
+            continue
+        if resources.is_indirect:
+            if resources.objgen in seen:
+                continue
+            seen.add(resources.objgen)
+        yield resources
+        for xobject in (resources.get('/XObject') or {}).values():
+            if isinstance(xobject, pikepdf.Stream) and xobject.get('/Subtype') == '/Form':
+                pending.append(xobject.get('/Resources'))
+
+
+def _share_identical_streams(pdf):
+    """
+    Point every use of an identical image or font program at one copy
+
+    Returns:
+        list: the distinct image streams
+    """
+    images = {}
+    font_files = {}
+    for resources in _resource_dicts(pdf):
+        xobjects = resources.get('/XObject') or {}
+        for name in list(xobjects.keys()):
+            xobject = xobjects[name]
+            if not isinstance(xobject, pikepdf.Stream) or xobject.get('/Subtype') != '/Image':
+                continue
+            shared = images.setdefault(_stream_key(xobject), xobject)
+            if shared.objgen != xobject.objgen:
+                xobjects[name] = shared
+
+        for font in (resources.get('/Font') or {}).values():
+            descriptors = [font.get('/FontDescriptor')]
+            descriptors.extend(descendant.get('/FontDescriptor') for descendant in font.get('/DescendantFonts') or [])
+            for descriptor in descriptors:
+                if not isinstance(descriptor, pikepdf.Dictionary):
+                    continue
+                for key in FONT_FILE_KEYS:
+                    font_file = descriptor.get(key)
+                    if isinstance(font_file, pikepdf.Stream):
+                        shared = font_files.setdefault(_stream_key(font_file), font_file)
+                        if shared.objgen != font_file.objgen:
+                            descriptor[key] = shared
+    return list(images.values())
+
+
+def _downsample_images(pdf, images, profile):
+    """Re-encode images that have more pixels than the page can show at image_dpi"""
+    # An image is never shown larger than the largest page
+    largest_side = max(max(float(page.mediabox[2] - page.mediabox[0]), float(page.mediabox[3] - page.mediabox[1]))
+                       for page in pdf.pages)
+    max_pixels = int(profile.image_dpi * largest_side / 72)
+
+    for image in images:
+        if image.get('/ImageMask') or '/Mask' in image or int(image.get('/BitsPerComponent', 8)) != 8:
+            continue
+        # A /Decode array maps the samples (e.g. inverted CMYK or Gray JPEGs);
+        # the re-encoded samples would be mapped a second time
+        if '/Decode' in image:
+            continue
+        width, height = int(image.Width), int(image.Height)
+        if max(width, height) <= max_pixels:
+            continue
+        try:
+            picture = pikepdf.PdfImage(image).as_pil_image()
+        except Exception:
+            continue  # colour spaces or filters Pillow cannot handle
+        if picture.mode not in ('RGB', 'L'):
+            continue
+        # One-channel colour spaces other than gray (e.g. Separation) read as 'L' too
+        if picture.mode == 'L' and not _is_gray(image.get('/ColorSpace')):
+            continue
+
+        scale = max_pixels / max(width, height)
+        size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        output = io.BytesIO()
+        picture.resize(size, Image.LANCZOS).save(output, 'JPEG', quality=profile.jpeg_quality, optimize=True)
+        data = output.getvalue()
+        if len(data) >= len(image.read_raw_bytes()):
+            continue
+
+        # The colour space is kept, so ICC based images stay colour managed
+        image.write(data, filter=pikepdf.Name.DCTDecode)
+        if '/DecodeParms' in image:
+            del image['/DecodeParms']
+        image.Width, image.Height = size
+        image.BitsPerComponent = 8
+        if '/SMask' in image:
+            _resize_mask(image.SMask, size)
+
+
+def _is_gray(colour_space):
+    """Whether an image colour space is DeviceGray or a one-component ICC profile"""
+    if colour_space == pikepdf.Name.DeviceGray:
+        return True
+    if isinstance(colour_space, pikepdf.Array) and len(colour_space) == 2 \
+            and colour_space[0] == pikepdf.Name.ICCBased and isinstance(colour_space[1], pikepdf.Stream):
+        return int(colour_space[1].get('/N', 0)) == 1
+    return False
+
+
+def _resize_mask(mask, size):
+    """Resize a soft mask losslessly to the new size of its image"""
+    try:
+        picture = pikepdf.PdfImage(mask).as_pil_image().convert('L')
+    except Exception:
+        return
+    data = picture.resize(size, Image.LANCZOS).tobytes()
+    mask.write(zlib.compress(data), filter=pikepdf.Name.FlateDecode)
+    if '/DecodeParms' in mask:
+        del mask['/DecodeParms']
+    mask.Width, mask.Height = size
+    mask.BitsPerComponent = 8
@@ -0,0 +1,88 @@
+"""
+File Serving
+Helpers for sending finished PDFs and archives. Files get strong ETags from
+the SHA-256 of their content, computed once per file version and
+remembered, so unchanged downloads are answered with 304. Transfers can be
+handed to the front proxy with X-Accel-Redirect (nginx) or X-Sendfile
+(Apache, lighttpd) so no server worker is held while the bytes go out.
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from urllib.parse import quote
+
+from conversion_cache import hash_file
+
+SENDFILE_MODES = ('', 'x-accel-redirect', 'x-sendfile')
+
+
+class ETagCache:
+    """Content-hash ETags of files, keyed on path, size and modification time"""
+
+    def __init__(self, max_entries=4096):
+        self.max_entries = max_entries
+        self._etags = OrderedDict()
+        self._lock = threading.Lock()
+
+    def etag(self, path, digest=None):
+        """
+        ETag of a file
+
+        Args:
+            path: The file
+            digest: SHA-256 of the file if already known (hashed otherwise)
+
+        Returns:
+            str: the ETag value, unquoted
+        """
+        stat = os.stat(path)
+        key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            if key in self._etags:
+                self._etags.move_to_end(key)
+                return self._etags[key]
+        etag = digest or hash_file(path)
+        with self._lock:
+            self._etags[key] = etag
+            while len(self._etags) > self.max_entries:
+                self._etags.popitem(last=False)
+        return etag
+
+
+def combined_etag(etags):
+    """ETag of content generated from several files, e.g. a streamed ZIP"""
+    digest = hashlib.sha256()
+    for etag in etags:
+        digest.update(etag.encode())
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def attachment_header(filename):
+    """Content-Disposition value of a download, safe for any file name"""
+    return f"attachment; filename*=UTF-8''{quote(filename)}"
+
+
+def offload_headers(path, mode, accel_prefix='/protected/', accel_root='.'):
+    """
+    Headers that hand a file to the front proxy
+
+    Args:
+        path: The file to send
+        mode: 'x-accel-redirect', 'x-sendfile' or '' to send from Python
+        accel_prefix: Internal nginx location that serves accel_root
+        accel_root: Folder the prefix maps to
+
+    Returns:
+        dict: the headers, or None if the file must be sent from Python
+    """
+    if mode == 'x-sendfile':
+        return {'X-Sendfile': os.path.abspath(path)}
+    if mode == 'x-accel-redirect':
+        relative = os.path.relpath(os.path.abspath(path), os.path.abspath(accel_root))
+        if relative == os.pardir or relative.startswith(os.pardir + os.sep):
+            return None  # outside the folder nginx can see
+        return {'X-Accel-Redirect': accel_prefix.rstrip('/') + '/' + quote(relative.replace(os.sep, '/'))}
+    return None
@@ -0,0 +1,172 @@
+"""
+Job Queue
+Shared queue of batch ids between web nodes and conversion worker nodes
+(see worker.py). Web nodes put uploaded batches on it; workers claim them,
+convert, and report progress through the shared job store. A claimed id is
+removed from the queue at once; batches of a worker that dies are put back
+by the job store based recovery.
+"""
+
+import os
+import time
+import uuid
+
+from scheduler import JobScheduler
+
+try:
+    import redis
+except ImportError:  # only needed for the Redis queue
+    redis = None
+
+
+class JobQueue:
+    """Base class for shared job queues with one FIFO list per lane"""
+
+    def __init__(self, lanes=(JobScheduler.INTERACTIVE, JobScheduler.BULK)):
+        self.lanes = tuple(lanes)
+
+    def put(self, job_id, lane):
+        """Append a job id to a lane"""
+        raise NotImplementedError
+
+    def claim(self, lanes, timeout):
+        """
+        Take the oldest job id from the first non-empty lane
+
+        Args:
+            lanes: Lane names in order of preference
+            timeout: Seconds to wait for a job
+
+        Returns:
+            str: the job id, or None if nothing arrived in time
+        """
+        raise NotImplementedError
+
+    def position(self, job_id):
+        """1-based position of a job within its lane, or None if not queued"""
+        raise NotImplementedError
+
+    def qsize(self):
+        """Number of queued jobs over all lanes"""
+        raise NotImplementedError
+
+
+class SpoolJobQueue(JobQueue):
+    """
+    Queue kept as empty marker files in a spool directory, one
+    subdirectory per lane. The file name holds the enqueue time and the job
+    id; whoever manages to delete a marker owns the job. Works between
+    processes on one machine, and across machines on a shared filesystem
+    with atomic unlink.
+    """
+
+    def __init__(self, spool_dir='spool', poll_interval=0.5, **options):
+        super().__init__(**options)
+        self.spool_dir = spool_dir
+        self.poll_interval = poll_interval
+        for lane in self.lanes:
+            os.makedirs(self._lane_dir(lane), exist_ok=True)
+
+    def _lane_dir(self, lane):
+        return os.path.join(self.spool_dir, lane)
+
+    def _entries(self, lane):
+        """Marker names of a lane, oldest first"""
+        try:
+            return sorted(name for name in os.listdir(self._lane_dir(lane)) if name.endswith('.job'))
+        except OSError:
+            return []
+
+    @staticmethod
+    def _job_id(name):
+        # <time_ns>-<unique>-<job_id>.job
+        return name[:-4].split('-', 2)[2]
+
+    def put(self, job_id, lane):
+        name = f"{time.time_ns():020d}-{uuid.uuid4().hex[:8]}-{job_id}.job"
+        with open(os.path.join(self._lane_dir(lane), name), 'x'):
+            pass
+
+    def claim(self, lanes, timeout):
+        deadline = time.time() + timeout
+        while True:
+            for lane in lanes:
+                for name in self._entries(lane):
+                    try:
+                        os.remove(os.path.join(self._lane_dir(lane), name))
+                    except OSError:
+                        continue  # claimed by another worker first
+                    return self._job_id(name)
+            if time.time() >= deadline:
+                return None
+            time.sleep(self.poll_interval)
+
+    def position(self, job_id):
+        for lane in self.lanes:
+            for index, name in enumerate(self._entries(lane)):
+                if self._job_id(name) == job_id:
+                    return index + 1
+        return None
+
+    def qsize(self):
+        return sum(len(self._entries(lane)) for lane in self.lanes)
+
+
+class RedisJobQueue(JobQueue):
+    """Queue kept in Redis lists, one per lane; claims use BLPOP"""
+
+    def __init__(self, client, prefix='ppt2pdf', **options):
+        super().__init__(**options)
+        self.client = client
+        self.prefix = prefix
+
+    def _key(self, lane):
+        return f"{self.prefix}:queue:{lane}"
+
+    def put(self, job_id, lane):
+        self.client.rpush(self._key(lane), job_id)
+
+    def claim(self, lanes, timeout):
+        # BLPOP checks the keys in order, which gives the lane preference
+        item = self.client.blpop([self._key(lane) for lane in lanes], timeout=max(1, int(timeout)))
+        if item is None:
+            return None
+        return _text(item[1])
+
+    def position(self, job_id):
+        for lane in self.lanes:
+            ids = [_text(item) for item in self.client.lrange(self._key(lane), 0, -1)]
+            if job_id in ids:
+                return ids.index(job_id) + 1
+        return None
+
+    def qsize(self):
+        return sum(self.client.llen(self._key(lane)) for lane in self.lanes)
+
+
+def _text(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def create_job_queue(kind, spool_dir='spool', redis_url=None):
+    """
+    Build the configured shared queue
+
+    Args:
+        kind: '' or 'local' for in-process conversion (no shared queue),
+            'spool' or 'redis'
+        spool_dir: Directory of the spool queue
+        redis_url: Connection URL for the Redis queue
+
+    Returns:
+        JobQueue: the queue, or None for in-process conversion
+    """
+    if kind in ('', 'local'):
+        return None
+    if kind == 'spool':
+        return SpoolJobQueue(spool_dir)
+    if kind == 'redis':
+        if redis is None:
+            raise ValueError("The redis package is required for the redis job queue")
+        return RedisJobQueue(redis.Redis.from_url(redis_url or 'redis://localhost:6379/0'))
+    raise ValueError(f"Unknown job queue: {kind}")
@@ -0,0 +1,465 @@
+"""
+Job Store
+Persistent conversion job state shared by every web worker. Jobs are plain
+JSON-serialisable dicts; all changes go through atomic read-modify-write
+operations so concurrent workers never lose each other's updates.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+try:
+    import redis
+except ImportError:  # only needed for the Redis store
+    redis = None
+
+
+class JobStore:
+    """Base class for job state backends"""
+
+    def __init__(self):
+        # Wakes up threads of this process waiting for a job to change.
+        # Changes made by other processes are only seen by re-reading.
+        self._changed = threading.Condition()
+        self._change_counts = {}
+
+    def get(self, job_id):
+        """Return a copy of the job, or None if it does not exist"""
+        raise NotImplementedError
+
+    def ids_by_status(self, *statuses):
+        """Return the ids of all jobs currently in one of the given statuses"""
+        raise NotImplementedError
+
+    def ids_by_age(self, *statuses):
+        """
+        Return (job_id, updated_at) of all jobs in one of the given
+        statuses, least recently updated first
+        """
+        jobs = ((job_id, self.get(job_id)) for job_id in self.ids_by_status(*statuses))
+        return sorted(((job_id, job.get('updated_at', 0)) for job_id, job in jobs if job is not None),
+                      key=lambda item: item[1])
+
+    def _create(self, job_id, job):
+        raise NotImplementedError
+
+    def _delete(self, job_id):
+        raise NotImplementedError
+
+    def _delete_many(self, job_ids):
+        for job_id in job_ids:
+            self._delete(job_id)
+
+    def _modify(self, job_id, mutate):
+        raise NotImplementedError
+
+    def create(self, job_id, job):
+        """
+        Store a new job
+
+        Returns:
+            bool: False if a job with this id already exists
+        """
+        created = self._create(job_id, job)
+        if created:
+            self._notify(job_id)
+        return created
+
+    def delete(self, job_id):
+        """Remove a job"""
+        self._delete(job_id)
+        self._notify(job_id, forget=True)
+
+    def delete_many(self, job_ids):
+        """Remove several jobs at once"""
+        job_ids = list(job_ids)
+        if not job_ids:
+            return
+        self._delete_many(job_ids)
+        for job_id in job_ids:
+            self._notify(job_id, forget=True)
+
+    def modify(self, job_id, mutate):
+        """
+        Atomically apply mutate(job) to a stored job
+
+        mutate changes the dict in place and returns False to abort.
+
+        Returns:
+            dict: the updated job, or None if missing or aborted
+        """
+        job = self._modify(job_id, mutate)
+        if job is not None:
+            self._notify(job_id)
+        return job
+
+    def change_count(self, job_id):
+        """Number of local changes to a job, for use with wait_for_change"""
+        with self._changed:
+            return self._change_counts.get(job_id, 0)
+
+    def wait_for_change(self, job_id, seen_count, timeout):
+        """
+        Block until the job changed locally since seen_count or timeout expires
+
+        Returns:
+            int: the current change count
+        """
+        with self._changed:
+            self._changed.wait_for(
+                lambda: self._change_counts.get(job_id, 0) != seen_count, timeout)
+            return self._change_counts.get(job_id, 0)
+
+    def _notify(self, job_id, forget=False):
+        with self._changed:
+            if forget:
+                self._change_counts.pop(job_id, None)
+            else:
+                self._change_counts[job_id] = self._change_counts.get(job_id, 0) + 1
+            self._changed.notify_all()
+
+    def __contains__(self, job_id):
+        return self.get(job_id) is not None
+
+    def update(self, job_id, fields):
+        """Merge top-level fields into a job"""
+        def mutate(job):
+            job.update(fields)
+        return self.modify(job_id, mutate)
+
+    def transition(self, job_id, from_statuses, fields, expect=None):
+        """
+        Update a job only if its status is one of from_statuses and every
+        key in expect has the given value (compare-and-set)
+
+        Returns:
+            bool: True if the transition was applied
+        """
+        def mutate(job):
+            if job.get('status') not in from_statuses:
+                return False
+            for key, value in (expect or {}).items():
+                if job.get(key) != value:
+                    return False
+            job.update(fields)
+        return self.modify(job_id, mutate) is not None
+
+    def set_result(self, job_id, index, result, increments=None, fields=None):
+        """
+        Replace results[index] and bump counters in one atomic step
+
+        Args:
+            index: Position of the file in the batch
+            result: New result entry
+            increments: Mapping of counter field -> amount to add
+            fields: Extra top-level fields, or a callable computing them
+                from the updated job
+        """
+        def mutate(job):
+            job['results'][index] = result
+            for key, amount in (increments or {}).items():
+                job[key] = job.get(key, 0) + amount
+            if callable(fields):
+                job.update(fields(job))
+            elif fields:
+                job.update(fields)
+        return self.modify(job_id, mutate)
+
+
+def _stamp(job):
+    job['updated_at'] = time.time()
+    return job
+
+
+class MemoryJobStore(JobStore):
+    """Process-local store; state is lost on restart"""
+
+    def __init__(self):
+        super().__init__()
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def _create(self, job_id, job):
+        with self._lock:
+            if job_id in self._jobs:
+                return False
+            self._jobs[job_id] = json.dumps(_stamp(dict(job)))
+            return True
+
+    def get(self, job_id):
+        with self._lock:
+            data = self._jobs.get(job_id)
+        return json.loads(data) if data is not None else None
+
+    def _delete(self, job_id):
+        with self._lock:
+            self._jobs.pop(job_id, None)
+
+    def _delete_many(self, job_ids):
+        with self._lock:
+            for job_id in job_ids:
+                self._jobs.pop(job_id, None)
+
+    def ids_by_status(self, *statuses):
+        with self._lock:
+            items = list(self._jobs.items())
+        return [job_id for job_id, data in items if json.loads(data).get('status') in statuses]
+
+    def _modify(self, job_id, mutate):
+        with self._lock:
+            data = self._jobs.get(job_id)
+            if data is None:
+                return None
+            job = json.loads(data)
+            if mutate(job) is False:
+                return None
+            self._jobs[job_id] = json.dumps(_stamp(job))
+            return job
+
+
+class SQLiteJobStore(JobStore):
+    """
+    SQLite store in WAL mode. Safe to share between threads and between
+    processes on the same machine (e.g. several gunicorn workers).
+    """
+
+    def __init__(self, path='jobs.db'):
+        super().__init__()
+        self.path = path
+        self._local = threading.local()
+
+        connection = self._connection()
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                data TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        ''')
+        connection.execute('CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status)')
+        connection.execute('CREATE INDEX IF NOT EXISTS jobs_updated_at ON jobs (updated_at)')
+
+    def _connection(self):
+        """One connection per thread, in autocommit mode"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute('PRAGMA busy_timeout=30000')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+        return connection
+
+    def _create(self, job_id, job):
+        job = _stamp(dict(job))
+        try:
+            self._connection().execute(
+                'INSERT INTO jobs (id, status, data, created_at, updated_at) VALUES (?, ?, ?, ?, ?)',
+                (job_id, job.get('status', ''), json.dumps(job), job['updated_at'], job['updated_at'])
+            )
+            return True
+        except sqlite3.IntegrityError:
+            return False
+
+    def get(self, job_id):
+        row = self._connection().execute('SELECT data FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _delete(self, job_id):
+        self._connection().execute('DELETE FROM jobs WHERE id = ?', (job_id,))
+
+    def _delete_many(self, job_ids):
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.executemany('DELETE FROM jobs WHERE id = ?', [(job_id,) for job_id in job_ids])
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+
+    def ids_by_status(self, *statuses):
+        if not statuses:
+            return []
+        placeholders = ', '.join('?' for _ in statuses)
+        rows = self._connection().execute(
+            f'SELECT id FROM jobs WHERE status IN ({placeholders}) ORDER BY created_at', statuses
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def ids_by_age(self, *statuses):
+        if not statuses:
+            return []
+        placeholders = ', '.join('?' for _ in statuses)
+        rows = self._connection().execute(
+            f'SELECT id, updated_at FROM jobs WHERE status IN ({placeholders}) ORDER BY updated_at', statuses
+        ).fetchall()
+        return [(row[0], row[1]) for row in rows]
+
+    def _modify(self, job_id, mutate):
+        connection = self._connection()
+        # IMMEDIATE takes the write lock up front so the read below cannot go stale
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute('SELECT data FROM jobs WHERE id = ?', (job_id,)).fetchone()
+            if row is None:
+                connection.execute('ROLLBACK')
+                return None
+            job = json.loads(row[0])
+            if mutate(job) is False:
+                connection.execute('ROLLBACK')
+                return None
+            _stamp(job)
+            connection.execute(
+                'UPDATE jobs SET status = ?, data = ?, updated_at = ? WHERE id = ?',
+                (job.get('status', ''), json.dumps(job), job['updated_at'], job_id)
+            )
+            connection.execute('COMMIT')
+            return job
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+
+
+class RedisJobStore(JobStore):
+    """
+    Store backed by Redis or any server speaking its protocol. Jobs are JSON
+    strings; a set per status serves as the status index. Updates use
+    WATCH/MULTI/EXEC optimistic transactions.
+    """
+
+    def __init__(self, client, prefix='ppt2pdf'):
+        """
+        Args:
+            client: redis.Redis compatible client
+            prefix: Namespace for all keys
+        """
+        super().__init__()
+        self.client = client
+        self.prefix = prefix
+
+    def _job_key(self, job_id):
+        return f"{self.prefix}:job:{job_id}"
+
+    def _status_key(self, status):
+        return f"{self.prefix}:status:{status}"
+
+    def _create(self, job_id, job):
+        job = _stamp(dict(job))
+        with self.client.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(self._job_key(job_id))
+                    if pipe.exists(self._job_key(job_id)):
+                        pipe.reset()
+                        return False
+                    pipe.multi()
+                    pipe.set(self._job_key(job_id), json.dumps(job))
+                    pipe.sadd(self._status_key(job.get('status', '')), job_id)
+                    pipe.execute()
+                    return True
+                except WATCH_ERRORS:
+                    continue
+
+    def get(self, job_id):
+        data = self.client.get(self._job_key(job_id))
+        return json.loads(data) if data is not None else None
+
+    def _delete(self, job_id):
+        self._delete_many([job_id])
+
+    def _delete_many(self, job_ids):
+        keys = [self._job_key(job_id) for job_id in job_ids]
+        with self.client.pipeline() as pipe:
+            while True:
+                try:
+                    # A concurrent modify() could otherwise move a job to a
+                    # new status set between reading it and deleting it
+                    pipe.watch(*keys)
+                    jobs = pipe.mget(keys)
+                    pipe.multi()
+                    for job_id, key, data in zip(job_ids, keys, jobs):
+                        pipe.delete(key)
+                        if data is not None:
+                            pipe.srem(self._status_key(json.loads(data).get('status', '')), job_id)
+                    pipe.execute()
+                    return
+                except WATCH_ERRORS:
+                    continue
+
+    def ids_by_status(self, *statuses):
+        ids = []
+        for status in statuses:
+            ids.extend(_text(job_id) for job_id in self.client.smembers(self._status_key(status)))
+        return ids
+
+    def ids_by_age(self, *statuses):
+        ids = self.ids_by_status(*statuses)
+        if not ids:
+            return []
+        # One round trip for all jobs instead of a GET per job
+        jobs = self.client.mget([self._job_key(job_id) for job_id in ids])
+        return sorted(((job_id, json.loads(data).get('updated_at', 0))
+                       for job_id, data in zip(ids, jobs) if data is not None),
+                      key=lambda item: item[1])
+
+    def _modify(self, job_id, mutate):
+        key = self._job_key(job_id)
+        with self.client.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(key)
+                    data = pipe.get(key)
+                    if data is None:
+                        pipe.reset()
+                        return None
+                    job = json.loads(data)
+                    old_status = job.get('status', '')
+                    if mutate(job) is False:
+                        pipe.reset()
+                        return None
+                    _stamp(job)
+                    pipe.multi()
+                    pipe.set(key, json.dumps(job))
+                    if job.get('status', '') != old_status:
+                        pipe.srem(self._status_key(old_status), job_id)
+                        pipe.sadd(self._status_key(job.get('status', '')), job_id)
+                    pipe.execute()
+                    return job
+                except WATCH_ERRORS:
+                    continue
+
+
+WATCH_ERRORS = (redis.WatchError,) if redis is not None else ()
+
+
+def _text(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def create_job_store(kind, path='jobs.db', redis_url=None):
+    """
+    Build the configured job store
+
+    Args:
+        kind: 'memory', 'sqlite' or 'redis'
+        path: Database file for the SQLite store
+        redis_url: Connection URL for the Redis store
+    """
+    if kind == 'memory':
+        return MemoryJobStore()
+    if kind == 'sqlite':
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        return SQLiteJobStore(path)
+    if kind == 'redis':
+        if redis is None:
+            raise ValueError("The redis package is required for the redis job store")
+        return RedisJobStore(redis.Redis.from_url(redis_url or 'redis://localhost:6379/0'))
+    raise ValueError(f"Unknown job store: {kind}")
@@ -0,0 +1,252 @@
+"""
+Metrics
+Minimal Prometheus-compatible counters, gauges and histograms, plus timing
+spans for the stages of a conversion. Rendered in the Prometheus text
+exposition format by the /metrics endpoint.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds; covers sub-millisecond cache hits up to very long exports
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """Base class; values are kept per combination of label values"""
+
+    type_name = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+        (registry or REGISTRY).register(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        lines.extend(self._samples())
+        return '\n'.join(lines)
+
+    def _samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in items
+        ]
+
+
+class Counter(Metric):
+    """Monotonically increasing count"""
+
+    type_name = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class Gauge(Metric):
+    """Value that can go up and down, set directly or read from a callback"""
+
+    type_name = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), registry=None, function=None):
+        """
+        Args:
+            function: Optional callable returning the current value, or a
+                dict of label value tuples -> value for labelled gauges
+        """
+        super().__init__(name, documentation, labelnames, registry)
+        self.function = function
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def _samples(self):
+        if self.function is None:
+            return super()._samples()
+        try:
+            value = self.function()
+        except Exception as e:
+            print(f"Metric {self.name} callback failed: {str(e)}")
+            return []
+        items = sorted(value.items()) if isinstance(value, dict) else [((), value)]
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(item_value)}"
+            for key, item_value in items
+        ]
+
+
+class Histogram(Metric):
+    """Distribution of observed values in cumulative buckets"""
+
+    type_name = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), registry=None, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state['buckets'][index] += 1
+            state['sum'] += value
+            state['count'] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the with-block"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _samples(self):
+        with self._lock:
+            items = sorted((key, dict(state, buckets=list(state['buckets']))) for key, state in self._values.items())
+
+        lines = []
+        for key, state in items:
+            for bound, count in zip(self.buckets, state['buckets']):
+                labels = _format_labels(self.labelnames, key, ('le', _format_value(float(bound))))
+                lines.append(f"{self.name}_bucket{labels} {count}")
+            labels = _format_labels(self.labelnames, key, ('le', '+Inf'))
+            lines.append(f"{self.name}_bucket{labels} {state['count']}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(state['sum'])}")
+            lines.append(f"{self.name}_count{labels} {state['count']}")
+        return lines
+
+
+class Registry:
+    """Collection of metrics rendered together"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+
+    def unregister(self, name):
+        with self._lock:
+            self._metrics.pop(name, None)
+
+    def render(self):
+        """Return all metrics in the Prometheus text exposition format"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return '\n'.join(metric.render() for metric in metrics) + '\n'
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = Histogram(
+    'ppt2pdf_stage_seconds',
+    'Time spent in each stage of the upload and conversion pipeline',
+    ['stage']
+)
+QUEUE_WAIT_SECONDS = Histogram(
+    'ppt2pdf_queue_wait_seconds',
+    'Time jobs wait before a worker picks them up',
+    ['queue']
+)
+CONVERSIONS_TOTAL = Counter(
+    'ppt2pdf_conversions_total',
+    'Finished file conversions by outcome (success, cached, coalesced, failed, timeout)',
+    ['result']
+)
+CONVERTED_BYTES_TOTAL = Counter(
+    'ppt2pdf_converted_bytes_total',
+    'Bytes of presentations converted and PDFs produced',
+    ['kind']
+)
+OPEN_ATTEMPTS_TOTAL = Counter(
+    'ppt2pdf_open_attempts_total',
+    'Attempts to open a presentation in the conversion engine',
+    ['outcome']
+)
+ENGINE_RECYCLES_TOTAL = Counter(
+    'ppt2pdf_engine_recycles_total',
+    'Conversion engines restarted by the pool',
+    ['reason']
+)
+ENGINE_TIMEOUTS_TOTAL = Counter(
+    'ppt2pdf_engine_timeouts_total',
+    'Conversions that ran past their deadline and had their engine killed'
+)
+OPTIMIZED_BYTES_SAVED_TOTAL = Counter(
+    'ppt2pdf_optimized_bytes_saved_total',
+    'Bytes removed from PDFs by the post-processing stage'
+)
+EXPIRED_JOBS_TOTAL = Counter(
+    'ppt2pdf_expired_jobs_total',
+    'Finished jobs removed by the reaper (ttl, limit, disk)',
+    ['reason']
+)
+RECLAIMED_BYTES_TOTAL = Counter(
+    'ppt2pdf_reclaimed_bytes_total',
+    'Bytes of files deleted by the reaper (job files or orphans)',
+    ['kind']
+)
+SLIMMED_BYTES_TOTAL = Counter(
+    'ppt2pdf_slimmed_bytes_total',
+    'Bytes removed from presentations by media slimming before conversion'
+)
+PREFLIGHT_REJECTED_TOTAL = Counter(
+    'ppt2pdf_preflight_rejected_total',
+    'Uploads rejected by the preflight inspection (zip_bomb, too_many_slides, corrupt, ...)',
+    ['reason']
+)
+
+
+@contextmanager
+def span(stage):
+    """Time a pipeline stage into ppt2pdf_stage_seconds"""
+    with STAGE_SECONDS.time(stage=stage):
+        yield
@@ -0,0 +1,375 @@
+"""
+PPTX Slimming
+Optional rewrite of a .pptx before it is converted, so the engine opens less
+data. Embedded video and audio are replaced by their poster frames (a PDF can
+only show the poster anyway), pictures with more pixels than their size on
+the slide needs at the target resolution are downsampled, and slide layouts
+and masters no slide uses are dropped. The package is streamed part by part;
+only XML parts that are edited and pictures that are downsampled are read
+into memory. Downsampling needs Pillow; the other steps work without it.
+"""
+
+import io
+import os
+import posixpath
+import re
+import shutil
+import urllib.parse
+import zipfile
+
+try:
+    from PIL import Image
+except ImportError:  # pictures are kept as they are without Pillow
+    Image = None
+
+EMU_PER_INCH = 914400
+COPY_CHUNK_SIZE = 1024 * 1024
+
+# Relationship types are compared by their last path segment
+MEDIA_RELS = ('video', 'audio', 'media')
+IMAGE_REL = 'image'
+
+# Resolution pictures are reduced to when the profile does not set one
+DEFAULT_MAX_DPI = 300
+
+# Pictures are left alone unless they are at least this large and have
+# RESIZE_SLACK times the pixels they need
+MIN_RESIZE_BYTES = 100 * 1024
+RESIZE_SLACK = 1.25
+RESIZABLE = {'.jpg': 'JPEG', '.jpeg': 'JPEG', '.png': 'PNG'}
+
+# Only parts in these folders are deleted when nothing refers to them any more
+COLLECTABLE = ('ppt/media/', 'ppt/embeddings/', 'ppt/slideLayouts/', 'ppt/slideMasters/', 'ppt/theme/')
+
+# Parts whose pictures are measured; pictures also used elsewhere are kept
+MEASURED = re.compile(r'^ppt/(slides|slideLayouts|slideMasters)/[^/]+\.xml$')
+
+RELATIONSHIP = re.compile(rb'<Relationship\b[^>]*?(?:/>|>\s*</Relationship>)', re.S)
+OVERRIDE = re.compile(rb'<Override\b[^>]*?(?:/>|>\s*</Override>)', re.S)
+MEDIA_ELEMENT = re.compile(rb'<(\w+:|)(videoFile|audioFile|quickTimeFile)\b[^>]*?(?:/>|>.*?</\1\2>)', re.S)
+# p14:media, the embedded copy of a video, lives in this extension
+MEDIA_EXTENSION = re.compile(rb'<(\w+:|)ext\b[^>]*uri="\{DAA4B4D4-6D71-4841-9C94-3DE7FCFB9230\}"[^>]*>.*?</\1ext>', re.S)
+MEDIA_ACTION = re.compile(rb'<(\w+:|)hlinkClick\b[^>]*?action="ppaction://media"[^>]*?(?:/>|>.*?</\1hlinkClick>)', re.S)
+TIMING = re.compile(rb'<(\w+:|)timing\b[^>]*?(?:/>|>.*?</\1timing>)', re.S)
+PICTURE = re.compile(rb'<(\w+:|)pic\b.*?</\1pic>', re.S)
+BLIP = re.compile(rb'<(?:\w+:)?blip\b[^>]*?\b\w+:embed="([^"]+)"')
+EXTENT = re.compile(rb'<(?:\w+:)?ext\b[^>]*?\bcx="(\d+)"[^>]*?\bcy="(\d+)"')
+SOURCE_RECT = re.compile(rb'<(?:\w+:)?srcRect\b([^>]*)/?>')
+SLIDE_SIZE = re.compile(rb'<(?:\w+:)?sldSz\b[^>]*?\bcx="(\d+)"[^>]*?\bcy="(\d+)"')
+
+
+class _Rel:
+    """One <Relationship> of a .rels part"""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.id = _attribute(raw, b'Id')
+        self.type = _attribute(raw, b'Type').rsplit('/', 1)[-1]
+        self.target = urllib.parse.unquote(_attribute(raw, b'Target'))
+        self.external = _attribute(raw, b'TargetMode') == 'External'
+
+
+def _attribute(element, name):
+    match = re.search(rb'\b' + name + rb'="([^"]*)"', element)
+    return match.group(1).decode('utf-8') if match else ''
+
+
+def _rels_name(part):
+    """Name of the .rels part of a part ('' for the package)"""
+    folder, name = posixpath.split(part)
+    return posixpath.join(folder, '_rels', name + '.rels')
+
+
+def _part_of(rels_name):
+    folder, name = posixpath.split(rels_name)
+    return posixpath.join(posixpath.dirname(folder), name[:-len('.rels')])
+
+
+def _resolve(part, target):
+    if target.startswith('/'):
+        return target[1:]
+    return posixpath.normpath(posixpath.join(posixpath.dirname(part), target))
+
+
+def can_slim_images():
+    """Return True if pictures can be downsampled"""
+    return Image is not None
+
+
+def slim_pptx(source_path, dest_path, max_dpi=None, jpeg_quality=85):
+    """
+    Write a slimmed copy of a .pptx
+
+    Args:
+        source_path: The presentation
+        dest_path: Where the slimmed copy is written
+        max_dpi: Resolution pictures are reduced to, relative to their size
+            on the slide (None keeps every picture)
+        jpeg_quality: JPEG quality of reduced pictures
+
+    Returns:
+        dict: what was removed and the sizes before and after, or None if
+            there was nothing to slim (dest_path is not written then)
+
+    Raises:
+        zipfile.BadZipFile, KeyError: if the package is damaged
+    """
+    report = {'media_removed': 0, 'images_resized': 0, 'layouts_removed': 0,
+              'masters_removed': 0, 'parts_removed': 0,
+              'size_before': os.path.getsize(source_path)}
+
+    with zipfile.ZipFile(source_path) as package:
+        entries = package.infolist()
+        names = {entry.filename.lower(): entry.filename for entry in entries}
+        rels = {entry.filename: [_Rel(raw) for raw in RELATIONSHIP.findall(package.read(entry))]
+                for entry in entries if entry.filename.endswith('.rels')}
+        original_rels = {name: list(items) for name, items in rels.items()}
+        edited = {}
+
+        def read(part):
+            return edited[part] if part in edited else package.read(part)
+
+        _replace_media(read, names, rels, edited, report)
+        _drop_unused_layouts(read, names, rels, edited, report)
+
+        dropped = _unreachable(names, rels)
+        report['parts_removed'] = len(dropped)
+        for part in list(dropped):
+            dropped.add(_rels_name(part))
+
+        resize = {}
+        if max_dpi and Image is not None:
+            resize = _resize_candidates(package, read, names, rels, dropped, max_dpi)
+
+        changed_rels = {name for name, items in rels.items() if items != original_rels[name]}
+        if not (edited or changed_rels or dropped or resize):
+            return None
+
+        if dropped:
+            edited['[Content_Types].xml'] = _prune_content_types(package.read('[Content_Types].xml'), dropped)
+        for name in changed_rels:
+            xml = package.read(name)
+            kept = {rel.id for rel in rels[name]}
+            for rel in original_rels[name]:
+                if rel.id not in kept:
+                    xml = xml.replace(rel.raw, b'', 1)
+            edited[name] = xml
+
+        with zipfile.ZipFile(dest_path, 'w', zipfile.ZIP_DEFLATED, allowZip64=True) as output:
+            for entry in entries:
+                name = entry.filename
+                if name in dropped:
+                    continue
+                info = zipfile.ZipInfo(name, date_time=entry.date_time)
+                info.compress_type = entry.compress_type
+                if name in edited:
+                    info.compress_type = zipfile.ZIP_DEFLATED
+                    output.writestr(info, edited[name])
+                    continue
+                if name in resize:
+                    data = _downsample(package, entry, resize[name], jpeg_quality)
+                    if data is not None:
+                        info.compress_type = zipfile.ZIP_STORED
+                        output.writestr(info, data)
+                        report['images_resized'] += 1
+                        continue
+                with package.open(entry) as src, \
+                        output.open(info, 'w', force_zip64=entry.file_size > 0x7FFFFFFF) as dst:
+                    shutil.copyfileobj(src, dst, COPY_CHUNK_SIZE)
+
+    report['size_after'] = os.path.getsize(dest_path)
+    return report
+
+
+def _replace_media(read, names, rels, edited, report):
+    """Turn video and audio shapes into plain pictures of their poster frame"""
+    for rels_name, items in rels.items():
+        part = _part_of(rels_name)
+        media = [rel for rel in items if rel.type in MEDIA_RELS]
+        if not media or part not in names.values():
+            continue
+
+        xml = read(part)
+        xml, count = MEDIA_ELEMENT.subn(b'', xml)
+        if not count:
+            continue
+        xml = MEDIA_EXTENSION.sub(b'', xml)
+        xml = MEDIA_ACTION.sub(b'', xml)
+        # Media timing nodes point at the shapes; a PDF has no animations
+        xml = TIMING.sub(b'', xml)
+        edited[part] = xml
+
+        # Relationships still referenced (e.g. sounds of actions) are kept
+        unused = {rel.id for rel in media if f'"{rel.id}"'.encode() not in xml}
+        rels[rels_name] = [rel for rel in items if rel.id not in unused]
+        report['media_removed'] += count
+
+
+def _drop_unused_layouts(read, names, rels, edited, report):
+    """Remove layouts no slide uses, and masters none of whose layouts are used"""
+    presentation = 'ppt/presentation.xml'
+    presentation_rels = _rels_name(presentation)
+    slides = [_resolve(presentation, rel.target) for rel in rels.get(presentation_rels, [])
+              if rel.type == 'slide']
+    if not slides or presentation not in names.values():
+        return
+
+    used = set()
+    for slide in slides:
+        for rel in rels.get(_rels_name(slide), []):
+            if rel.type == 'slideLayout':
+                used.add(_resolve(slide, rel.target).lower())
+
+    for master_rel in [rel for rel in rels[presentation_rels] if rel.type == 'slideMaster']:
+        master = _resolve(presentation, master_rel.target)
+        master_rels = _rels_name(master)
+        layouts = [rel for rel in rels.get(master_rels, []) if rel.type == 'slideLayout']
+        unused = [rel for rel in layouts if _resolve(master, rel.target).lower() not in used]
+        if not unused:
+            continue
+
+        if len(unused) == len(layouts):
+            xml, count = _remove_id_element(read(presentation), b'sldMasterId', master_rel.id)
+            if count:
+                edited[presentation] = xml
+                rels[presentation_rels] = [rel for rel in rels[presentation_rels] if rel is not master_rel]
+                report['masters_removed'] += 1
+                report['layouts_removed'] += len(unused)
+            continue
+
+        xml = read(master)
+        removed = set()
+        for rel in unused:
+            xml, count = _remove_id_element(xml, b'sldLayoutId', rel.id)
+            if count:
+                removed.add(rel.id)
+        if removed:
+            edited[master] = xml
+            rels[master_rels] = [rel for rel in rels[master_rels] if rel.id not in removed]
+            report['layouts_removed'] += len(removed)
+
+
+def _remove_id_element(xml, tag, rel_id):
+    """Remove the list entry (e.g. <p:sldLayoutId r:id="rId3"/>) pointing at a relationship"""
+    pattern = re.compile(rb'<(\w+:|)' + tag + rb'\b[^>]*?\b\w+:id="' + re.escape(rel_id.encode())
+                         + rb'"[^>]*?(?:/>|>.*?</\1' + tag + rb'>)', re.S)
+    return pattern.subn(b'', xml)
+
+
+def _unreachable(names, rels):
+    """Collectable parts no relationship leads to from the package root"""
+    reachable = set()
+    pending = ['']
+    while pending:
+        part = pending.pop()
+        for rel in rels.get(_rels_name(part), []):
+            if rel.external:
+                continue
+            target = _resolve(part, rel.target).lower()
+            if target in names and target not in reachable:
+                reachable.add(target)
+                pending.append(names[target])
+    return {name for lower, name in names.items()
+            if name.startswith(COLLECTABLE) and not name.endswith(('/', '.rels')) and lower not in reachable}
+
+
+def _resize_candidates(package, read, names, rels, dropped, max_dpi):
+    """
+    Pictures with more pixels than their largest use on a slide needs
+
+    Returns:
+        dict: part name -> (width, height) in pixels to reduce it to
+    """
+    match = SLIDE_SIZE.search(package.read('ppt/presentation.xml'))
+    slide_size = (int(match.group(1)), int(match.group(2))) if match else (12192000, 6858000)
+
+    extents = {}   # picture -> largest (cx, cy) it is shown at, in EMU
+    unknown = set()
+    for rels_name, items in rels.items():
+        part = _part_of(rels_name)
+        images = {rel.id: _resolve(part, rel.target) for rel in items
+                  if rel.type == IMAGE_REL and not rel.external}
+        if not images or part in dropped:
+            continue
+        if not MEASURED.match(part):
+            unknown.update(images.values())
+            continue
+
+        xml = read(part)
+        for picture in PICTURE.finditer(xml):
+            blip, extent = BLIP.search(picture.group(0)), EXTENT.search(picture.group(0))
+            if not blip or not extent or blip.group(1).decode() not in images:
+                continue
+            cx, cy = int(extent.group(1)), int(extent.group(2))
+            # Cropped pictures show only part of their pixels at that size
+            crop = SOURCE_RECT.search(picture.group(0))
+            if crop:
+                edges = {key: int(_attribute(crop.group(1), key.encode()) or 0) for key in ('l', 'r', 't', 'b')}
+                cx = cx / max(0.01, 1 - (edges['l'] + edges['r']) / 100000)
+                cy = cy / max(0.01, 1 - (edges['t'] + edges['b']) / 100000)
+            target = images[blip.group(1).decode()]
+            shown = extents.get(target, (0, 0))
+            extents[target] = (max(shown[0], cx), max(shown[1], cy))
+
+        # Backgrounds and shape fills can cover the whole slide
+        rest = PICTURE.sub(b'', xml)
+        for rel_id, target in images.items():
+            if f'"{rel_id}"'.encode() in rest:
+                shown = extents.get(target, (0, 0))
+                extents[target] = (max(shown[0], slide_size[0]), max(shown[1], slide_size[1]))
+
+    candidates = {}
+    for target, (cx, cy) in extents.items():
+        name = names.get(target.lower())
+        if name is None or target in unknown or name in dropped:
+            continue
+        entry = package.getinfo(name)
+        if entry.file_size < MIN_RESIZE_BYTES or posixpath.splitext(name)[1].lower() not in RESIZABLE:
+            continue
+        try:
+            with package.open(entry) as f:
+                width, height = Image.open(f).size
+        except Exception:
+            continue
+        needed = (cx / EMU_PER_INCH * max_dpi, cy / EMU_PER_INCH * max_dpi)
+        scale = max(needed[0] / width, needed[1] / height)
+        if scale * RESIZE_SLACK < 1:
+            candidates[name] = (max(1, round(width * scale)), max(1, round(height * scale)))
+    return candidates
+
+
+def _downsample(package, entry, size, jpeg_quality):
+    """Re-encode a picture at size in its own format; None if that does not make it smaller"""
+    image_format = RESIZABLE[posixpath.splitext(entry.filename)[1].lower()]
+    try:
+        with package.open(entry) as f:
+            picture = Image.open(io.BytesIO(f.read()))
+            if image_format == 'JPEG':
+                # Lets the JPEG decoder skip the detail that is thrown away
+                picture.draft(picture.mode, size)
+            options = {key: picture.info[key] for key in ('icc_profile', 'exif', 'dpi') if key in picture.info}
+            # A transparent colour or palette entry does not survive
+            # resampling; an alpha channel does
+            if 'transparency' in picture.info:
+                picture = picture.convert('RGBA')
+            resized = picture.resize(size, Image.LANCZOS)
+    except Exception:
+        return None
+
+    output = io.BytesIO()
+    if image_format == 'JPEG':
+        resized.save(output, 'JPEG', quality=jpeg_quality, optimize=True, **options)
+    else:
+        resized.save(output, 'PNG', optimize=True, **options)
+    data = output.getvalue()
+    return data if len(data) < entry.file_size else None
+
+
+def _prune_content_types(xml, dropped):
+    """Remove the content type overrides of deleted parts"""
+    dropped = {'/' + name.lower() for name in dropped}
+
+    def keep(match):
+        return b'' if _attribute(match.group(0), b'PartName').lower() in dropped else match.group(0)
+
+    return OVERRIDE.sub(keep, xml)
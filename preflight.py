@@ -0,0 +1,388 @@
+"""
+Preflight
+Inspects presentations before they are queued, without a conversion engine.
+For .pptx only the zip central directory and the small presentation part are
+read; for .ppt only the OLE2 directory and two small streams. The result
+feeds a cost model used to order jobs and estimate when they will finish,
+and decks that would tie up an engine for nothing (zip bombs, absurd slide
+counts, encrypted files) are rejected up front.
+"""
+
+import struct
+import threading
+import zipfile
+import zlib
+from collections import deque
+
+from split_export import SLIDE_ID_PATTERN
+from upload_stream import OLE2_MAGIC, ZIP_MAGIC
+
+MB = 1024 * 1024
+
+# Limits applied when the caller does not pass its own
+MAX_SLIDES = 2000
+MAX_UNPACKED_SIZE = 2048 * MB
+MAX_COMPRESSION_RATIO = 100
+MAX_ENTRIES = 20000
+
+# Parts smaller than this are not checked for their compression ratio;
+# XML compresses very well and small parts cannot do harm
+RATIO_CHECK_MIN_SIZE = 10 * MB
+
+# ppt/presentation.xml is read to count slides; larger ones are suspicious
+MAX_PRESENTATION_PART = 16 * MB
+
+IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'bmp', 'tif', 'tiff', 'emf', 'wmf', 'svg', 'webp', 'jfif'}
+MEDIA_PREFIXES = ('ppt/media/', 'ppt/embeddings/')
+
+
+class PreflightError(Exception):
+    """Raised for files that must not reach a conversion engine"""
+
+    def __init__(self, message, reason):
+        super().__init__(message)
+        self.reason = reason
+
+
+class DeckInfo:
+    """What a preflight inspection found out about a presentation"""
+
+    FIELDS = ('container', 'file_size', 'slide_count', 'media_bytes', 'media_count',
+              'image_count', 'unpacked_bytes')
+
+    def __init__(self, container, file_size, slide_count=None, media_bytes=0, media_count=0,
+                 image_count=0, unpacked_bytes=0):
+        self.container = container  # 'ooxml' or 'ole2'
+        self.file_size = file_size
+        self.slide_count = slide_count  # None if the file does not say
+        self.media_bytes = media_bytes
+        self.media_count = media_count
+        self.image_count = image_count
+        self.unpacked_bytes = unpacked_bytes
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**{field: data.get(field) for field in cls.FIELDS if field in data})
+
+
+def inspect_deck(file_path, max_slides=MAX_SLIDES, max_unpacked_size=MAX_UNPACKED_SIZE,
+                 max_compression_ratio=MAX_COMPRESSION_RATIO, max_entries=MAX_ENTRIES):
+    """
+    Inspect a .ppt or .pptx and check it against the limits
+
+    Args:
+        file_path: Path to the presentation
+        max_slides: Most slides a deck may have (0 for no limit)
+        max_unpacked_size: Most bytes a .pptx may unpack to
+        max_compression_ratio: Highest unpacked/packed ratio of a large part
+        max_entries: Most parts a .pptx may contain
+
+    Returns:
+        DeckInfo
+
+    Raises:
+        PreflightError: if the file is damaged, not a presentation or over a limit
+    """
+    with open(file_path, 'rb') as f:
+        magic = f.read(len(OLE2_MAGIC))
+        f.seek(0, 2)
+        file_size = f.tell()
+        f.seek(0)
+        if magic.startswith(ZIP_MAGIC):
+            info = _inspect_ooxml(f, file_size, max_unpacked_size, max_compression_ratio, max_entries)
+        elif magic == OLE2_MAGIC:
+            info = _inspect_ole2(f, file_size)
+        else:
+            raise PreflightError("File is not a PowerPoint presentation", 'not_presentation')
+
+    if max_slides and info.slide_count and info.slide_count > max_slides:
+        raise PreflightError(f"Presentation has {info.slide_count} slides (at most {max_slides} allowed)",
+                             'too_many_slides')
+    return info
+
+
+def _inspect_ooxml(f, file_size, max_unpacked_size, max_compression_ratio, max_entries):
+    try:
+        package = zipfile.ZipFile(f)
+    except (zipfile.BadZipFile, OSError, ValueError) as e:
+        raise PreflightError(f"Presentation is damaged: {str(e)}", 'corrupt')
+
+    with package:
+        entries = package.infolist()
+        if len(entries) > max_entries:
+            raise PreflightError(f"Presentation has {len(entries)} parts (at most {max_entries} allowed)",
+                                 'too_many_entries')
+
+        info = DeckInfo('ooxml', file_size)
+        for entry in entries:
+            info.unpacked_bytes += entry.file_size
+            if entry.file_size >= RATIO_CHECK_MIN_SIZE and \
+                    entry.file_size > max_compression_ratio * max(entry.compress_size, 1):
+                raise PreflightError(f"Presentation part {entry.filename} unpacks to "
+                                     f"{entry.file_size // MB}MB from {entry.compress_size} bytes",
+                                     'zip_bomb')
+            if entry.filename.startswith(MEDIA_PREFIXES) and not entry.is_dir():
+                info.media_bytes += entry.file_size
+                info.media_count += 1
+                if entry.filename.rsplit('.', 1)[-1].lower() in IMAGE_EXTENSIONS:
+                    info.image_count += 1
+        if info.unpacked_bytes > max_unpacked_size:
+            raise PreflightError(f"Presentation unpacks to {info.unpacked_bytes // MB}MB "
+                                 f"(at most {max_unpacked_size // MB}MB allowed)", 'zip_bomb')
+
+        try:
+            presentation = package.getinfo('ppt/presentation.xml')
+        except KeyError:
+            raise PreflightError("File is not a PowerPoint presentation", 'not_presentation')
+        if presentation.file_size > MAX_PRESENTATION_PART:
+            raise PreflightError("Presentation part is too large", 'zip_bomb')
+        try:
+            info.slide_count = len(SLIDE_ID_PATTERN.findall(package.read(presentation)))
+        # zlib.error for a damaged deflate stream, NotImplementedError for an
+        # unknown compression method, RuntimeError for an encrypted part
+        except (zipfile.BadZipFile, OSError, ValueError, EOFError, zlib.error, NotImplementedError,
+                RuntimeError) as e:
+            raise PreflightError(f"Presentation is damaged: {str(e)}", 'corrupt')
+    return info
+
+
+# OLE2 (Compound File Binary) special sector numbers
+FREE_SECTOR = 0xFFFFFFFF
+END_OF_CHAIN = 0xFFFFFFFE
+STREAM_ENTRY = 2
+ROOT_ENTRY = 5
+
+# Property 0x07 of the DocumentSummaryInformation property set is the slide count
+SLIDE_COUNT_PROPERTY = 0x07
+VT_I4 = 0x03
+
+# Records in the Pictures stream; BLIPs are the stored images
+BLIP_FIRST, BLIP_LAST = 0xF018, 0xF117
+BSE_RECORD = 0xF007
+
+
+def _inspect_ole2(f, file_size):
+    try:
+        compound = CompoundFile(f, file_size)
+    except (ValueError, struct.error) as e:
+        raise PreflightError(f"Presentation is damaged: {str(e)}", 'corrupt')
+
+    names = compound.streams
+    if 'EncryptedPackage' in names or 'EncryptedSummary' in names:
+        raise PreflightError("Password-protected presentations cannot be converted", 'encrypted')
+    if 'PowerPoint Document' not in names:
+        raise PreflightError("File is not a PowerPoint presentation", 'not_presentation')
+
+    info = DeckInfo('ole2', file_size)
+    info.unpacked_bytes = sum(size for _, size in names.values())
+    try:
+        if '\x05DocumentSummaryInformation' in names:
+            info.slide_count = _slide_count_property(compound.read('\x05DocumentSummaryInformation', 64 * 1024))
+        if 'Pictures' in names:
+            info.media_bytes = names['Pictures'][1]
+            info.image_count = info.media_count = _count_blips(compound, 'Pictures')
+    except (ValueError, struct.error) as e:
+        raise PreflightError(f"Presentation is damaged: {str(e)}", 'corrupt')
+    return info
+
+
+def _slide_count_property(data):
+    """Slide count from a DocumentSummaryInformation stream, or None"""
+    if len(data) < 48:
+        return None
+    set_offset = struct.unpack_from('<I', data, 44)[0]
+    _, count = struct.unpack_from('<II', data, set_offset)
+    for index in range(min(count, 256)):
+        prop_id, prop_offset = struct.unpack_from('<II', data, set_offset + 8 + 8 * index)
+        if prop_id == SLIDE_COUNT_PROPERTY:
+            prop_type, value = struct.unpack_from('<HxxI', data, set_offset + prop_offset)
+            return value if prop_type == VT_I4 else None
+    return None
+
+
+def _count_blips(compound, name, max_records=100000):
+    """Count the images in the Pictures stream by walking its record headers"""
+    count = 0
+    offset = 0
+    size = compound.streams[name][1]
+    for _ in range(max_records):
+        if offset + 8 > size:
+            break
+        _, record_type, length = struct.unpack('<HHI', compound.read(name, 8, offset))
+        if BLIP_FIRST <= record_type <= BLIP_LAST or record_type == BSE_RECORD:
+            count += 1
+        offset += 8 + length
+    return count
+
+
+class CompoundFile:
+    """
+    Minimal reader of the OLE2 container used by .ppt files: the directory
+    and reads of byte ranges of streams, each sector read on demand
+    """
+
+    def __init__(self, f, file_size):
+        self._f = f
+        header = self._read_at(0, 512)
+        if header[:8] != OLE2_MAGIC:
+            raise ValueError("not an OLE2 file")
+        sector_shift, mini_shift = struct.unpack_from('<HH', header, 0x1E)
+        if sector_shift not in (9, 12) or mini_shift != 6:
+            raise ValueError("unsupported sector size")
+        self.sector_size = 1 << sector_shift
+        self.mini_size = 1 << mini_shift
+        self.sector_count = max(0, (file_size - self.sector_size) // self.sector_size + 1)
+        fat_count, directory_start = struct.unpack_from('<II', header, 0x2C)
+        self.mini_cutoff, mini_fat_start, _, difat_start, difat_count = struct.unpack_from('<IIIII', header, 0x38)
+
+        # Sectors of the FAT are listed in the header and in DIFAT sectors
+        fat_sectors = [n for n in struct.unpack_from('<109I', header, 0x4C) if n != FREE_SECTOR]
+        per_sector = self.sector_size // 4
+        sector = difat_start
+        for _ in range(min(difat_count, self.sector_count)):
+            if sector >= self.sector_count:
+                break
+            values = struct.unpack(f'<{per_sector}I', self._read_sector(sector))
+            fat_sectors.extend(n for n in values[:-1] if n != FREE_SECTOR)
+            sector = values[-1]
+        if fat_count > self.sector_count or len(fat_sectors) < fat_count:
+            raise ValueError("allocation table is incomplete")
+        self._fat = []
+        for sector in fat_sectors[:fat_count]:
+            self._fat.extend(struct.unpack(f'<{per_sector}I', self._read_sector(sector)))
+
+        # Directory entries are 128 bytes; streams are entries of type 2
+        self.streams = {}
+        self._root = None
+        directory = b''.join(self._read_sector(n) for n in self._chain(directory_start))
+        for offset in range(0, len(directory) - 127, 128):
+            name_length, entry_type = struct.unpack_from('<HB', directory, offset + 64)
+            start, size = struct.unpack_from('<IQ', directory, offset + 116)
+            if entry_type == ROOT_ENTRY:
+                self._root = (start, size & 0xFFFFFFFF if self.sector_size == 512 else size)
+            elif entry_type == STREAM_ENTRY and 2 <= name_length <= 64:
+                name = directory[offset:offset + name_length - 2].decode('utf-16-le', 'replace')
+                self.streams[name] = (start, size & 0xFFFFFFFF if self.sector_size == 512 else size)
+
+        self._mini_fat = []
+        if mini_fat_start != END_OF_CHAIN:
+            for sector in self._chain(mini_fat_start):
+                self._mini_fat.extend(struct.unpack(f'<{per_sector}I', self._read_sector(sector)))
+        self._chains = {}
+
+    def _read_at(self, offset, length):
+        self._f.seek(offset)
+        data = self._f.read(length)
+        if len(data) < length:
+            raise ValueError("file is truncated")
+        return data
+
+    def _read_sector(self, sector):
+        return self._read_at((sector + 1) * self.sector_size, self.sector_size)
+
+    def _chain(self, start, fat=None):
+        """Sector numbers of a chain, guarding against loops"""
+        fat = self._fat if fat is None else fat
+        chain = []
+        sector = start
+        while sector != END_OF_CHAIN:
+            if sector >= len(fat) or len(chain) > len(fat):
+                raise ValueError("broken sector chain")
+            chain.append(sector)
+            sector = fat[sector]
+        return chain
+
+    def read(self, name, length, offset=0):
+        """Read up to length bytes of a stream from offset"""
+        start, size = self.streams[name]
+        length = max(0, min(length, size - offset))
+        if name not in self._chains:
+            mini = size < self.mini_cutoff
+            self._chains[name] = (mini, self._chain(start, self._mini_fat if mini else None))
+        mini, chain = self._chains[name]
+        unit = self.mini_size if mini else self.sector_size
+
+        parts = []
+        while length > 0:
+            index, skip = divmod(offset, unit)
+            if index >= len(chain):
+                raise ValueError("stream is shorter than its directory entry says")
+            take = min(unit - skip, length)
+            if mini:
+                parts.append(self._read_mini(chain[index] * unit + skip, take))
+            else:
+                parts.append(self._read_at((chain[index] + 1) * unit + skip, take))
+            offset += take
+            length -= take
+        return b''.join(parts)
+
+    def _read_mini(self, offset, length):
+        """Read from the mini stream, which is kept in the root entry's sectors"""
+        if self._root is None:
+            raise ValueError("no root entry")
+        if '\x00root' not in self._chains:
+            self._chains['\x00root'] = (False, self._chain(self._root[0]))
+        chain = self._chains['\x00root'][1]
+        index, skip = divmod(offset, self.sector_size)
+        if index >= len(chain):
+            raise ValueError("mini stream is truncated")
+        # Mini sectors never straddle a sector boundary
+        return self._read_at((chain[index] + 1) * self.sector_size + skip, length)
+
+
+class CostModel:
+    """
+    Predicts how many seconds an engine needs for a deck from its slide,
+    media and image counts. The coefficients are starting points; a scale
+    factor is learned from the conversions that finished recently.
+    """
+
+    def __init__(self, per_file=2.0, per_slide=0.2, per_media_mb=0.4, per_image=0.05, per_mb=1.0,
+                 history=200, min_samples=5):
+        """
+        Args:
+            per_file: Seconds to open and export any file
+            per_slide: Seconds per slide
+            per_media_mb: Seconds per MB of pictures, video and embedded files
+            per_image: Seconds per picture
+            per_mb: Seconds per MB of file when the slide count is unknown
+            history: Number of recent conversions the scale is based on
+            min_samples: Conversions needed before the scale is learned
+        """
+        self.per_file = per_file
+        self.per_slide = per_slide
+        self.per_media_mb = per_media_mb
+        self.per_image = per_image
+        self.per_mb = per_mb
+        self.min_samples = min_samples
+        self._ratios = deque(maxlen=history)
+        self._lock = threading.Lock()
+
+    def baseline(self, info):
+        """Predicted seconds before learning"""
+        if info.slide_count is None:
+            return self.per_file + self.per_mb * info.file_size / MB
+        return (self.per_file + self.per_slide * info.slide_count
+                + self.per_media_mb * (info.media_bytes or 0) / MB
+                + self.per_image * (info.image_count or 0))
+
+    def scale(self):
+        """Median ratio of observed to predicted seconds (1 until enough samples)"""
+        with self._lock:
+            ratios = sorted(self._ratios)
+        if len(ratios) < self.min_samples:
+            return 1.0
+        return ratios[len(ratios) // 2]
+
+    def estimate(self, info):
+        """Seconds an engine is expected to need for the deck"""
+        return self.baseline(info) * self.scale()
+
+    def observe(self, info, seconds):
+        """Record how long a conversion took"""
+        with self._lock:
+            self._ratios.append(seconds / max(self.baseline(info), 0.001))
+
@@ -0,0 +1,214 @@
+"""
+Reaper
+Background retention for finished conversions. Jobs are expired once they
+are older than their time to live, when the job store holds more finished
+jobs than allowed, or while the disk holding the output folders is filled
+past a high-water mark. Expiring a job deletes its uploads, PDFs and batch
+archive and removes it from the job store. Files the application wrote that
+no job refers to are swept up after the time to live as well.
+"""
+
+import os
+import re
+import shutil
+import threading
+import time
+
+from metrics import EXPIRED_JOBS_TOTAL, RECLAIMED_BYTES_TOTAL
+
+# Jobs expired at a time while the disk is above its high-water mark
+DISK_BATCH_SIZE = 25
+
+# Paths below a root, relative to it, that the application creates: uploads
+# and slimmed copies named <uuid>_<name>, conversion folders named by a hex
+# uuid and batch archives. Anything else (e.g. .gitkeep) is left alone.
+APP_FILE_PATTERNS = [
+    re.compile(r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}_[^/]+'),
+    re.compile(r'[0-9a-f]{32}/[^/]+'),
+    re.compile(r'archives/[0-9]+\.zip'),
+]
+
+
+class Reaper:
+    """Periodically expires finished jobs and deletes their files"""
+
+    def __init__(self, job_store, job_files, roots, finished_statuses, active_statuses,
+                 job_ttl=86400, max_jobs=0, high_water=90, low_water=80, min_age=300, interval=60):
+        """
+        Args:
+            job_store: JobStore holding the jobs
+            job_files: Callable returning the paths of the files a job owns
+            roots: Upload and download folders; files below them that match
+                APP_FILE_PATTERNS and that no job refers to are deleted once
+                older than job_ttl
+            finished_statuses: Statuses of jobs that may be expired
+            active_statuses: Statuses of jobs whose files are in use
+            job_ttl: Seconds a finished job is kept (0 keeps them until
+                the limits below are hit)
+            max_jobs: Most finished jobs kept in the store (0 for no limit)
+            high_water: Disk usage in percent that starts expiring the
+                oldest jobs early (0 disables)
+            low_water: Disk usage in percent at which early expiry stops
+            min_age: Seconds a finished job is kept at least, however full
+                the disk, so its results can still be downloaded
+            interval: Seconds between passes
+        """
+        self.job_store = job_store
+        self.job_files = job_files
+        self.roots = [os.path.abspath(root) for root in roots]
+        self.finished_statuses = tuple(finished_statuses)
+        self.active_statuses = tuple(active_statuses)
+        self.job_ttl = job_ttl
+        self.max_jobs = max_jobs
+        self.high_water = high_water
+        self.low_water = min(low_water, high_water)
+        self.min_age = min_age
+        self.interval = interval
+        self.expired_jobs = 0
+        self.reclaimed_bytes = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start the background thread"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='reaper', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Reaper pass failed: {str(e)}")
+
+    def run_once(self):
+        """
+        Make one retention pass
+
+        Returns:
+            dict: jobs expired per reason and bytes reclaimed in this pass
+        """
+        with self._lock:
+            summary = {'ttl': 0, 'limit': 0, 'disk': 0, 'bytes': 0}
+            finished = self.job_store.ids_by_age(*self.finished_statuses)
+
+            # Jobs past their time to live
+            if self.job_ttl > 0:
+                cutoff = time.time() - self.job_ttl
+                stale = [job_id for job_id, updated_at in finished if updated_at < cutoff]
+                finished = finished[len(stale):]
+                summary['bytes'] += self._expire(stale, 'ttl')
+                summary['ttl'] = len(stale)
+
+            # Oldest jobs beyond the store limit
+            if self.max_jobs > 0 and len(finished) > self.max_jobs:
+                overflow = [job_id for job_id, _ in finished[:len(finished) - self.max_jobs]]
+                finished = finished[len(overflow):]
+                summary['bytes'] += self._expire(overflow, 'limit')
+                summary['limit'] = len(overflow)
+
+            # Oldest jobs while the disk is too full, sparing those just finished
+            if self.high_water > 0 and self._disk_percent() >= self.high_water:
+                cutoff = time.time() - self.min_age
+                expirable = [job_id for job_id, updated_at in finished if updated_at < cutoff]
+                while expirable and self._disk_percent() > self.low_water:
+                    batch = expirable[:DISK_BATCH_SIZE]
+                    expirable = expirable[len(batch):]
+                    summary['bytes'] += self._expire(batch, 'disk')
+                    summary['disk'] += len(batch)
+
+            if self.job_ttl > 0:
+                summary['bytes'] += self._sweep_orphans()
+
+            if summary['ttl'] or summary['limit'] or summary['disk'] or summary['bytes']:
+                print(f"Reaper expired {summary['ttl']} old, {summary['limit']} surplus and "
+                      f"{summary['disk']} jobs for disk space, reclaiming {summary['bytes']} bytes")
+            return summary
+
+    def stats(self):
+        return {'expired_jobs': self.expired_jobs, 'reclaimed_bytes': self.reclaimed_bytes}
+
+    def _expire(self, job_ids, reason):
+        """Delete the files of the given jobs, then the jobs themselves"""
+        if not job_ids:
+            return 0
+        reclaimed = 0
+        for job_id in job_ids:
+            job = self.job_store.get(job_id)
+            if job is None:
+                continue
+            for path in self.job_files(job_id, job):
+                reclaimed += self._remove(path)
+
+        self.job_store.delete_many(job_ids)
+        self.expired_jobs += len(job_ids)
+        self.reclaimed_bytes += reclaimed
+        EXPIRED_JOBS_TOTAL.inc(len(job_ids), reason=reason)
+        RECLAIMED_BYTES_TOTAL.inc(reclaimed, kind='jobs')
+        return reclaimed
+
+    def _sweep_orphans(self):
+        """Delete old application files below the roots that no stored job refers to"""
+        in_use = set()
+        for job_id in self.job_store.ids_by_status(*(self.active_statuses + self.finished_statuses)):
+            job = self.job_store.get(job_id)
+            if job is not None:
+                in_use.update(os.path.abspath(path) for path in self.job_files(job_id, job))
+
+        cutoff = time.time() - self.job_ttl
+        reclaimed = 0
+        for root in self.roots:
+            for directory, dirs, names in os.walk(root):
+                dirs[:] = [name for name in dirs if not name.startswith('.')]
+                for name in names:
+                    path = os.path.join(directory, name)
+                    if name.startswith('.') or not self._is_app_file(root, path):
+                        continue
+                    try:
+                        if path in in_use or os.path.getmtime(path) >= cutoff:
+                            continue
+                    except OSError:
+                        continue
+                    reclaimed += self._remove(path)
+
+        self.reclaimed_bytes += reclaimed
+        RECLAIMED_BYTES_TOTAL.inc(reclaimed, kind='orphans')
+        return reclaimed
+
+    @staticmethod
+    def _is_app_file(root, path):
+        """Whether a file below a root was named by the application"""
+        relative = os.path.relpath(path, root).replace(os.sep, '/')
+        return any(pattern.fullmatch(relative) for pattern in APP_FILE_PATTERNS)
+
+    def _remove(self, path):
+        """Delete a file and its per-conversion folder once empty; returns bytes freed"""
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            return 0
+
+        parent = os.path.dirname(os.path.abspath(path))
+        if os.path.dirname(parent) in self.roots:
+            try:
+                os.rmdir(parent)
+            except OSError:
+                pass  # not empty
+        return size
+
+    def _disk_percent(self):
+        """Highest usage in percent of the filesystems holding the roots"""
+        usage = 0
+        for root in self.roots:
+            try:
+                disk = shutil.disk_usage(root)
+            except OSError:
+                continue
+            usage = max(usage, disk.used * 100 / disk.total)
+        return usage
@@ -0,0 +1,250 @@
+"""
+Job Scheduler
+Runs conversion jobs on a fixed number of worker threads from a bounded
+queue. Jobs are split into priority lanes, and inside a lane clients are
+served round-robin so one client's large upload cannot starve the others.
+Each client's own jobs run shortest first by their estimated cost.
+"""
+
+import heapq
+import threading
+import time
+from collections import OrderedDict, deque
+
+from metrics import QUEUE_WAIT_SECONDS
+
+
+class QueueFullError(Exception):
+    """Raised when the scheduler queue has no room for another job"""
+
+
+class ScheduledJob:
+    """A queued unit of work"""
+
+    def __init__(self, job_id, fn, args, client, lane, cost=0):
+        self.job_id = job_id
+        self.fn = fn
+        self.args = args
+        self.client = client
+        self.lane = lane
+        self.cost = cost
+        self.queued_at = time.time()
+        self.started_at = None
+
+    def priority(self, now):
+        """Shortest job first; every second spent waiting counts against the
+        job's cost, so long jobs are not starved by a stream of short ones"""
+        return self.cost - (now - self.queued_at)
+
+
+class JobScheduler:
+    """Bounded, fair, prioritised job queue served by worker threads"""
+
+    INTERACTIVE = 'interactive'
+    BULK = 'bulk'
+    LANES = (INTERACTIVE, BULK)
+
+    def __init__(self, workers=2, max_queued=100, interactive_weight=3):
+        """
+        Args:
+            workers: Number of jobs that run at the same time
+            max_queued: Jobs that may wait before submissions are rejected
+            interactive_weight: Interactive jobs started for every bulk job
+                while both lanes have work waiting
+        """
+        self.workers = max(1, int(workers))
+        self.max_queued = max(0, int(max_queued))
+        self.interactive_weight = max(1, int(interactive_weight))
+
+        # lane -> OrderedDict(client -> deque of jobs); dict order is the
+        # round-robin order of clients inside the lane
+        self._lanes = {lane: OrderedDict() for lane in self.LANES}
+        self._queued = 0
+        self._running = 0
+        self._running_jobs = set()
+        self._interactive_streak = 0
+        self._condition = threading.Condition()
+        self._threads = []
+        self._stopping = False
+
+    def start(self):
+        """Start the worker threads"""
+        with self._condition:
+            if self._threads:
+                return
+            self._stopping = False
+            for index in range(self.workers):
+                thread = threading.Thread(
+                    target=self._worker_loop,
+                    name=f"scheduler-worker-{index}",
+                    daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, job_id, fn, args=(), client='anonymous', lane=BULK, cost=0):
+        """
+        Queue a job
+
+        Args:
+            job_id: Identifier used to look up the queue position
+            fn: Callable run by a worker thread
+            args: Positional arguments for fn
+            client: Key used for fair scheduling (e.g. the client address)
+            lane: INTERACTIVE or BULK
+            cost: Estimated seconds the job runs, for ordering and ETAs
+
+        Returns:
+            int: 1-based queue position, 0 if a worker picks the job up immediately
+
+        Raises:
+            QueueFullError: if max_queued jobs are already waiting
+        """
+        if lane not in self._lanes:
+            raise ValueError(f"Unknown lane: {lane}")
+
+        self.start()
+        with self._condition:
+            idle_worker = self._running + self._queued < self.workers
+            if not idle_worker and self._queued >= self.max_queued:
+                raise QueueFullError(f"Conversion queue is full ({self._queued} jobs waiting)")
+
+            clients = self._lanes[lane]
+            clients.setdefault(client, deque()).append(
+                ScheduledJob(job_id, fn, args, client, lane, cost))
+            self._queued += 1
+            self._condition.notify()
+
+            if idle_worker:
+                return 0
+            return self._position_locked(job_id)
+
+    def position(self, job_id):
+        """Return the 1-based queue position of a waiting job, or None"""
+        with self._condition:
+            return self._position_locked(job_id)
+
+    def eta(self, job_id):
+        """
+        Estimate when a waiting job starts from the costs of the running jobs
+        and of the jobs ahead of it
+
+        Returns:
+            float: seconds until a worker picks the job up, or None if it is not waiting
+        """
+        with self._condition:
+            now = time.time()
+            free_at = [max(0.0, job.cost - (now - job.started_at)) for job in self._running_jobs]
+            free_at += [0.0] * max(0, self.workers - len(free_at))
+            heapq.heapify(free_at)
+            for job in self._replay_locked(now):
+                start = heapq.heappop(free_at)
+                if job.job_id == job_id:
+                    return start
+                heapq.heappush(free_at, start + job.cost)
+            return None
+
+    def stats(self):
+        """Return a snapshot of the scheduler state"""
+        with self._condition:
+            return {
+                'workers': self.workers,
+                'running': self._running,
+                'queued': self._queued,
+                'max_queued': self.max_queued,
+                'queued_by_lane': {
+                    lane: sum(len(jobs) for jobs in clients.values())
+                    for lane, clients in self._lanes.items()
+                },
+            }
+
+    def shutdown(self, wait=True):
+        """Stop the workers after the jobs currently running finish"""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+            threads = self._threads
+            self._threads = []
+        if wait:
+            for thread in threads:
+                thread.join()
+
+    def _worker_loop(self):
+        while True:
+            with self._condition:
+                while not self._stopping and self._queued == 0:
+                    self._condition.wait()
+                if self._stopping:
+                    return
+                job = self._pop_next_locked()
+                job.started_at = time.time()
+                self._running += 1
+                self._running_jobs.add(job)
+
+            QUEUE_WAIT_SECONDS.observe(time.time() - job.queued_at, queue='scheduler')
+
+            try:
+                job.fn(*job.args)
+            except Exception as e:
+                print(f"Scheduled job {job.job_id} failed: {str(e)}")
+            finally:
+                with self._condition:
+                    self._running -= 1
+                    self._running_jobs.discard(job)
+
+    def _lane_order_locked(self, interactive_streak):
+        """Lanes in the order they should be served next"""
+        if interactive_streak >= self.interactive_weight:
+            return (self.BULK, self.INTERACTIVE)
+        return (self.INTERACTIVE, self.BULK)
+
+    def _take(self, lanes, interactive_streak, now):
+        """
+        Remove the job that should run next from the given lane queues
+
+        Returns:
+            tuple: (job or None, updated interactive streak)
+        """
+        for lane in self._lane_order_locked(interactive_streak):
+            clients = lanes[lane]
+            if not clients:
+                continue
+
+            client, jobs = next(iter(clients.items()))
+            index = min(range(len(jobs)), key=lambda i: jobs[i].priority(now))
+            job = jobs[index]
+            del jobs[index]
+            # Rotate the client to the back of its lane
+            del clients[client]
+            if jobs:
+                clients[client] = jobs
+
+            if lane == self.INTERACTIVE and lanes[self.BULK]:
+                return job, interactive_streak + 1
+            return job, 0
+        return None, interactive_streak
+
+    def _pop_next_locked(self):
+        job, self._interactive_streak = self._take(self._lanes, self._interactive_streak, time.time())
+        self._queued -= 1
+        return job
+
+    def _replay_locked(self, now):
+        """Waiting jobs in the order they will be dispatched, from a copy of the queues"""
+        lanes = {
+            lane: OrderedDict((client, deque(jobs)) for client, jobs in clients.items())
+            for lane, clients in self._lanes.items()
+        }
+        streak = self._interactive_streak
+        while True:
+            job, streak = self._take(lanes, streak, now)
+            if job is None:
+                return
+            yield job
+
+    def _position_locked(self, job_id):
+        """Replay the dispatch order to find a job"""
+        for position, job in enumerate(self._replay_locked(time.time()), start=1):
+            if job.job_id == job_id:
+                return position
+        return None
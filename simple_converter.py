@@ -1,56 +1,171 @@
 """
 Simple PPT to PDF Converter
 Direct conversion from PowerPoint to PDF without intermediate steps.
+The actual engine (PowerPoint COM or headless LibreOffice) is chosen by the
+backend name passed to SimplePPTConverter.
 """
 
+import hashlib
 import os
+import sys
+import threading
 import time
-import pythoncom
-import win32com.client
+import uuid
+from concurrent.futures import Future, as_completed, wait
 from werkzeug.utils import secure_filename
+from backends import create_backend_factory
+from conversion_cache import HASH_CHUNK_SIZE, ConversionCache, hash_file, link_or_copy
+from converter_pool import ConversionTimeout, ConverterPool, DeadlineModel
+from export_profiles import can_optimize, get_profile, optimize_pdf
+from metrics import (CONVERSIONS_TOTAL, CONVERTED_BYTES_TOTAL, OPTIMIZED_BYTES_SAVED_TOTAL,
+                     PREFLIGHT_REJECTED_TOTAL, SLIMMED_BYTES_TOTAL, STAGE_SECONDS, span)
+from preflight import (MAX_COMPRESSION_RATIO, MAX_SLIDES, MAX_UNPACKED_SIZE, CostModel, PreflightError,
+                       inspect_deck)
+from pptx_slim import DEFAULT_MAX_DPI, slim_pptx
+from split_export import can_merge, count_slides, merge_pdfs, page_count, plan_ranges
+from upload_stream import SIGNATURE_SIZE, ZIP_MAGIC, IngestFile, check_signature
 
 class SimplePPTConverter:
     """Simple class to convert PPT directly to PDF"""
 
-    def __init__(self, upload_folder='uploads', download_folder='downloads'):
-        self.upload_folder = upload_folder
-        self.download_folder = download_folder
+    def __init__(self, upload_folder='uploads', download_folder='downloads',
+                 backend='powerpoint', backend_options=None, pool_size=1,
+                 max_jobs_per_worker=100, cache=None, max_file_size=100 * 1024 * 1024,
+                 split_min_slides=0, split_max_parts=0, preview_slides=0,
+                 min_timeout=60, max_timeout=1800, timeout_factor=4, default_profile=None,
+                 optimize=True, max_slides=MAX_SLIDES, max_unpacked_size=MAX_UNPACKED_SIZE,
+                 max_compression_ratio=MAX_COMPRESSION_RATIO, slim_media=False):
+        # Paths recorded in jobs are absolute so other nodes sharing the
+        # folders can open them whatever their working directory
+        self.upload_folder = os.path.abspath(upload_folder)
+        self.download_folder = os.path.abspath(download_folder)
         self.allowed_extensions = {'ppt', 'pptx'}
+        self.max_file_size = max_file_size
+
+        # Decks are inspected before conversion; pathological ones are
+        # rejected and the rest get a cost estimate for scheduling
+        self.max_slides = max_slides
+        self.max_unpacked_size = max_unpacked_size
+        self.max_compression_ratio = max_compression_ratio
+        self.costs = CostModel()
+
+        # Conversion engines are kept warm in a pool instead of being
+        # started and quit for every file
+        self.backend_name = backend
+        self.backend_options = backend_options or {}
+        self.pool_size = pool_size
+        self.max_jobs_per_worker = max_jobs_per_worker
+        self._pool = None
+
+        # Jobs get a deadline proportional to their size, learned from past
+        # conversion times; engines that miss it are killed and replaced
+        self.deadlines = DeadlineModel(min_timeout=min_timeout, max_timeout=max_timeout,
+                                       factor=timeout_factor)
+
+        # Optional ConversionCache; repeat uploads are served from it
+        self.cache = cache
+
+        # Export profile used when none is requested, and whether PDFs are
+        # post-processed (needs pikepdf)
+        self.default_profile = get_profile(default_profile).name
+        self.optimize = optimize and can_optimize()
+
+        # Whether .pptx files are slimmed before conversion (video replaced
+        # by poster frames, large pictures downsampled, unused layouts dropped)
+        self.slim_media = slim_media
+
+        # Conversions in progress by content hash and options; identical
+        # files submitted meanwhile wait for them instead of converting again
+        self._in_flight = {}
+        self._in_flight_lock = threading.Lock()
+
+        # Decks with at least split_min_slides slides are exported in slide
+        # ranges on several engines at once (0 disables splitting)
+        self.split_min_slides = split_min_slides
+        self.split_max_parts = split_max_parts or pool_size
+        self._backend_supports_ranges = None
+
+        # For progressive previews the first preview_slides slides are
+        # exported on their own so they are ready early (0 disables)
+        self.preview_slides = preview_slides
 
         # Create directories if they don't exist
         os.makedirs(upload_folder, exist_ok=True)
         os.makedirs(download_folder, exist_ok=True)
 
-    def check_powerpoint_availability(self):
+    @property
+    def pool(self):
+        """Converter pool, started on first use"""
+        if self._pool is None:
+            self._pool = ConverterPool(
+                create_backend_factory(self.backend_name, **self.backend_options),
+                size=self.pool_size,
+                max_jobs_per_worker=self.max_jobs_per_worker,
+                deadlines=self.deadlines
+            )
+            self._pool.start()
+        return self._pool
+
+    def pool_stats(self):
+        """Pool statistics without starting the pool"""
+        if self._pool is None:
+            return {}
+        return self._pool.stats()
+
+    def check_powerpoint_availability(self, wait=60):
         """
-        Check if PowerPoint is available and accessible
+        Check if a conversion engine is available and accessible
+
+        Args:
+            wait: Seconds to wait for the pool's engines to finish starting
 
         Returns:
             tuple: (available: bool, error_message: str)
         """
-        try:
-            # Initialize COM for this thread
-            pythoncom.CoInitialize()
-
-            # Try to create PowerPoint application
-            ppt = win32com.client.Dispatch("PowerPoint.Application")
-
-            # Test basic functionality
-            version = ppt.Version
-            print(f"PowerPoint version detected: {version}")
-
-            # Clean up
-            ppt.Quit()
-            pythoncom.CoUninitialize()
-
-            return True, None
+        available, error_msg = self.pool.is_available(wait=wait)
+        if not available:
+            return False, f"PowerPoint not available: {error_msg}"
+        return True, None
+
+    def export_options(self, profile=None):
+        """Options that influence the produced PDF, used in cache keys"""
+        profile = get_profile(profile or self.default_profile)
+        options = {
+            'backend': self.backend_name,
+            'profile': profile.name,
+            'optimized': self.optimize and profile.optimize,
+        }
+        # Only set when enabled so existing cache entries stay valid
+        if self.slim_media:
+            options['slimmed'] = True
+        return options
+
+    def is_cached(self, file_hash, profile=None):
+        """Check whether a PDF for this content hash and profile is already cached"""
+        if self.cache is None or not file_hash:
+            return False
+        return self.cache.contains(self.cache.make_key(file_hash, self.export_options(profile)))
+
+    def inspect(self, file_path):
+        """
+        Inspect a presentation without an engine and check it against the limits
 
-        except Exception as e:
-            try:
-                pythoncom.CoUninitialize()
-            except:
-                pass
-            return False, f"PowerPoint not available: {str(e)}"
+        Returns:
+            tuple: (info: DeckInfo, error_message: str); info is None if rejected
+        """
+        try:
+            return inspect_deck(file_path, max_slides=self.max_slides,
+                                max_unpacked_size=self.max_unpacked_size,
+                                max_compression_ratio=self.max_compression_ratio), None
+        except PreflightError as e:
+            PREFLIGHT_REJECTED_TOTAL.inc(reason=e.reason)
+            return None, str(e)
+        except OSError as e:
+            return None, f"Cannot read file: {str(e)}"
+
+    def estimate_seconds(self, info):
+        """Engine seconds a deck is expected to take"""
+        return self.costs.estimate(info)
 
     def validate_file(self, file_path):
         """
@@ -62,72 +177,88 @@ class SimplePPTConverter:
         Returns:
             tuple: (valid: bool, error_message: str)
         """
+        valid, error_msg, _ = self._validate(file_path)
+        return valid, error_msg
+
+    def _validate(self, file_path):
+        """validate_file, also returning the DeckInfo of a valid file"""
         try:
             # Check if file exists
             if not os.path.exists(file_path):
-                return False, "File does not exist"
+                return False, "File does not exist", None
 
             # Check file size (not empty, not too large)
             file_size = os.path.getsize(file_path)
             if file_size == 0:
-                return False, "File is empty"
+                return False, "File is empty", None
 
-            if file_size > 100 * 1024 * 1024:  # 100MB limit
-                return False, "File is too large (over 100MB)"
+            if file_size > self.max_file_size:
+                return False, f"File is too large (over {self.max_file_size // (1024 * 1024)}MB)", None
 
             # Check file extension
             _, ext = os.path.splitext(file_path.lower())
             if ext not in ['.ppt', '.pptx']:
-                return False, "Invalid file extension. Must be .ppt or .pptx"
+                return False, "Invalid file extension. Must be .ppt or .pptx", None
 
             # Check if file is readable
             try:
                 with open(file_path, 'rb') as f:
-                    # Read first few bytes to check if file is accessible
-                    header = f.read(8)
-                    if len(header) < 8:
-                        return False, "File appears to be corrupted or incomplete"
+                    # Read first few bytes to check the container format
+                    error_msg = check_signature(f.read(SIGNATURE_SIZE))
+                    if error_msg:
+                        return False, error_msg, None
             except Exception as e:
-                return False, f"Cannot read file: {str(e)}"
+                return False, f"Cannot read file: {str(e)}", None
+
+            # Check the container for zip bombs, slide counts and encryption
+            info, error_msg = self.inspect(file_path)
+            if info is None:
+                return False, error_msg, None
 
-            return True, None
+            return True, None, info
 
         except Exception as e:
-            return False, f"File validation error: {str(e)}"
+            return False, f"File validation error: {str(e)}", None
 
     def allowed_file(self, filename):
         """Check if the uploaded file has an allowed extension"""
         return '.' in filename and \
                filename.rsplit('.', 1)[1].lower() in self.allowed_extensions
     
-    def convert_ppt_to_pdf(self, ppt_file_path, output_filename=None):
+    def convert_ppt_to_pdf(self, ppt_file_path, output_filename=None, file_hash=None, on_pages=None,
+                           profile=None, on_optimized=None):
         """
         Convert PPT directly to PDF with improved error handling
 
         Args:
             ppt_file_path: Path to the PPT/PPTX file
             output_filename: Optional custom output filename
+            file_hash: SHA-256 of the file if already known (computed otherwise)
+            on_pages: Optional callback(first_slide, last_slide, part_path,
+                pages) called as slide ranges finish, before the whole PDF
+                is ready; part_path is removed once the PDF is complete
+            profile: Export profile name (the default profile if None)
+            on_optimized: Optional callback(size_before, size_after) called
+                after the PDF was post-processed
 
         Returns:
             tuple: (success: bool, pdf_path: str, error_message: str)
         """
-        ppt = None
-        presentation = None
-
+        pdf_path = None
+        started = time.perf_counter()
         try:
             print(f"Starting conversion of: {ppt_file_path}")
+            profile = get_profile(profile or self.default_profile)
+            options = self.export_options(profile.name)
 
             # Step 1: Validate file
-            valid, error_msg = self.validate_file(ppt_file_path)
+            with span('validate'):
+                valid, error_msg, deck = self._validate(ppt_file_path)
             if not valid:
+                CONVERSIONS_TOTAL.inc(result='failed')
                 return False, None, f"File validation failed: {error_msg}"
 
-            # Step 2: Check PowerPoint availability
-            available, error_msg = self.check_powerpoint_availability()
-            if not available:
-                return False, None, error_msg
-
-            # Step 3: Prepare paths
+            # Step 2: Prepare paths
             # Convert to absolute path to avoid path issues
             ppt_file_path = os.path.abspath(ppt_file_path)
             print(f"Absolute path: {ppt_file_path}")
@@ -143,138 +274,322 @@ class SimplePPTConverter:
             if not safe_base_name:
                 safe_base_name = "converted_presentation"
 
-            pdf_path = os.path.abspath(os.path.join(self.download_folder, safe_base_name + '.pdf'))
+            # Each conversion writes into its own folder so concurrent jobs
+            # with the same file name never overwrite each other
+            output_dir = os.path.join(self.download_folder, uuid.uuid4().hex)
+            os.makedirs(output_dir, exist_ok=True)
+            pdf_path = os.path.abspath(os.path.join(output_dir, safe_base_name + '.pdf'))
             print(f"Output PDF path: {pdf_path}")
 
-            # Step 4: Initialize COM for this thread
-            pythoncom.CoInitialize()
-
-            # Step 5: Start PowerPoint with error handling
-            print("Starting PowerPoint application...")
+            # Step 3: Serve repeat uploads from the cache
+            cache_key = None
+            if self.cache is not None:
+                with span('cache_lookup'):
+                    if not file_hash:
+                        file_hash = hash_file(ppt_file_path)
+                    cache_key = self.cache.make_key(file_hash, options)
+                    hit = self.cache.get(cache_key, pdf_path)
+                if hit:
+                    print(f"Cache hit for {ppt_file_path}: {pdf_path}")
+                    CONVERSIONS_TOTAL.inc(result='cached')
+                    STAGE_SECONDS.observe(time.perf_counter() - started, stage='total')
+                    return True, pdf_path, None
+
+            # Step 4: Share the result of an identical conversion that is
+            # already running instead of converting the file again
+            if not file_hash:
+                file_hash = hash_file(ppt_file_path)
+            flight_key = cache_key or ConversionCache.make_key(file_hash, options)
+            flight, leader = self._join_flight(flight_key)
+            if not leader:
+                print(f"Waiting for identical conversion in progress: {ppt_file_path}")
+                with span('coalesced_wait'):
+                    link_or_copy(flight.result(), pdf_path)
+                CONVERSIONS_TOTAL.inc(result='coalesced')
+                STAGE_SECONDS.observe(time.perf_counter() - started, stage='total')
+                return True, pdf_path, None
+
+            source_path = ppt_file_path
             try:
-                ppt = win32com.client.Dispatch("PowerPoint.Application")
-                # Note: Don't set Visible = False as it may cause issues in some PowerPoint versions
-                print(f"PowerPoint started successfully. Version: {ppt.Version}")
-            except Exception as e:
-                raise Exception(f"Failed to start PowerPoint: {str(e)}")
-
-            # Step 6: Open presentation with multiple attempts
-            print("Opening presentation...")
-            max_attempts = 3
-            for attempt in range(max_attempts):
-                try:
-                    if attempt == 0:
-                        # First attempt: Open with minimal parameters
-                        presentation = ppt.Presentations.Open(ppt_file_path, ReadOnly=True, Untitled=False, WithWindow=False)
-                    elif attempt == 1:
-                        # Second attempt: Open with basic parameters
-                        presentation = ppt.Presentations.Open(ppt_file_path, ReadOnly=True)
+                # Step 5: Hand the job to a warm engine from the pool, or split
+                # a very large deck over several engines. Media heavy decks
+                # are slimmed first so the engine has less to open.
+                engine_started = time.perf_counter()
+                if self.slim_media:
+                    source_path = self._slim(ppt_file_path, profile) or ppt_file_path
+                with span('engine'):
+                    ranges = self.plan_split(source_path, progressive=on_pages is not None)
+                    if ranges:
+                        self._convert_ranges(source_path, pdf_path, ranges, on_pages, profile)
                     else:
-                        # Third attempt: Open with minimal parameters
-                        presentation = ppt.Presentations.Open(ppt_file_path)
-
-                    print(f"Presentation opened successfully on attempt {attempt + 1}")
-                    break
-
-                except Exception as e:
-                    print(f"Attempt {attempt + 1} failed: {str(e)}")
-                    if attempt == max_attempts - 1:
-                        raise Exception(f"Could not open PowerPoint file after {max_attempts} attempts. Last error: {str(e)}")
-                    time.sleep(1)  # Wait before retry
+                        self.pool.submit(source_path, pdf_path, profile=profile).result()
+
+                # Step 6: Verify PDF was created
+                with span('verify'):
+                    if not os.path.exists(pdf_path):
+                        raise Exception("PDF file was not created")
+
+                    pdf_size = os.path.getsize(pdf_path)
+                    if pdf_size == 0:
+                        raise Exception("PDF file is empty")
+                self.costs.observe(deck, time.perf_counter() - engine_started)
+
+                # Step 7: Shrink the PDF according to the profile
+                if options['optimized']:
+                    pdf_size = self._optimize(pdf_path, profile, on_optimized) or pdf_size
+            except BaseException as e:
+                self._land_flight(flight_key, flight, error=e)
+                raise
+            finally:
+                if source_path != ppt_file_path:
+                    self.cleanup_file(source_path)
+            self._land_flight(flight_key, flight, pdf_path=pdf_path)
 
-            # Step 7: Export to PDF
-            print("Exporting to PDF...")
-            try:
-                # Use positional arguments for better compatibility
-                presentation.ExportAsFixedFormat(
-                    pdf_path,           # OutputFileName
-                    2,                  # FixedFormatType (ppFixedFormatTypePDF)
-                    1,                  # Intent (ppFixedFormatIntentPrint)
-                    False,              # FrameSlides
-                    1,                  # HandoutOrder (ppPrintHandoutHorizontalFirst)
-                    1,                  # OutputType (ppPrintOutputSlides)
-                    False,              # PrintHiddenSlides
-                    None,               # PrintRange
-                    1,                  # RangeType (ppPrintAll)
-                    "",                 # SlideShowName
-                    True,               # IncludeDocProps
-                    True,               # KeepIRMSettings
-                    True,               # DocStructureTags
-                    True,               # BitmapMissingFonts
-                    False               # UseDocumentICCProfile
-                )
-            except Exception as e:
-                raise Exception(f"Failed to export to PDF: {str(e)}")
-
-            # Step 8: Verify PDF was created
-            if not os.path.exists(pdf_path):
-                raise Exception("PDF file was not created")
+            print(f"PDF created successfully: {pdf_path} (Size: {pdf_size} bytes)")
 
-            pdf_size = os.path.getsize(pdf_path)
-            if pdf_size == 0:
-                raise Exception("PDF file is empty")
+            if cache_key:
+                with span('cache_store'):
+                    self.cache.put(cache_key, pdf_path)
 
-            print(f"PDF created successfully: {pdf_path} (Size: {pdf_size} bytes)")
+            CONVERSIONS_TOTAL.inc(result='success')
+            CONVERTED_BYTES_TOTAL.inc(os.path.getsize(ppt_file_path), kind='input')
+            CONVERTED_BYTES_TOTAL.inc(pdf_size, kind='pdf')
+            STAGE_SECONDS.observe(time.perf_counter() - started, stage='total')
             return True, pdf_path, None
 
+        except ConversionTimeout as e:
+            error_msg = f"Conversion timed out: {str(e)}"
+            print(f"ERROR: {error_msg}")
+            if pdf_path:
+                self.cleanup_file(pdf_path)
+            CONVERSIONS_TOTAL.inc(result='timeout')
+            return False, None, error_msg
+
         except Exception as e:
             error_msg = f"Conversion failed: {str(e)}"
             print(f"ERROR: {error_msg}")
+            if pdf_path:
+                self.cleanup_file(pdf_path)
+            CONVERSIONS_TOTAL.inc(result='failed')
             return False, None, error_msg
 
-        finally:
-            # Clean up resources in reverse order
-            print("Cleaning up resources...")
-            try:
-                if presentation:
-                    presentation.Close()
-                    print("Presentation closed")
-            except Exception as e:
-                print(f"Error closing presentation: {str(e)}")
+    def _join_flight(self, key):
+        """
+        Register a conversion of the content behind key
 
-            try:
-                if ppt:
-                    ppt.Quit()
-                    print("PowerPoint application closed")
-            except Exception as e:
-                print(f"Error closing PowerPoint: {str(e)}")
+        Returns:
+            tuple: (future resolving to the PDF path, True if the caller
+                must convert it itself)
+        """
+        with self._in_flight_lock:
+            flight = self._in_flight.get(key)
+            if flight is not None:
+                return flight, False
+            flight = self._in_flight[key] = Future()
+            return flight, True
+
+    def _land_flight(self, key, flight, pdf_path=None, error=None):
+        """Hand the outcome of a conversion to everyone waiting for it"""
+        with self._in_flight_lock:
+            self._in_flight.pop(key, None)
+        if error is not None:
+            flight.set_exception(error)
+        else:
+            flight.set_result(pdf_path)
+
+    def plan_split(self, ppt_file_path, progressive=False):
+        """
+        Decide whether a file is converted in slide ranges
+
+        Args:
+            progressive: Put the first preview_slides slides in a range of
+                their own so they can be shown before the rest is done
+
+        Returns:
+            list: (first, last) slide ranges, or None to convert in one piece
+        """
+        parts = min(self.split_max_parts, self.pool_size)
+        split = self.split_min_slides > 0 and parts >= 2
+        progressive = progressive and self.preview_slides > 0
+        if not (split or progressive) or not can_merge():
+            return None
+        if self._backend_supports_ranges is None:
+            # Backend constructors are cheap; the engine is not started
+            backend = create_backend_factory(self.backend_name, **self.backend_options)()
+            self._backend_supports_ranges = backend.supports_slide_ranges
+        if not self._backend_supports_ranges:
+            return None
+
+        slide_count = count_slides(ppt_file_path)
+        if not slide_count:
+            return None
+        split = split and slide_count >= self.split_min_slides
+        progressive = progressive and slide_count > self.preview_slides
+
+        if not progressive:
+            return plan_ranges(slide_count, parts) if split else None
+        first_range = (1, self.preview_slides)
+        rest = plan_ranges(slide_count - self.preview_slides, parts if split else 1)
+        return [first_range] + [(first + self.preview_slides, last + self.preview_slides)
+                                for first, last in rest]
+
+    def _slim(self, ppt_file_path, profile):
+        """
+        Write a slimmed copy of a .pptx to the upload folder; a failure converts the original
 
+        Returns:
+            str: path of the copy, or None if the original should be converted
+        """
+        with open(ppt_file_path, 'rb') as f:
+            if f.read(len(ZIP_MAGIC)) != ZIP_MAGIC:
+                return None  # only OOXML packages can be rewritten
+        slim_path = self.new_upload_path(os.path.splitext(os.path.basename(ppt_file_path))[0] + '.slim.pptx')
+        try:
+            with span('slim'):
+                report = slim_pptx(ppt_file_path, slim_path, max_dpi=profile.image_dpi or DEFAULT_MAX_DPI,
+                                   jpeg_quality=profile.jpeg_quality)
+        except Exception as e:
+            print(f"Could not slim {ppt_file_path}, converting it as uploaded: {str(e)}")
+            self.cleanup_file(slim_path)
+            return None
+        if report is None:
+            return None
+
+        print(f"Slimmed {ppt_file_path}: {report['size_before']} -> {report['size_after']} bytes "
+              f"({report['media_removed']} media, {report['images_resized']} pictures, "
+              f"{report['layouts_removed']} layouts, {report['masters_removed']} masters)")
+        SLIMMED_BYTES_TOTAL.inc(max(0, report['size_before'] - report['size_after']))
+        return slim_path
+
+    def _optimize(self, pdf_path, profile, on_optimized=None):
+        """
+        Post-process a finished PDF; a failure keeps the PDF as exported
+
+        Returns:
+            int: the new PDF size, or None if the PDF is unchanged
+        """
+        try:
+            with span('optimize'):
+                sizes = optimize_pdf(pdf_path, profile)
+        except Exception as e:
+            print(f"Could not optimize {pdf_path}, keeping it as exported: {str(e)}")
+            return None
+        if sizes is None:
+            return None
+
+        size_before, size_after = sizes
+        print(f"Optimized {pdf_path} ({profile.name}): {size_before} -> {size_after} bytes, "
+              f"saved {size_before - size_after}")
+        OPTIMIZED_BYTES_SAVED_TOTAL.inc(size_before - size_after)
+        if on_optimized is not None:
             try:
-                pythoncom.CoUninitialize()
-                print("COM uninitialized")
+                on_optimized(size_before, size_after)
             except Exception as e:
-                print(f"Error uninitializing COM: {str(e)}")
-    
+                print(f"Could not report optimization of {pdf_path}: {str(e)}")
+        return size_after
+
+    def _convert_ranges(self, ppt_file_path, pdf_path, ranges, on_pages=None, profile=None):
+        """
+        Export slide ranges on separate engines and merge them into pdf_path
+
+        Raises:
+            ConversionTimeout: if a range timed out
+            Exception: if a range failed
+        """
+        print(f"Splitting {ppt_file_path} into {len(ranges)} slide ranges")
+        base_path = os.path.splitext(pdf_path)[0]
+        part_paths = [f"{base_path}.part{index}.pdf" for index in range(len(ranges))]
+        futures = [
+            self.pool.submit(ppt_file_path, part_path, slide_range=slide_range, profile=profile)
+            for part_path, slide_range in zip(part_paths, ranges)
+        ]
+        slide_ranges = dict(zip(futures, ranges))
+        part_paths_by_future = dict(zip(futures, part_paths))
+        try:
+            for future in as_completed(futures):
+                slide_range = slide_ranges[future]
+                try:
+                    future.result()
+                except Exception as e:
+                    # Drop ranges not started yet and let running ones finish
+                    # so no engine writes a part after it was removed
+                    for other in futures:
+                        other.cancel()
+                    wait(futures)
+                    error_msg = f"Slides {slide_range[0]}-{slide_range[1]}: {str(e)}"
+                    if isinstance(e, ConversionTimeout):
+                        raise ConversionTimeout(error_msg) from e
+                    raise Exception(error_msg) from e
+
+                if on_pages is not None:
+                    part_path = part_paths_by_future[future]
+                    try:
+                        on_pages(slide_range[0], slide_range[1], part_path, page_count(part_path))
+                    except Exception as e:
+                        print(f"Could not publish slides {slide_range[0]}-{slide_range[1]}: {str(e)}")
+
+            with span('merge'):
+                merge_pdfs(part_paths, pdf_path)
+        finally:
+            for part_path in part_paths:
+                try:
+                    os.remove(part_path)
+                except OSError:
+                    pass
+
+    def new_upload_path(self, filename):
+        """Unique path in the upload folder for an uploaded file name"""
+        return os.path.join(self.upload_folder, f"{uuid.uuid4()}_{secure_filename(filename)}")
+
     def save_uploaded_file(self, file):
         """
-        Save uploaded file to upload directory
+        Save uploaded file to upload directory, hashing it while it is written.
+        Files already streamed into the upload folder while the request was
+        parsed (see upload_stream) are kept where they are.
         
         Args:
             file: Flask file object
         
         Returns:
-            tuple: (success: bool, file_path: str, error_message: str)
+            tuple: (success: bool, file_path: str, error_message: str, file_hash: str)
         """
         try:
+            if file and isinstance(file.stream, IngestFile):
+                if file.stream.error:
+                    return False, None, file.stream.error, None
+                file.stream.keep()
+                return True, file.stream.path, None, file.stream.hexdigest()
+
             if file and self.allowed_file(file.filename):
                 # Generate unique filename to avoid conflicts
-                import uuid
-                filename = secure_filename(file.filename)
-                unique_filename = f"{uuid.uuid4()}_{filename}"
-                file_path = os.path.join(self.upload_folder, unique_filename)
-                file.save(file_path)
-                return True, file_path, None
+                file_path = self.new_upload_path(file.filename)
+
+                hasher = hashlib.sha256()
+                with open(file_path, 'wb') as out:
+                    for chunk in iter(lambda: file.stream.read(HASH_CHUNK_SIZE), b''):
+                        hasher.update(chunk)
+                        out.write(chunk)
+                return True, file_path, None, hasher.hexdigest()
             else:
-                return False, None, "Invalid file type. Please upload a PPT or PPTX file."
+                return False, None, "Invalid file type. Please upload a PPT or PPTX file.", None
                 
         except Exception as e:
-            return False, None, f"Error saving file: {str(e)}"
+            return False, None, f"Error saving file: {str(e)}", None
     
     def cleanup_file(self, file_path):
-        """Remove a file safely"""
+        """Remove a file safely, along with its per-conversion output folder"""
         try:
             if os.path.exists(file_path):
                 os.remove(file_path)
                 print(f"Cleaned up file: {file_path}")
+
+            parent = os.path.dirname(os.path.abspath(file_path))
+            if os.path.dirname(parent) == os.path.abspath(self.download_folder) and not os.listdir(parent):
+                os.rmdir(parent)
         except Exception as e:
             print(f"Error cleaning up file {file_path}: {str(e)}")
+
+
+if __name__ == '__main__':
+    from bulk_convert import main
+    sys.exit(main())
@@ -0,0 +1,95 @@
+"""
+Split Export
+Helpers for converting presentations in slide ranges: counting slides,
+dividing them into ranges, merging the partial PDFs back into one document
+and cutting single pages out of finished parts for previews.
+"""
+
+import io
+import re
+import zipfile
+
+try:
+    from pypdf import PdfReader, PdfWriter
+except ImportError:  # merging and previews need pypdf; both are off without it
+    PdfReader = None
+    PdfWriter = None
+
+SLIDE_ID_PATTERN = re.compile(rb'<(?:\w+:)?sldId\b')
+
+
+def can_merge():
+    """Return True if partial PDFs can be merged"""
+    return PdfWriter is not None
+
+
+def count_slides(file_path):
+    """
+    Count the slides of a .pptx from its slide list, without an engine
+
+    Returns:
+        int: number of slides, or None if the file is not an OOXML package
+    """
+    try:
+        with zipfile.ZipFile(file_path) as package:
+            presentation = package.read('ppt/presentation.xml')
+    except (OSError, KeyError, zipfile.BadZipFile):
+        return None
+    return len(SLIDE_ID_PATTERN.findall(presentation))
+
+
+def plan_ranges(slide_count, parts):
+    """
+    Divide slides 1..slide_count into at most parts contiguous ranges of
+    nearly equal size
+
+    Returns:
+        list: (first, last) slide numbers, 1-based and inclusive
+    """
+    parts = max(1, min(parts, slide_count))
+    size, extra = divmod(slide_count, parts)
+    ranges = []
+    first = 1
+    for index in range(parts):
+        last = first + size - 1 + (1 if index < extra else 0)
+        ranges.append((first, last))
+        first = last + 1
+    return ranges
+
+
+def page_count(pdf_path):
+    """Number of pages in a PDF"""
+    return len(PdfReader(pdf_path).pages)
+
+
+def extract_page(pdf_path, page_index):
+    """
+    Copy one page of a PDF into a new single page PDF
+
+    Args:
+        page_index: 0-based page number
+
+    Returns:
+        bytes: the PDF
+
+    Raises:
+        IndexError: if the PDF has no such page
+    """
+    reader = PdfReader(pdf_path)
+    writer = PdfWriter()
+    writer.add_page(reader.pages[page_index])
+    output = io.BytesIO()
+    writer.write(output)
+    return output.getvalue()
+
+
+def merge_pdfs(part_paths, pdf_path):
+    """Concatenate the partial PDFs in order into pdf_path"""
+    if PdfWriter is None:
+        raise RuntimeError("pypdf is required to merge partial PDFs")
+    writer = PdfWriter()
+    for part_path in part_paths:
+        writer.append(part_path)
+    with open(pdf_path, 'wb') as f:
+        writer.write(f)
+    writer.close()
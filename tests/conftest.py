@@ -0,0 +1,31 @@
+import os
+import sys
+
+import pytest
+
+# The application is a set of top-level modules next to this folder; the
+# benchmarks' corpus generator provides test decks
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+
+@pytest.fixture(scope='session')
+def app_module(tmp_path_factory):
+    """The web application on the fake backend, with all state in a scratch folder"""
+    work_dir = tmp_path_factory.mktemp('app')
+    os.environ.update({
+        'PPT2PDF_BACKEND': 'fake',
+        'PPT2PDF_FAKE_STARTUP_DELAY': '0',
+        'PPT2PDF_FAKE_CONVERT_DELAY': '0.5',
+        'PPT2PDF_POOL_SIZE': '2',
+        'PPT2PDF_MAX_CONCURRENT_CONVERSIONS': '4',
+        'PPT2PDF_JOB_STORE': 'memory',
+        'PPT2PDF_UPLOAD_FOLDER': str(work_dir / 'uploads'),
+        'PPT2PDF_DOWNLOAD_FOLDER': str(work_dir / 'downloads'),
+        'PPT2PDF_CACHE_DIR': str(work_dir / 'cache'),
+        'PPT2PDF_UPLOAD_SESSION_DIR': str(work_dir / 'upload_sessions'),
+    })
+    import app
+    app.app.config['TESTING'] = True
+    return app
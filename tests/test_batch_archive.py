@@ -0,0 +1,49 @@
+import os
+import shutil
+import zipfile
+
+from backends import write_placeholder_pdf
+from corpus import generate_pptx
+from zip_stream import append_to_archive
+
+
+def test_resumed_batch_archive_holds_each_pdf_once(app_module, monkeypatch, tmp_path):
+    monkeypatch.setitem(app_module.app.config, 'INCREMENTAL_BATCH_ZIP', True)
+    converter = app_module.converter
+
+    # 'first' finished before the restart; 'second' was appended to the
+    # archive but the process died before its result was recorded
+    first_pdf = os.path.join(converter.download_folder, 'resumed', 'first.pdf')
+    os.makedirs(os.path.dirname(first_pdf))
+    write_placeholder_pdf(first_pdf, ['first slide 1'])
+    deck = str(tmp_path / 'second.pptx')
+    generate_pptx(deck, 20 * 1024, slide_count=2, seed=7)
+    upload = converter.new_upload_path('second.pptx')
+    shutil.copy(deck, upload)
+
+    batch_id = 'resumed-archive'
+    archive_path = app_module.batch_archive_path(batch_id)
+    os.makedirs(os.path.dirname(archive_path), exist_ok=True)
+    append_to_archive(archive_path, first_pdf, 'first.pdf')
+    append_to_archive(archive_path, first_pdf, 'second.pdf')
+
+    files = [{'file_path': converter.new_upload_path('first.pptx'), 'original_filename': 'first.pptx'},
+             {'file_path': upload, 'original_filename': 'second.pptx'}]
+    app_module.job_store.create(batch_id, {
+        'status': 'queued', 'batch_mode': True, 'total_files': 2, 'completed_files': 1, 'failed_files': 0,
+        'files': files, 'profile': None, 'owner': app_module.WORKER_ID,
+        'results': [
+            {'original_filename': 'first.pptx', 'status': 'success', 'pdf_path': first_pdf,
+             'pdf_filename': 'first.pdf'},
+            {'original_filename': 'second.pptx', 'status': 'converting'},
+        ]
+    })
+
+    app_module.convert_batch_background(batch_id, files)
+
+    job = app_module.job_store.get(batch_id)
+    assert job['status'] == 'completed'
+    assert job['archive_path'] == os.path.abspath(archive_path)
+    with zipfile.ZipFile(archive_path) as archive, open(job['results'][1]['pdf_path'], 'rb') as f:
+        assert archive.namelist() == ['first.pdf', 'second.pdf']
+        assert archive.read('second.pdf') == f.read()
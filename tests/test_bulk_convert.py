@@ -0,0 +1,116 @@
+import io
+import json
+import os
+
+import pytest
+
+import bulk_convert
+from corpus import generate_pptx
+from simple_converter import SimplePPTConverter
+
+
+def make_tree(src_dir, names):
+    for seed, name in enumerate(names):
+        path = os.path.join(src_dir, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        generate_pptx(path, 20 * 1024, slide_count=2, seed=seed)
+
+
+def read_manifest(dst_dir):
+    with open(os.path.join(dst_dir, bulk_convert.MANIFEST_NAME), encoding='utf-8') as f:
+        return json.load(f)['files']
+
+
+@pytest.fixture
+def converter(tmp_path):
+    work_dir = str(tmp_path / 'work')
+    converter = SimplePPTConverter(
+        upload_folder=work_dir,
+        download_folder=work_dir,
+        backend='fake',
+        backend_options={'startup_delay': 0, 'convert_delay': 0},
+        pool_size=1,
+        optimize=False,
+    )
+    yield converter
+    converter.pool.shutdown()
+
+
+def test_interrupted_run_resumes_from_its_manifest(converter, monkeypatch, tmp_path):
+    src_dir, dst_dir = str(tmp_path / 'src'), str(tmp_path / 'dst')
+    os.makedirs(dst_dir)
+    make_tree(src_dir, ['a.pptx', 'c.pptx', os.path.join('sub', 'b.pptx')])
+
+    converted, interrupted = [], []
+    convert = converter.convert_ppt_to_pdf
+    def convert_until_interrupted(source_path, *args, **kwargs):
+        if source_path.endswith('b.pptx') and not interrupted:
+            interrupted.append(source_path)
+            raise KeyboardInterrupt
+        converted.append(os.path.relpath(source_path, src_dir))
+        return convert(source_path, *args, **kwargs)
+    monkeypatch.setattr(converter, 'convert_ppt_to_pdf', convert_until_interrupted)
+
+    with pytest.raises(KeyboardInterrupt):
+        bulk_convert.convert_tree(converter, src_dir, dst_dir, out=io.StringIO())
+    # Files finished before the interrupt are recorded although the run never ended
+    assert converted == ['a.pptx', 'c.pptx']
+    assert sorted(read_manifest(dst_dir)) == ['a.pptx', 'c.pptx']
+    assert os.path.exists(os.path.join(dst_dir, 'a.pdf'))
+
+    # Touched but unchanged files are recognised by their hash
+    os.utime(os.path.join(src_dir, 'a.pptx'), ns=(1, 1))
+    summary = bulk_convert.convert_tree(converter, src_dir, dst_dir, out=io.StringIO())
+    assert converted[2:] == [os.path.join('sub', 'b.pptx')]
+    assert (summary['total'], summary['skipped'], summary['converted'], summary['failed']) == (3, 2, 1, 0)
+    manifest = read_manifest(dst_dir)
+    assert manifest['a.pptx']['mtime_ns'] == 1
+    assert manifest[os.path.join('sub', 'b.pptx')]['pdf'] == os.path.join('sub', 'b.pdf')
+    assert {entry['status'] for entry in manifest.values()} == {'ok'}
+
+    # A different profile changes the options, so everything is converted again
+    summary = bulk_convert.convert_tree(converter, src_dir, dst_dir, profile='print', out=io.StringIO())
+    assert (summary['skipped'], summary['converted']) == (0, 3)
+
+
+def test_failed_files_are_retried_and_deleted_pdfs_rebuilt(converter, tmp_path):
+    src_dir, dst_dir = str(tmp_path / 'src'), str(tmp_path / 'dst')
+    os.makedirs(dst_dir)
+    make_tree(src_dir, ['good.pptx'])
+    with open(os.path.join(src_dir, 'bad.pptx'), 'wb') as f:
+        f.write(b'not a presentation')
+
+    summary = bulk_convert.convert_tree(converter, src_dir, dst_dir, out=io.StringIO())
+    assert (summary['converted'], summary['failed']) == (1, 1)
+    assert read_manifest(dst_dir)['bad.pptx']['status'] == 'failed'
+
+    os.remove(os.path.join(dst_dir, 'good.pdf'))
+    summary = bulk_convert.convert_tree(converter, src_dir, dst_dir, out=io.StringIO())
+    assert (summary['converted'], summary['failed'], summary['skipped']) == (1, 1, 0)
+    assert os.path.exists(os.path.join(dst_dir, 'good.pdf'))
+
+
+def test_same_stem_keeps_the_extension(tmp_path):
+    for name in ('deck.ppt', 'deck.pptx', 'other.pptx', '~$other.pptx', os.path.join('.hidden', 'x.pptx')):
+        path = tmp_path / name
+        path.parent.mkdir(exist_ok=True)
+        path.write_bytes(b'')
+    assert bulk_convert.find_presentations(str(tmp_path), {'ppt', 'pptx'}) == [
+        ('deck.ppt', 'deck.ppt.pdf'), ('deck.pptx', 'deck.pptx.pdf'), ('other.pptx', 'other.pdf'),
+    ]
+
+
+def test_command_line_run(monkeypatch, capsys, tmp_path):
+    monkeypatch.setenv('PPT2PDF_FAKE_STARTUP_DELAY', '0')
+    monkeypatch.setenv('PPT2PDF_FAKE_CONVERT_DELAY', '0')
+    src_dir, dst_dir = str(tmp_path / 'src'), str(tmp_path / 'dst')
+    make_tree(src_dir, ['a.pptx', os.path.join('sub', 'b.pptx')])
+    argv = ['convert', src_dir, dst_dir, '--backend', 'fake', '--no-optimize', '-q']
+
+    assert bulk_convert.main(argv) == 0
+    assert os.path.exists(os.path.join(dst_dir, 'sub', 'b.pdf'))
+    assert not os.path.exists(os.path.join(dst_dir, bulk_convert.WORK_DIR_NAME))
+    assert "Converted 2, skipped 0 (up to date), failed 0 of 2 files" in capsys.readouterr().out
+
+    assert bulk_convert.main(argv) == 0
+    assert "Converted 0, skipped 2 (up to date)" in capsys.readouterr().out
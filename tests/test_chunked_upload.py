@@ -0,0 +1,70 @@
+import hashlib
+import io
+import os
+
+import pytest
+
+from chunked_upload import UploadError, UploadSessions
+from corpus import generate_pptx
+
+CHUNK = 1024
+
+
+@pytest.fixture
+def sessions(tmp_path):
+    return UploadSessions(str(tmp_path / 'sessions'), chunk_size=CHUNK)
+
+
+def put(sessions, upload_id, index, data, sha256=None):
+    return sessions.write_chunk(upload_id, index * CHUNK, io.BytesIO(data), len(data), sha256)
+
+
+def test_resent_chunk_only_counts_once_its_checks_pass(sessions, tmp_path):
+    upload = sessions.create('deck.pptx', 2 * CHUNK)
+    upload_id = upload['upload_id']
+    assert put(sessions, upload_id, 1, b'a' * CHUNK)['received'] == [1]
+
+    # Its bytes are overwritten before the digest mismatch is found
+    with pytest.raises(UploadError) as error:
+        put(sessions, upload_id, 1, b'b' * CHUNK, sha256=hashlib.sha256(b'a' * CHUNK).hexdigest())
+    assert error.value.status == 422
+    assert sessions.get(upload_id)['received'] == []
+
+    # Likewise a resend that is cut short
+    put(sessions, upload_id, 1, b'a' * CHUNK)
+    with pytest.raises(UploadError):
+        sessions.write_chunk(upload_id, CHUNK, io.BytesIO(b'b' * 10), CHUNK)
+    assert sessions.get(upload_id)['received'] == []
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
+
+
+def test_finalize_reports_failed_uploads_in_its_answer(client, tmp_path):
+    path = str(tmp_path / 'deck.pptx')
+    generate_pptx(path, 20 * 1024, slide_count=2, seed=1)
+    with open(path, 'rb') as f:
+        data = f.read()
+    upload = client.post('/uploads', json={'filename': 'deck.pptx', 'size': len(data)}).get_json()
+    for offset in range(0, len(data), upload['chunk_size']):
+        chunk = data[offset:offset + upload['chunk_size']]
+        assert client.put(f"/uploads/{upload['upload_id']}?offset={offset}", data=chunk).status_code == 200
+
+    missing = '0' * 32
+    response = client.post('/uploads/finalize', json={'uploads': [upload['upload_id'], missing]})
+    assert response.status_code == 202
+    assert response.get_json()['failed_uploads'] == [f"{missing}: Unknown or expired upload"]
+    # Nothing is left behind for the next page the browser shows
+    with client.session_transaction() as session:
+        assert '_flashes' not in session
+
+
+def test_too_large_message_names_the_configured_limit(app_module, client, monkeypatch):
+    monkeypatch.setitem(app_module.app.config, 'MAX_CONTENT_LENGTH', 2 * 1024 * 1024)
+    body = {'files': [(io.BytesIO(os.urandom(3 * 1024 * 1024)), 'big.pptx')]}
+    response = client.post('/upload', data=body, content_type='multipart/form-data')
+    assert response.status_code == 302
+    with client.session_transaction() as session:
+        assert session['_flashes'] == [('message', 'File is too large. Maximum size is 2MB.')]
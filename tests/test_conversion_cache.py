@@ -0,0 +1,35 @@
+import os
+import time
+
+from conversion_cache import ConversionCache
+
+
+def write_pdf(tmp_path, name, size):
+    path = tmp_path / name
+    path.write_bytes(b'x' * size)
+    return str(path)
+
+
+def test_size_limit_holds_for_a_directory_shared_by_processes(tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    first = ConversionCache(cache_dir, max_bytes=3000)
+    second = ConversionCache(cache_dir, max_bytes=3000)
+    for number in range(6):
+        cache = second if number % 2 else first
+        cache.put(f'key{number}', write_pdf(tmp_path, f'{number}.pdf', 1000))
+        time.sleep(0.01)  # recency is kept in modification times
+
+    assert sorted(os.listdir(cache_dir)) == ['key3.pdf', 'key4.pdf', 'key5.pdf']
+    assert first.stats()['bytes'] == 3000
+
+
+def test_entries_stored_by_another_process_are_hits(tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    first = ConversionCache(cache_dir)
+    second = ConversionCache(cache_dir)
+    first.put('key', write_pdf(tmp_path, 'a.pdf', 100))
+
+    assert second.contains('key')
+    assert second.get('key', str(tmp_path / 'copy.pdf'))
+    assert second.stats()['hits'] == 1
+    assert (tmp_path / 'copy.pdf').read_bytes() == b'x' * 100
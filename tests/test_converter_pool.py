@@ -0,0 +1,134 @@
+import threading
+
+import pytest
+
+from backends import FakeBackend
+from converter_pool import ConversionTimeout, ConverterPool, DeadlineModel
+
+
+class CountingFactory:
+    """Backend factory that keeps every engine it created"""
+
+    def __init__(self, **options):
+        self.options = options
+        self.backends = []
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        options = dict(self.options)
+        with self._lock:
+            # Only the first engine hangs, its replacements work
+            if self.backends:
+                options['hang_probability'] = 0
+            backend = self.make(**options)
+            self.backends.append(backend)
+        return backend
+
+    def make(self, **options):
+        return FakeBackend(**options)
+
+
+class UnkillableBackend(FakeBackend):
+    """Engine whose kill does not free the thread stuck in it"""
+
+    def kill(self):
+        self.running = False
+
+
+@pytest.fixture
+def deck(tmp_path):
+    path = tmp_path / 'deck.pptx'
+    path.write_bytes(b'x' * 1024)
+    return str(path)
+
+
+def make_pool(factory, **options):
+    options.setdefault('health_check_interval', 0.1)
+    return ConverterPool(factory, **options)
+
+
+def test_workers_reuse_their_warm_engine(deck, tmp_path):
+    factory = CountingFactory(startup_delay=0, convert_delay=0)
+    pool = make_pool(factory, size=1)
+    try:
+        for number in range(5):
+            pdf_path = str(tmp_path / f'out{number}.pdf')
+            assert pool.convert(deck, pdf_path, timeout=10) == (True, None)
+        assert len(factory.backends) == 1
+        assert pool.stats()['recycles'] == 0
+    finally:
+        pool.shutdown()
+
+
+def test_engine_is_recycled_after_max_jobs(deck, tmp_path):
+    factory = CountingFactory(startup_delay=0, convert_delay=0)
+    pool = make_pool(factory, size=1, max_jobs_per_worker=2)
+    try:
+        for number in range(5):
+            assert pool.convert(deck, str(tmp_path / f'out{number}.pdf'), timeout=10)[0]
+        # Jobs 1-2, 3-4 and 5 each ran on a fresh engine
+        assert len(factory.backends) == 3
+        assert not factory.backends[0].running
+        assert not factory.backends[1].running
+    finally:
+        pool.shutdown()
+
+
+def test_watchdog_kills_hung_engine_and_replaces_it(deck, tmp_path):
+    factory = CountingFactory(startup_delay=0, convert_delay=0, hang_probability=1.0)
+    pool = make_pool(factory, size=1, deadlines=DeadlineModel(min_timeout=0.5, max_timeout=0.5))
+    try:
+        future = pool.submit(deck, str(tmp_path / 'hung.pdf'))
+        with pytest.raises(ConversionTimeout):
+            future.result(timeout=10)
+        assert pool.stats()['timeouts'] == 1
+
+        # The next job runs on a new engine
+        assert pool.convert(deck, str(tmp_path / 'next.pdf'), timeout=10) == (True, None)
+        assert len(factory.backends) == 2
+        assert not factory.backends[0].running
+    finally:
+        pool.shutdown()
+
+
+def test_worker_stuck_after_kill_is_replaced(deck, tmp_path):
+    factory = CountingFactory(startup_delay=0, convert_delay=0, hang_probability=1.0)
+    factory.make = UnkillableBackend
+    pool = make_pool(factory, size=1, kill_grace=0,
+                     deadlines=DeadlineModel(min_timeout=0.5, max_timeout=0.5))
+    try:
+        future = pool.submit(deck, str(tmp_path / 'hung.pdf'))
+        stuck_worker = pool.workers[0]
+        with pytest.raises(ConversionTimeout):
+            future.result(timeout=10)
+
+        assert pool.convert(deck, str(tmp_path / 'next.pdf'), timeout=10) == (True, None)
+        assert stuck_worker.abandoned
+        assert pool.workers[0] is not stuck_worker
+    finally:
+        pool.shutdown()
+
+
+def test_deadline_uses_max_timeout_until_enough_samples():
+    model = DeadlineModel(min_timeout=1, max_timeout=100, min_samples=10)
+    for _ in range(9):
+        model.observe(0, 1.0)
+    assert model.timeout_for(0) == 100
+
+
+def test_deadline_is_factor_times_p95_per_mb():
+    model = DeadlineModel(min_timeout=0, max_timeout=10000, factor=2, min_samples=10)
+    # Empty files weigh 1 MB, so each sample is its duration
+    for seconds in range(1, 101):
+        model.observe(0, float(seconds))
+    # 95th percentile of 1..100 is 96
+    assert model.timeout_for(0) == 2 * 96
+    # A 1 MB file weighs twice as much
+    assert model.timeout_for(1024 * 1024) == 2 * 96 * 2
+
+
+def test_deadline_is_clamped():
+    model = DeadlineModel(min_timeout=50, max_timeout=300, factor=1, min_samples=1)
+    model.observe(0, 1.0)
+    assert model.timeout_for(0) == 50
+    assert model.timeout_for(1024 * 1024 * 1024) == 300
@@ -0,0 +1,101 @@
+import json
+
+import pytest
+
+
+def parse(chunks):
+    """(event, data) of the messages in a Server-Sent Events stream"""
+    messages = []
+    for block in ''.join(chunks).split('\n\n'):
+        lines = dict(line.split(': ', 1) for line in block.splitlines() if ': ' in line and not line.startswith(':'))
+        if 'event' in lines:
+            messages.append((lines['event'], json.loads(lines['data'])))
+    return messages
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
+
+
+def open_stream(client, conversion_id):
+    response = client.get(f'/events/{conversion_id}', buffered=False)
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    assert response.headers['X-Accel-Buffering'] == 'no'
+    chunks = iter(response.response)
+
+    def read():
+        chunk = next(chunks)
+        return chunk.decode() if isinstance(chunk, bytes) else chunk
+    return read
+
+
+def read_message(stream):
+    """Read chunks up to the next event message"""
+    while True:
+        messages = parse([stream()])
+        if messages:
+            return messages[0]
+
+
+def test_stream_sends_a_snapshot_then_only_changes(app_module, client):
+    job_store = app_module.job_store
+    job_store.create('events-1', {
+        'status': 'converting', 'progress': 10, 'message': 'Converting 2 files...',
+        'batch_mode': True, 'total_files': 2, 'files': [{'file_path': '/secret'}],
+        'results': [{'original_filename': 'a.pptx', 'status': 'converting'},
+                    {'original_filename': 'b.pptx', 'status': 'pending'}]
+    })
+    stream = open_stream(client, 'events-1')
+    assert stream().startswith('retry: ')
+
+    event, snapshot = read_message(stream)
+    assert event == 'snapshot'
+    assert snapshot['progress'] == 10 and len(snapshot['results']) == 2
+    assert 'files' not in snapshot
+
+    def finish_first(job):
+        job['results'][0] = {'original_filename': 'a.pptx', 'status': 'success'}
+        job['progress'] = 50
+    job_store.modify('events-1', finish_first)
+    event, delta = read_message(stream)
+    assert event == 'update'
+    assert delta['fields']['progress'] == 50
+    assert 'message' not in delta['fields']
+    assert delta['results'] == {'0': {'original_filename': 'a.pptx', 'status': 'success'}}
+    assert delta['results_length'] == 2
+
+    job_store.update('events-1', {'status': 'completed', 'progress': 100})
+    event, delta = read_message(stream)
+    assert delta['fields']['status'] == 'completed'
+    assert 'results' not in delta
+    # The stream ends with the job
+    with pytest.raises(StopIteration):
+        stream()
+
+
+def test_stream_reports_a_deleted_job(app_module, client):
+    app_module.job_store.create('events-2', {'status': 'converting', 'results': []})
+    stream = open_stream(client, 'events-2')
+    assert read_message(stream)[0] == 'snapshot'
+    app_module.job_store.delete('events-2')
+    assert read_message(stream) == ('gone', {})
+
+
+def test_unknown_job_has_no_stream(client):
+    assert client.get('/events/unknown').status_code == 404
+
+
+def test_status_delta(app_module):
+    old = {'status': 'converting', 'progress': 10, 'eta_seconds': 30,
+           'results': [{'status': 'pending'}]}
+    assert app_module.status_delta(old, dict(old)) is None
+    new = {'status': 'converting', 'progress': 20,
+           'results': [{'status': 'pending'}, {'status': 'success'}]}
+    assert app_module.status_delta(old, new) == {
+        'fields': {'progress': 20},
+        'removed': ['eta_seconds'],
+        'results': {1: {'status': 'success'}},
+        'results_length': 2,
+    }
@@ -0,0 +1,70 @@
+import random
+import shutil
+import zlib
+
+import pytest
+
+from backends import write_placeholder_pdf
+from export_profiles import get_profile, optimize_pdf
+
+pikepdf = pytest.importorskip('pikepdf')
+
+
+def test_optimize_leaves_a_pdf_it_cannot_shrink_untouched(tmp_path):
+    pdf_path = str(tmp_path / 'deck.pdf')
+    write_placeholder_pdf(pdf_path, [f"deck slide {number}" for number in range(1, 21)])
+    profile = get_profile('screen')
+    sizes = optimize_pdf(pdf_path, profile)
+    assert sizes is None or sizes[1] < sizes[0]
+
+    # Rewriting the optimized PDF saves nothing
+    copy_path = str(tmp_path / 'copy.pdf')
+    shutil.copy(pdf_path, copy_path)
+    assert optimize_pdf(pdf_path, profile) is None
+    with open(pdf_path, 'rb') as f, open(copy_path, 'rb') as copy:
+        assert f.read() == copy.read()
+
+
+def gray_image_pdf(path, **image_keys):
+    """One-inch page showing a noisy 600 pixel gray image, with extra image dictionary entries"""
+    pdf = pikepdf.new()
+    pixels = random.Random(3).randbytes(600 * 600)
+    image = pikepdf.Stream(pdf, zlib.compress(pixels))
+    image.Type, image.Subtype = pikepdf.Name.XObject, pikepdf.Name.Image
+    image.Width = image.Height = 600
+    image.BitsPerComponent = 8
+    image.ColorSpace = pikepdf.Name.DeviceGray
+    image.Filter = pikepdf.Name.FlateDecode
+    for key, value in image_keys.items():
+        image[f'/{key}'] = value(pdf) if callable(value) else value
+    page = pikepdf.Dictionary(
+        Type=pikepdf.Name.Page, MediaBox=[0, 0, 72, 72],
+        Resources=pikepdf.Dictionary(XObject=pikepdf.Dictionary(Im0=image)),
+        Contents=pikepdf.Stream(pdf, b'q 72 0 0 72 0 0 cm /Im0 Do Q'))
+    pdf.pages.append(pikepdf.Page(page))
+    pdf.save(path)
+
+
+def image_width(path):
+    with pikepdf.open(path) as pdf:
+        return int(pdf.pages[0].Resources.XObject.Im0.Width)
+
+
+def test_gray_images_are_downsampled(tmp_path):
+    path = str(tmp_path / 'gray.pdf')
+    gray_image_pdf(path)
+    assert optimize_pdf(path, get_profile('screen')) is not None
+    assert image_width(path) == 150
+
+
+@pytest.mark.parametrize('image_keys', [
+    {'Decode': [1, 0]},
+    {'ColorSpace': lambda pdf: [pikepdf.Name.Separation, pikepdf.Name('/Spot'), pikepdf.Name.DeviceCMYK,
+                                pikepdf.Dictionary(FunctionType=2, Domain=[0, 1], N=1,
+                                                   C0=[0, 0, 0, 0], C1=[0, 1, 0, 0])]},
+], ids=['decode', 'separation'])
+def test_images_whose_samples_are_remapped_keep_their_pixels(tmp_path, image_keys):
+    path = str(tmp_path / 'mapped.pdf')
+    gray_image_pdf(path, **image_keys)
+    optimize_pdf(path, get_profile('screen'))
+    assert image_width(path) == 600
@@ -0,0 +1,106 @@
+import hashlib
+import os
+
+import pytest
+
+from file_serving import ETagCache, attachment_header, combined_etag, offload_headers
+
+
+@pytest.fixture
+def finished(app_module):
+    """A completed single-file conversion whose PDF is in the download folder"""
+    pdf_path = os.path.join(app_module.converter.download_folder, 'served', 'Bericht März.pdf')
+    os.makedirs(os.path.dirname(pdf_path), exist_ok=True)
+    data = bytes(range(256)) * 40
+    with open(pdf_path, 'wb') as f:
+        f.write(data)
+    app_module.job_store.create('served', {'status': 'completed', 'pdf_path': pdf_path,
+                                           'pdf_filename': 'Bericht März.pdf'})
+    return pdf_path, data
+
+
+def test_etags_are_content_hashes_remembered_per_file_version(tmp_path, monkeypatch):
+    path = str(tmp_path / 'a.pdf')
+    with open(path, 'wb') as f:
+        f.write(b'first')
+    cache = ETagCache(max_entries=1)
+    assert cache.etag(path) == hashlib.sha256(b'first').hexdigest()
+    # The same file version keeps its remembered ETag
+    assert cache.etag(str(tmp_path / 'a.pdf'), digest='ignored') == hashlib.sha256(b'first').hexdigest()
+
+    with open(path, 'wb') as f:
+        f.write(b'second')
+    os.utime(path, ns=(1, 1))
+    assert cache.etag(path) == hashlib.sha256(b'second').hexdigest()
+
+    other = str(tmp_path / 'b.pdf')
+    with open(other, 'wb') as f:
+        f.write(b'other')
+    assert cache.etag(other, digest='known') == 'known'
+    assert len(cache._etags) == 1
+
+    assert combined_etag(['a', 'b']) != combined_etag(['ab'])
+
+
+def test_attachment_header_quotes_any_name():
+    assert attachment_header('Bericht März "final".pdf') == \
+        "attachment; filename*=UTF-8''Bericht%20M%C3%A4rz%20%22final%22.pdf"
+
+
+def test_offload_headers(tmp_path):
+    path = str(tmp_path / 'job' / 'a b.pdf')
+    assert offload_headers(path, '') is None
+    assert offload_headers(path, 'x-sendfile') == {'X-Sendfile': os.path.abspath(path)}
+    assert offload_headers(path, 'x-accel-redirect', '/protected/', str(tmp_path)) == \
+        {'X-Accel-Redirect': '/protected/job/a%20b.pdf'}
+    # nginx can only send files below the folder its location maps to
+    assert offload_headers(path, 'x-accel-redirect', '/protected/', str(tmp_path / 'job' / 'other')) is None
+
+
+def test_download_answers_conditional_and_range_requests(app_module, finished):
+    pdf_path, data = finished
+    client = app_module.app.test_client()
+
+    response = client.get('/download/served')
+    assert response.status_code == 200
+    assert response.data == data
+    assert response.headers['Accept-Ranges'] == 'bytes'
+    assert response.headers['Content-Disposition'].endswith("filename*=UTF-8''Bericht%20M%C3%A4rz.pdf")
+    etag = response.headers['ETag']
+    assert etag == f'"{hashlib.sha256(data).hexdigest()}"'
+
+    response = client.get('/download/served', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+    assert response.headers['ETag'] == etag
+
+    response = client.get('/download/served', headers={'Range': 'bytes=100-199'})
+    assert response.status_code == 206
+    assert response.data == data[100:200]
+    assert response.headers['Content-Range'] == f'bytes 100-199/{len(data)}'
+
+    response = client.get('/download/served', headers={'Range': f'bytes={len(data)}-'})
+    assert response.status_code == 416
+    assert response.headers['Content-Range'] == f'bytes */{len(data)}'
+
+
+@pytest.mark.parametrize('mode, header, value', [
+    ('x-accel-redirect', 'X-Accel-Redirect', '/protected/served/Bericht%20M%C3%A4rz.pdf'),
+    ('x-sendfile', 'X-Sendfile', None),
+])
+def test_download_is_handed_to_the_front_proxy(app_module, finished, monkeypatch, mode, header, value):
+    pdf_path, data = finished
+    monkeypatch.setitem(app_module.app.config, 'SENDFILE', mode)
+    client = app_module.app.test_client()
+
+    response = client.get('/download/served')
+    assert response.status_code == 200
+    assert response.data == b''
+    assert response.headers[header] == (value or os.path.abspath(pdf_path))
+    assert response.headers['ETag'] == f'"{hashlib.sha256(data).hexdigest()}"'
+    assert response.headers['Content-Disposition'].startswith('attachment;')
+
+    # Revalidation is still answered here, without involving the proxy
+    response = client.get('/download/served', headers={'If-None-Match': response.headers['ETag']})
+    assert response.status_code == 304
+    assert header not in response.headers
@@ -0,0 +1,104 @@
+import fakeredis
+import pytest
+
+from job_store import MemoryJobStore, RedisJobStore, SQLiteJobStore
+
+
+@pytest.fixture(params=['memory', 'sqlite', 'redis'])
+def store(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryJobStore()
+    if request.param == 'sqlite':
+        return SQLiteJobStore(str(tmp_path / 'jobs.db'))
+    return RedisJobStore(fakeredis.FakeRedis())
+
+
+def batch(status='queued', files=2):
+    return {'status': status, 'results': [{'status': 'pending'} for _ in range(files)],
+            'completed_files': 0, 'owner': None}
+
+
+def test_create_and_get(store):
+    assert store.create('1', batch())
+    assert not store.create('1', batch(status='error'))
+    assert store.get('1')['status'] == 'queued'
+    assert 'updated_at' in store.get('1')
+    assert store.get('missing') is None
+    assert '1' in store
+
+
+def test_transition_is_compare_and_set(store):
+    store.create('1', batch())
+    # Wrong current status
+    assert not store.transition('1', ('converting',), {'status': 'completed'})
+    # Status matches but the expected owner does not
+    assert not store.transition('1', ('queued',), {'status': 'converting'}, expect={'owner': 'other'})
+    assert store.get('1')['status'] == 'queued'
+
+    assert store.transition('1', ('queued',), {'status': 'converting', 'owner': 'me'}, expect={'owner': None})
+    assert store.get('1')['owner'] == 'me'
+    # The second claim of the same job fails
+    assert not store.transition('1', ('queued',), {'status': 'converting', 'owner': 'you'})
+    assert not store.transition('missing', ('queued',), {'status': 'converting'})
+
+
+def test_set_result(store):
+    store.create('1', batch())
+    job = store.set_result('1', 1, {'status': 'success'}, increments={'completed_files': 1},
+                           fields=lambda job: {'progress': 100 * job['completed_files'] // len(job['results'])})
+    assert job['results'] == [{'status': 'pending'}, {'status': 'success'}]
+    assert store.get('1')['completed_files'] == 1
+    assert store.get('1')['progress'] == 50
+
+    store.set_result('1', 0, {'status': 'failed'}, fields={'status': 'completed_with_errors'})
+    assert store.get('1')['results'][0] == {'status': 'failed'}
+    assert store.ids_by_status('completed_with_errors') == ['1']
+
+
+def test_listing_by_status_and_age(store):
+    for job_id in ('1', '2', '3'):
+        store.create(job_id, batch())
+    store.update('2', {'status': 'completed'})
+    store.update('1', {'status': 'completed'})
+
+    assert sorted(store.ids_by_status('queued')) == ['3']
+    assert sorted(store.ids_by_status('queued', 'completed')) == ['1', '2', '3']
+    assert store.ids_by_status('error') == []
+    # Least recently updated first
+    assert [job_id for job_id, _ in store.ids_by_age('completed')] == ['2', '1']
+
+
+def test_delete_many(store):
+    for job_id in ('1', '2', '3'):
+        store.create(job_id, batch())
+    store.delete_many(['1', '2', 'missing'])
+    assert store.get('1') is None and store.get('2') is None
+    assert store.ids_by_status('queued') == ['3']
+    store.delete('3')
+    assert store.ids_by_status('queued') == []
+
+
+class RacingRedisJobStore(RedisJobStore):
+    """Runs a concurrent change while a delete is being queued up"""
+
+    race = None
+
+    def _status_key(self, status):
+        race, self.race = self.race, None
+        if race is not None:
+            race()
+        return super()._status_key(status)
+
+
+def test_redis_delete_does_not_leave_index_entries_behind():
+    client = fakeredis.FakeRedis()
+    store = RacingRedisJobStore(client)
+    other_worker = RedisJobStore(client)
+    store.create('1', batch())
+
+    # Another worker moves the job to a new status between the read and the delete
+    store.race = lambda: other_worker.transition('1', ('queued',), {'status': 'converting'})
+    store.delete('1')
+
+    assert store.get('1') is None
+    assert store.ids_by_status('queued', 'converting') == []
@@ -0,0 +1,84 @@
+import pytest
+
+from metrics import Counter, Gauge, Histogram, Registry
+
+
+@pytest.fixture
+def registry():
+    return Registry()
+
+
+def test_counter_renders_labelled_samples(registry):
+    counter = Counter('jobs_total', 'Jobs by outcome', ['result'], registry=registry)
+    counter.inc(result='success')
+    counter.inc(2, result='failed')
+    counter.inc(result='success')
+
+    assert counter.value(result='success') == 2
+    assert registry.render() == (
+        '# HELP jobs_total Jobs by outcome\n'
+        '# TYPE jobs_total counter\n'
+        'jobs_total{result="failed"} 2\n'
+        'jobs_total{result="success"} 2\n'
+    )
+
+
+def test_labels_must_match_and_values_are_escaped(registry):
+    counter = Counter('files_total', 'Files', ['name'], registry=registry)
+    with pytest.raises(ValueError):
+        counter.inc(other='x')
+    counter.inc(name='say "hi"\\\n')
+    assert 'files_total{name="say \\"hi\\"\\\\\\n"} 1' in registry.render()
+
+
+def test_histogram_buckets_are_cumulative(registry):
+    histogram = Histogram('stage_seconds', 'Stage time', ['stage'], registry=registry, buckets=(1, 0.1))
+    for value in (0.05, 0.5, 5):
+        histogram.observe(value, stage='convert')
+
+    lines = registry.render().splitlines()[2:]
+    assert lines == [
+        'stage_seconds_bucket{stage="convert",le="0.1"} 1',
+        'stage_seconds_bucket{stage="convert",le="1.0"} 2',
+        'stage_seconds_bucket{stage="convert",le="+Inf"} 3',
+        'stage_seconds_sum{stage="convert"} 5.55',
+        'stage_seconds_count{stage="convert"} 3',
+    ]
+
+
+def test_histogram_times_a_block(registry):
+    histogram = Histogram('block_seconds', 'Block time', registry=registry)
+    with pytest.raises(RuntimeError):
+        with histogram.time():
+            raise RuntimeError("still observed")
+    assert 'block_seconds_count 1' in registry.render()
+
+
+def test_gauges_read_callbacks_and_survive_failures(registry):
+    Gauge('depth', 'Queue depth', ['queue'], registry=registry,
+          function=lambda: {('shared',): 3, ('local',): 1})
+    Gauge('broken', 'Fails', registry=registry, function=lambda: 1 / 0)
+    set_gauge = Gauge('workers', 'Workers', registry=registry)
+    set_gauge.set(4)
+
+    rendered = registry.render()
+    assert 'depth{queue="local"} 1\ndepth{queue="shared"} 3' in rendered
+    assert '# TYPE broken gauge\n# HELP workers' in rendered
+    assert 'workers 4' in rendered
+
+
+def test_names_are_registered_once(registry):
+    Counter('once_total', 'Once', registry=registry)
+    with pytest.raises(ValueError):
+        Counter('once_total', 'Again', registry=registry)
+
+
+def test_metrics_endpoint(app_module):
+    response = app_module.app.test_client().get('/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    body = response.get_data(as_text=True)
+    for name in ('ppt2pdf_stage_seconds', 'ppt2pdf_conversions_total', 'ppt2pdf_queue_depth',
+                 'ppt2pdf_engine_workers'):
+        assert f'# TYPE {name} ' in body
+    assert 'ppt2pdf_engine_workers{state="configured"} 2' in body
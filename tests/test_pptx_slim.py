@@ -0,0 +1,216 @@
+import io
+import posixpath
+import random
+import re
+import zipfile
+
+import pytest
+
+from pptx_slim import slim_pptx
+
+Image = pytest.importorskip('PIL.Image')
+
+EMU_PER_INCH = 914400
+
+CONTENT_TYPES = b'''<?xml version="1.0" encoding="UTF-8"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+<Default Extension="png" ContentType="image/png"/>
+<Override PartName="/ppt/presentation.xml" ContentType="application/vnd.openxmlformats-officedocument.presentationml.presentation.main+xml"/>
+</Types>'''
+
+PACKAGE_RELS = b'''<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="ppt/presentation.xml"/>
+</Relationships>'''
+
+PRESENTATION = b'''<p:presentation xmlns:p="http://schemas.openxmlformats.org/presentationml/2006/main"
+ xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">
+<p:sldIdLst><p:sldId id="256" r:id="rId1"/></p:sldIdLst>
+<p:sldSz cx="9144000" cy="6858000"/>
+</p:presentation>'''
+
+PRESENTATION_RELS = b'''<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/slide" Target="slides/slide1.xml"/>
+</Relationships>'''
+
+SLIDE = b'''<p:sld xmlns:p="http://schemas.openxmlformats.org/presentationml/2006/main"
+ xmlns:a="http://schemas.openxmlformats.org/drawingml/2006/main"
+ xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">
+<p:cSld><p:spTree><p:pic>
+<p:blipFill><a:blip r:embed="rId2"/></p:blipFill>
+<p:spPr><a:xfrm><a:off x="0" y="0"/><a:ext cx="%d" cy="%d"/></a:xfrm></p:spPr>
+</p:pic></p:spTree></p:cSld>
+</p:sld>'''
+
+SLIDE_RELS = b'''<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/image" Target="../media/image1.png"/>
+</Relationships>'''
+
+
+def write_deck(path, picture, shown_inches=1):
+    """Write a one-slide deck showing a PNG at shown_inches square"""
+    png = io.BytesIO()
+    picture.save(png, 'PNG')
+    extent = int(shown_inches * EMU_PER_INCH)
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as package:
+        package.writestr('[Content_Types].xml', CONTENT_TYPES)
+        package.writestr('_rels/.rels', PACKAGE_RELS)
+        package.writestr('ppt/presentation.xml', PRESENTATION)
+        package.writestr('ppt/_rels/presentation.xml.rels', PRESENTATION_RELS)
+        package.writestr('ppt/slides/slide1.xml', SLIDE % (extent, extent))
+        package.writestr('ppt/slides/_rels/slide1.xml.rels', SLIDE_RELS)
+        package.writestr('ppt/media/image1.png', png.getvalue())
+
+
+def noisy_picture(mode, size=800, seed=1):
+    """A picture whose left half is value 0 and right half noise, too large for its use"""
+    rng = random.Random(seed)
+    picture = Image.new(mode, (size, size), 0)
+    picture.putdata([0 if x < size // 2 else rng.randint(1, 255) for y in range(size) for x in range(size)])
+    if mode == 'P':
+        picture.putpalette([channel for index in range(256) for channel in (index, 255 - index, 128)])
+    return picture
+
+
+@pytest.mark.parametrize('mode', ['P', 'L'])
+def test_downsampled_pictures_keep_their_transparency(tmp_path, mode):
+    source, slimmed = str(tmp_path / 'deck.pptx'), str(tmp_path / 'slim.pptx')
+    picture = noisy_picture(mode)
+    picture.info['transparency'] = 0
+    write_deck(source, picture)
+
+    report = slim_pptx(source, slimmed, max_dpi=100)
+    assert report['images_resized'] == 1
+    with zipfile.ZipFile(slimmed) as package:
+        resized = Image.open(io.BytesIO(package.read('ppt/media/image1.png')))
+        resized.load()
+    assert resized.size == (100, 100)
+    # The transparent half stays clear up to its edge, without opaque speckles
+    alpha = resized.convert('RGBA').getchannel('A')
+    assert max(alpha.getpixel((x, y)) for x in range(49) for y in range(100)) < 16
+    assert min(alpha.getpixel((x, y)) for x in range(53, 100) for y in range(100)) == 255
+
+
+def rels(*targets):
+    """A .rels part; targets are (type, target) pairs numbered rId1, rId2, ..."""
+    return ('<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            + ''.join(f'<Relationship Id="rId{n}" Type="http://schemas.openxmlformats.org/officeDocument/2006/'
+                      f'relationships/{rel_type}" Target="{target}"/>'
+                      for n, (rel_type, target) in enumerate(targets, start=1))
+            + '</Relationships>').encode()
+
+
+VIDEO_SLIDE = b'''<p:sld xmlns:p="http://schemas.openxmlformats.org/presentationml/2006/main"
+ xmlns:a="http://schemas.openxmlformats.org/drawingml/2006/main"
+ xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">
+<p:cSld><p:spTree><p:pic>
+<p:nvPicPr><p:cNvPr id="2" name="Video"><a:hlinkClick r:id="" action="ppaction://media"/></p:cNvPr>
+<p:nvPr><a:videoFile r:link="rId3"/><p:extLst><p:ext uri="{DAA4B4D4-6D71-4841-9C94-3DE7FCFB9230}">
+<p14:media xmlns:p14="http://schemas.microsoft.com/office/powerpoint/2010/main" r:embed="rId4"/>
+</p:ext></p:extLst></p:nvPr></p:nvPicPr>
+<p:blipFill><a:blip r:embed="rId2"/></p:blipFill>
+<p:spPr><a:xfrm><a:off x="0" y="0"/><a:ext cx="914400" cy="914400"/></a:xfrm></p:spPr>
+</p:pic></p:spTree></p:cSld>
+<p:timing><p:tnLst><p:par><p:cTn id="1"/></p:par></p:tnLst></p:timing>
+</p:sld>'''
+
+MASTER = b'''<p:sldMaster xmlns:p="http://schemas.openxmlformats.org/presentationml/2006/main"
+ xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">
+<p:sldLayoutIdLst>%s</p:sldLayoutIdLst></p:sldMaster>'''
+
+SLIDE_LAYOUT = b'<p:sldLayout xmlns:p="http://schemas.openxmlformats.org/presentationml/2006/main"/>'
+
+
+def write_full_deck(path):
+    """
+    A deck with a video on its only slide, a second layout of the used master
+    that no slide uses, a second master no slide uses, and a stray picture
+    """
+    poster = io.BytesIO()
+    Image.new('RGB', (16, 16), (200, 0, 0)).save(poster, 'PNG')
+    overrides = ''.join(f'<Override PartName="/ppt/{name}" ContentType="application/xml"/>' for name in (
+        'presentation.xml', 'slides/slide1.xml', 'slideMasters/slideMaster1.xml', 'slideMasters/slideMaster2.xml',
+        'slideLayouts/slideLayout1.xml', 'slideLayouts/slideLayout2.xml', 'slideLayouts/slideLayout3.xml',
+        'theme/theme1.xml', 'theme/theme2.xml'))
+    parts = {
+        '[Content_Types].xml': CONTENT_TYPES.replace(b'</Types>', overrides.encode() + b'</Types>'),
+        '_rels/.rels': PACKAGE_RELS,
+        'ppt/presentation.xml': PRESENTATION.replace(b'<p:sldIdLst>', (
+            b'<p:sldMasterIdLst><p:sldMasterId id="2147483648" r:id="rId2"/>'
+            b'<p:sldMasterId id="2147483650" r:id="rId3"/></p:sldMasterIdLst><p:sldIdLst>')),
+        'ppt/_rels/presentation.xml.rels': rels(('slide', 'slides/slide1.xml'),
+                                                ('slideMaster', 'slideMasters/slideMaster1.xml'),
+                                                ('slideMaster', 'slideMasters/slideMaster2.xml')),
+        'ppt/slides/slide1.xml': VIDEO_SLIDE,
+        'ppt/slides/_rels/slide1.xml.rels': rels(('slideLayout', '../slideLayouts/slideLayout1.xml'),
+                                                 ('image', '../media/image1.png'),
+                                                 ('video', '../media/media1.mp4'),
+                                                 ('media', '../media/media1.mp4')),
+        'ppt/slideMasters/slideMaster1.xml': MASTER % (
+            b'<p:sldLayoutId id="2147483649" r:id="rId1"/><p:sldLayoutId id="2147483651" r:id="rId2"/>'),
+        'ppt/slideMasters/_rels/slideMaster1.xml.rels': rels(('slideLayout', '../slideLayouts/slideLayout1.xml'),
+                                                             ('slideLayout', '../slideLayouts/slideLayout2.xml'),
+                                                             ('theme', '../theme/theme1.xml')),
+        'ppt/slideMasters/slideMaster2.xml': MASTER % b'<p:sldLayoutId id="2147483652" r:id="rId1"/>',
+        'ppt/slideMasters/_rels/slideMaster2.xml.rels': rels(('slideLayout', '../slideLayouts/slideLayout3.xml'),
+                                                             ('theme', '../theme/theme2.xml')),
+        'ppt/slideLayouts/slideLayout1.xml': SLIDE_LAYOUT,
+        'ppt/slideLayouts/_rels/slideLayout1.xml.rels': rels(('slideMaster', '../slideMasters/slideMaster1.xml')),
+        'ppt/slideLayouts/slideLayout2.xml': SLIDE_LAYOUT,
+        'ppt/slideLayouts/_rels/slideLayout2.xml.rels': rels(('slideMaster', '../slideMasters/slideMaster1.xml'),
+                                                             ('image', '../media/image2.png')),
+        'ppt/slideLayouts/slideLayout3.xml': SLIDE_LAYOUT,
+        'ppt/slideLayouts/_rels/slideLayout3.xml.rels': rels(('slideMaster', '../slideMasters/slideMaster2.xml')),
+        'ppt/theme/theme1.xml': b'<a:theme/>',
+        'ppt/theme/theme2.xml': b'<a:theme/>',
+        'ppt/media/image1.png': poster.getvalue(),
+        'ppt/media/image2.png': poster.getvalue(),
+        'ppt/media/media1.mp4': b'\0' * 50000,
+        'ppt/media/stray.png': poster.getvalue(),
+    }
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as package:
+        for name, data in parts.items():
+            package.writestr(name, data)
+
+
+def test_video_unused_layouts_and_orphans_are_removed(tmp_path):
+    source, slimmed = str(tmp_path / 'deck.pptx'), str(tmp_path / 'slim.pptx')
+    write_full_deck(source)
+
+    report = slim_pptx(source, slimmed)
+    assert {key: report[key] for key in ('media_removed', 'layouts_removed', 'masters_removed', 'parts_removed')} \
+        == {'media_removed': 1, 'layouts_removed': 2, 'masters_removed': 1, 'parts_removed': 7}
+    assert report['size_after'] < report['size_before']
+
+    with zipfile.ZipFile(slimmed) as package:
+        names = set(package.namelist())
+        assert not names & {'ppt/media/media1.mp4', 'ppt/media/image2.png', 'ppt/media/stray.png',
+                            'ppt/slideLayouts/slideLayout2.xml', 'ppt/slideLayouts/slideLayout3.xml',
+                            'ppt/slideMasters/slideMaster2.xml', 'ppt/theme/theme2.xml',
+                            'ppt/slideMasters/_rels/slideMaster2.xml.rels'}
+        assert {'ppt/media/image1.png', 'ppt/slideLayouts/slideLayout1.xml', 'ppt/theme/theme1.xml'} <= names
+
+        # The video becomes a plain picture of its poster frame
+        slide = package.read('ppt/slides/slide1.xml')
+        assert b'<a:blip r:embed="rId2"/>' in slide
+        for gone in (b'videoFile', b'p14:media', b'ppaction://media', b'p:timing'):
+            assert gone not in slide
+        assert b'media1.mp4' not in package.read('ppt/slides/_rels/slide1.xml.rels')
+
+        assert b'rId3' not in package.read('ppt/presentation.xml')
+        assert b'rId2' not in package.read('ppt/slideMasters/slideMaster1.xml')
+        content_types = package.read('[Content_Types].xml')
+        assert b'slideMaster2' not in content_types and b'slideLayout1' in content_types
+
+        # Every remaining relationship leads to a part that is still there
+        for name in names:
+            if name.endswith('.rels'):
+                for target in re.findall(rb'Target="([^"]+)"', package.read(name)):
+                    part = posixpath.dirname(posixpath.dirname(name))
+                    assert posixpath.normpath(posixpath.join(part, target.decode())) in names
+
+
+def test_decks_with_nothing_to_slim_are_left_alone(tmp_path):
+    source, slimmed = str(tmp_path / 'deck.pptx'), str(tmp_path / 'slim.pptx')
+    write_deck(source, noisy_picture('L', size=50))
+    assert slim_pptx(source, slimmed, max_dpi=100) is None
+    assert not (tmp_path / 'slim.pptx').exists()
@@ -0,0 +1,206 @@
+import struct
+import zipfile
+
+import pytest
+
+from preflight import MB, CostModel, DeckInfo, PreflightError, inspect_deck
+from upload_stream import OLE2_MAGIC
+
+PRESENTATION = (b'<p:presentation><p:sldIdLst>'
+                + b''.join(b'<p:sldId id="%d" r:id="rId%d"/>' % (256 + n, n) for n in range(3))
+                + b'</p:sldIdLst></p:presentation>' + b' ' * 4096)
+
+
+def write_deck(path, compression=zipfile.ZIP_DEFLATED):
+    """Write a minimal deck; returns the entry of its presentation part"""
+    with zipfile.ZipFile(path, 'w') as package:
+        package.writestr('[Content_Types].xml', '<Types/>')
+        package.writestr('ppt/presentation.xml', PRESENTATION, compress_type=compression)
+    with zipfile.ZipFile(path) as package:
+        return package.getinfo('ppt/presentation.xml')
+
+
+def write_compound(path, streams):
+    """
+    Write a minimal OLE2 file with 512-byte sectors: the FAT in sector 0,
+    then the directory, then each stream. The mini stream cutoff is 0, so no
+    stream is kept in mini sectors.
+    """
+    entries = [('Root Entry', 5, 0xFFFFFFFE, 0)]
+    sectors, fat = [], [0xFFFFFFFD]
+    directory_sectors = (len(streams) + 1 + 3) // 4
+    next_sector = 1 + directory_sectors
+    fat.extend(list(range(2, 1 + directory_sectors)) + [0xFFFFFFFE])
+    for name, data in streams:
+        count = max(1, -(-len(data) // 512))
+        entries.append((name, 2, next_sector, len(data)))
+        sectors.append(data.ljust(count * 512, b'\0'))
+        fat.extend(list(range(next_sector + 1, next_sector + count)) + [0xFFFFFFFE])
+        next_sector += count
+    assert len(fat) <= 128
+
+    directory = b''
+    for name, entry_type, start, size in entries:
+        encoded = (name + '\0').encode('utf-16-le')
+        directory += (encoded.ljust(64, b'\0') + struct.pack('<HB', len(encoded), entry_type)).ljust(116, b'\0') \
+            + struct.pack('<IQ', start, size)
+    header = bytearray(512)
+    header[:8] = OLE2_MAGIC
+    struct.pack_into('<HH', header, 0x1E, 9, 6)
+    struct.pack_into('<II', header, 0x2C, 1, 1)
+    struct.pack_into('<IIIII', header, 0x38, 0, 0xFFFFFFFE, 0, 0xFFFFFFFE, 0)
+    struct.pack_into('<109I', header, 0x4C, 0, *[0xFFFFFFFF] * 108)
+    with open(path, 'wb') as f:
+        f.write(bytes(header))
+        f.write(struct.pack('<128I', *fat + [0xFFFFFFFF] * (128 - len(fat))))
+        f.write(directory.ljust(directory_sectors * 512, b'\0'))
+        f.write(b''.join(sectors))
+
+
+def summary_information(slide_count):
+    """DocumentSummaryInformation holding one property: the slide count"""
+    header = bytearray(48)
+    struct.pack_into('<I', header, 44, 48)
+    return bytes(header) + struct.pack('<IIII', 24, 1, 0x07, 16) + struct.pack('<HxxI', 0x03, slide_count)
+
+
+def patch_header_field(path, entry, local_offset, value):
+    """Overwrite a 16-bit field of an entry in its local header and central directory"""
+    with open(path, 'r+b') as f:
+        data = f.read()
+        # Central directory fields sit two bytes further in (after "version made by")
+        central = data.rindex(entry.filename.encode()) - 46
+        for offset in (entry.header_offset + local_offset, central + local_offset + 2):
+            f.seek(offset)
+            f.write(struct.pack('<H', value))
+
+
+def test_slides_are_counted(tmp_path):
+    path = str(tmp_path / 'deck.pptx')
+    write_deck(path)
+    assert inspect_deck(path).slide_count == 3
+
+
+def test_damaged_deflate_stream_is_corrupt(tmp_path):
+    path = str(tmp_path / 'deck.pptx')
+    entry = write_deck(path)
+    with open(path, 'r+b') as f:
+        f.seek(entry.header_offset + 26)
+        name_length, extra_length = struct.unpack('<HH', f.read(4))
+        f.seek(entry.header_offset + 30 + name_length + extra_length)
+        f.write(b'\xff' * entry.compress_size)
+    with pytest.raises(PreflightError) as error:
+        inspect_deck(path)
+    assert error.value.reason == 'corrupt'
+
+
+@pytest.mark.parametrize('field, value', [
+    (8, 99),  # compression method 99 (AES), which zipfile cannot read
+    (6, 0x1),  # general purpose flag: encrypted
+])
+def test_unreadable_presentation_part_is_corrupt(tmp_path, field, value):
+    path = str(tmp_path / 'deck.pptx')
+    entry = write_deck(path, compression=zipfile.ZIP_STORED)
+    patch_header_field(path, entry, field, value)
+    with pytest.raises(PreflightError) as error:
+        inspect_deck(path)
+    assert error.value.reason == 'corrupt'
+
+
+@pytest.mark.parametrize('name, size, limits', [
+    ('ratio', 11 * MB, {}),
+    ('unpacked size', 2 * MB, {'max_unpacked_size': MB}),
+])
+def test_zip_bombs_are_rejected(tmp_path, name, size, limits):
+    path = str(tmp_path / 'deck.pptx')
+    write_deck(path)
+    with zipfile.ZipFile(path, 'a', zipfile.ZIP_DEFLATED) as package:
+        package.writestr('ppt/media/image1.png', b'\0' * size)
+    with pytest.raises(PreflightError) as error:
+        inspect_deck(path, **limits)
+    assert error.value.reason == 'zip_bomb'
+
+
+def test_media_is_counted_and_limits_apply(tmp_path):
+    path = str(tmp_path / 'deck.pptx')
+    write_deck(path)
+    with zipfile.ZipFile(path, 'a') as package:
+        package.writestr('ppt/media/image1.PNG', b'x' * 100)
+        package.writestr('ppt/media/media1.mp4', b'x' * 50)
+        package.writestr('ppt/slides/slide1.xml', b'<p:sld/>')
+    info = inspect_deck(path)
+    assert (info.container, info.media_count, info.image_count, info.media_bytes) == ('ooxml', 2, 1, 150)
+    assert DeckInfo.from_dict(info.to_dict()).to_dict() == info.to_dict()
+
+    for limits, reason in (({'max_entries': 4}, 'too_many_entries'), ({'max_slides': 2}, 'too_many_slides')):
+        with pytest.raises(PreflightError) as error:
+            inspect_deck(path, **limits)
+        assert error.value.reason == reason
+
+
+def test_files_that_are_not_presentations(tmp_path):
+    path = str(tmp_path / 'deck.pptx')
+    with open(path, 'wb') as f:
+        f.write(b'%PDF-1.7')
+    with pytest.raises(PreflightError) as error:
+        inspect_deck(path)
+    assert error.value.reason == 'not_presentation'
+
+    # A zip (say a .docx) without a presentation part
+    with zipfile.ZipFile(path, 'w') as package:
+        package.writestr('word/document.xml', '<w:document/>')
+    with pytest.raises(PreflightError) as error:
+        inspect_deck(path)
+    assert error.value.reason == 'not_presentation'
+
+
+def test_ppt_slides_and_pictures_are_counted(tmp_path):
+    path = str(tmp_path / 'deck.ppt')
+    blip = struct.pack('<HHI', 0, 0xF01E, 100) + b'\0' * 100
+    pictures = blip + struct.pack('<HHI', 0, 0xF000, 0) + blip
+    write_compound(path, [('PowerPoint Document', b'\0' * 1000), ('Pictures', pictures),
+                          ('\x05DocumentSummaryInformation', summary_information(7))])
+    info = inspect_deck(path)
+    assert (info.container, info.slide_count, info.image_count, info.media_bytes) == ('ole2', 7, 2, len(pictures))
+
+    with pytest.raises(PreflightError) as error:
+        inspect_deck(path, max_slides=5)
+    assert error.value.reason == 'too_many_slides'
+
+
+@pytest.mark.parametrize('streams, reason', [
+    ([('PowerPoint Document', b'\0' * 100), ('EncryptedSummary', b'\0' * 100)], 'encrypted'),
+    ([('EncryptedPackage', b'\0' * 100)], 'encrypted'),
+    ([('WordDocument', b'\0' * 100)], 'not_presentation'),
+])
+def test_ppt_that_cannot_be_converted(tmp_path, streams, reason):
+    path = str(tmp_path / 'deck.ppt')
+    write_compound(path, streams)
+    with pytest.raises(PreflightError) as error:
+        inspect_deck(path)
+    assert error.value.reason == reason
+
+
+def test_truncated_ppt_is_corrupt(tmp_path):
+    path = str(tmp_path / 'deck.ppt')
+    write_compound(path, [('PowerPoint Document', b'\0' * 1000)])
+    with open(path, 'r+b') as f:
+        f.truncate(600)
+    with pytest.raises(PreflightError) as error:
+        inspect_deck(path)
+    assert error.value.reason == 'corrupt'
+
+
+def test_cost_model_learns_a_scale_from_observed_conversions():
+    model = CostModel(per_file=2, per_slide=0.5, per_media_mb=1, per_image=0.1, per_mb=1, min_samples=3)
+    deck = DeckInfo('ooxml', 5 * MB, slide_count=10, media_bytes=2 * MB, image_count=10)
+    assert model.estimate(deck) == pytest.approx(2 + 5 + 2 + 1)
+    # Without a slide count the file size is all there is to go on
+    assert model.estimate(DeckInfo('ole2', 3 * MB)) == pytest.approx(2 + 3)
+
+    for seconds in (20, 30, 100):
+        assert model.scale() == 1.0
+        model.observe(deck, seconds)
+    # The median ratio, so one slow outlier does not skew the estimates
+    assert model.scale() == pytest.approx(3)
+    assert model.estimate(deck) == pytest.approx(30)
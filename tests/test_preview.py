@@ -0,0 +1,72 @@
+import io
+import os
+
+import pytest
+
+from backends import write_placeholder_pdf
+
+pypdf = pytest.importorskip('pypdf')
+
+
+def page_text(data):
+    reader = pypdf.PdfReader(io.BytesIO(data))
+    assert len(reader.pages) == 1
+    return reader.pages[0].extract_text().strip()
+
+
+def write_part(folder, first_slide, last_slide):
+    path = os.path.join(folder, f'part-{first_slide}.pdf')
+    write_placeholder_pdf(path, [f'slide {number}' for number in range(first_slide, last_slide + 1)])
+    return {'first_slide': first_slide, 'last_slide': last_slide, 'path': path,
+            'pages': last_slide - first_slide + 1}
+
+
+def test_contiguous_parts_stop_at_the_first_gap(app_module):
+    parts = [{'first_slide': 1, 'last_slide': 2}, {'first_slide': 3, 'last_slide': 5},
+             {'first_slide': 8, 'last_slide': 9}]
+    assert list(app_module.contiguous_parts(parts)) == parts[:2]
+    assert list(app_module.contiguous_parts(parts[1:])) == []
+
+
+def test_preview_serves_pages_of_finished_parts(app_module, tmp_path):
+    first, last = write_part(str(tmp_path), 1, 2), write_part(str(tmp_path), 5, 6)
+    app_module.job_store.create('preview-1', {'status': 'converting', 'results': [
+        {'original_filename': 'deck.pptx', 'status': 'converting', 'preview_parts': [first, last],
+         'preview_pages': 2},
+    ]})
+    client = app_module.app.test_client()
+
+    response = client.get('/preview/preview-1/2')
+    assert response.status_code == 200
+    assert response.mimetype == 'application/pdf'
+    assert page_text(response.data) == 'slide 2'
+
+    # Slides 3-4 are still converting, so nothing past them is served
+    for page in (3, 5):
+        response = client.get(f'/preview/preview-1/{page}')
+        assert response.status_code == 404
+        assert response.get_json() == {'error': 'Page not converted yet', 'preview_pages': 2}
+
+    def fill_gap(job):
+        job['results'][0]['preview_parts'].insert(1, write_part(str(tmp_path), 3, 4))
+    app_module.job_store.modify('preview-1', fill_gap)
+    assert page_text(client.get('/preview/preview-1/5').data) == 'slide 5'
+    assert client.get('/preview/preview-1/7').status_code == 404
+
+
+def test_preview_of_a_finished_file_uses_its_pdf(app_module, tmp_path):
+    pdf_path = str(tmp_path / 'done.pdf')
+    write_placeholder_pdf(pdf_path, ['first', 'second'])
+    app_module.job_store.create('preview-2', {'status': 'completed', 'results': [
+        {'original_filename': 'other.pptx', 'status': 'error'},
+        {'original_filename': 'done.pptx', 'status': 'success', 'pdf_path': pdf_path},
+    ]})
+    client = app_module.app.test_client()
+
+    response = client.get('/preview/preview-2/2?file=1')
+    assert page_text(response.data) == 'second'
+    assert response.headers['Content-Disposition'] == 'inline; filename="page-2.pdf"'
+    assert client.get('/preview/preview-2/3?file=1').status_code == 404
+    assert client.get('/preview/preview-2/1?file=2').get_json() == {'error': 'Invalid file or page'}
+    assert client.get('/preview/preview-2/0?file=1').status_code == 404
+    assert client.get('/preview/missing/1').status_code == 404
@@ -0,0 +1,70 @@
+import os
+import time
+import uuid
+
+import pytest
+
+from job_store import MemoryJobStore
+from reaper import Reaper
+
+
+def write(path, size=10, age=0):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(b'x' * size)
+    if age:
+        stamp = time.time() - age
+        os.utime(path, (stamp, stamp))
+    return path
+
+
+@pytest.fixture
+def folders(tmp_path):
+    return str(tmp_path / 'uploads'), str(tmp_path / 'downloads')
+
+
+def make_reaper(job_store, folders, **kwargs):
+    options = dict(job_ttl=3600, max_jobs=0, high_water=0)
+    options.update(kwargs)
+    return Reaper(job_store, lambda job_id, job: job.get('paths', []), folders,
+                  finished_statuses=('completed',), active_statuses=('processing',), **options)
+
+
+def test_orphan_sweep_only_deletes_application_files(folders):
+    uploads, downloads = folders
+    day = 86400
+    ours = [
+        write(os.path.join(uploads, f'{uuid.uuid4()}_deck.pptx'), age=day),
+        write(os.path.join(downloads, uuid.uuid4().hex, 'deck.pdf'), age=day),
+        write(os.path.join(downloads, 'archives', '1700000000000.zip'), age=day),
+    ]
+    theirs = [
+        write(os.path.join(uploads, '.gitkeep'), size=0, age=day),
+        write(os.path.join(uploads, 'notes.txt'), age=day),
+        write(os.path.join(uploads, f'.{uuid.uuid4()}_hidden.pptx'), age=day),
+        write(os.path.join(downloads, 'static', 'logo.png'), age=day),
+    ]
+    recent = write(os.path.join(uploads, f'{uuid.uuid4()}_new.pptx'))
+    job_store = MemoryJobStore()
+    kept = write(os.path.join(uploads, f'{uuid.uuid4()}_kept.pptx'), age=day)
+    job_store.create('1', {'status': 'processing', 'paths': [kept]})
+
+    summary = make_reaper(job_store, folders).run_once()
+
+    assert summary['bytes'] == 30
+    assert not any(os.path.exists(path) for path in ours)
+    assert all(os.path.exists(path) for path in theirs + [recent, kept])
+
+
+def test_disk_expiry_spares_recently_finished_jobs(folders, monkeypatch):
+    job_store = MemoryJobStore()
+    job_store.create('old', {'status': 'completed', 'paths': []})
+    now = time.time() + 400
+    monkeypatch.setattr(time, 'time', lambda: now)
+    job_store.create('new', {'status': 'completed', 'paths': []})
+    monkeypatch.setattr(Reaper, '_disk_percent', lambda self: 95)
+
+    reaper = make_reaper(job_store, folders, job_ttl=0, high_water=90, low_water=80, min_age=300)
+    assert reaper.run_once()['disk'] == 1
+    assert job_store.get('old') is None
+    assert job_store.get('new') is not None
@@ -0,0 +1,152 @@
+import io
+import os
+import threading
+import time
+import types
+
+import pytest
+
+from corpus import generate_pptx
+from scheduler import JobScheduler, QueueFullError
+
+
+class Recorder:
+    """Jobs that note the order they ran in; the first one can hold the only worker"""
+
+    def __init__(self):
+        self.ran = []
+        self.release = threading.Event()
+
+    def block(self):
+        self.release.wait(10)
+
+    def run(self, name):
+        self.ran.append(name)
+
+
+@pytest.fixture
+def recorder():
+    recorder = Recorder()
+    yield recorder
+    recorder.release.set()
+
+
+@pytest.fixture
+def busy_scheduler(recorder):
+    """A one-worker scheduler whose worker is busy until recorder.release is set"""
+    scheduler = JobScheduler(workers=1, max_queued=10, interactive_weight=2)
+    assert scheduler.submit('blocker', recorder.block) == 0
+    wait_for(lambda: scheduler.stats()['running'] == 1)
+    yield scheduler
+    scheduler.shutdown(wait=False)
+
+
+def wait_for(condition, timeout=10):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def run_all(scheduler, recorder):
+    recorder.release.set()
+    wait_for(lambda: scheduler.stats()['queued'] == 0 and scheduler.stats()['running'] == 0)
+    return recorder.ran
+
+
+def test_interactive_lane_is_preferred_but_bulk_is_not_starved(busy_scheduler, recorder):
+    for name in ('b1', 'b2'):
+        busy_scheduler.submit(name, recorder.run, args=(name,), lane=JobScheduler.BULK)
+    for name in ('i1', 'i2', 'i3', 'i4'):
+        busy_scheduler.submit(name, recorder.run, args=(name,), client=name, lane=JobScheduler.INTERACTIVE)
+
+    expected = ['i1', 'i2', 'b1', 'i3', 'i4', 'b2']
+    assert [busy_scheduler.position(name) for name in expected] == [1, 2, 3, 4, 5, 6]
+    assert run_all(busy_scheduler, recorder) == expected
+
+
+def test_clients_take_turns_and_each_runs_its_shortest_job_first(busy_scheduler, recorder):
+    for name, cost in (('a-long', 60), ('a-short', 5), ('a-mid', 30)):
+        busy_scheduler.submit(name, recorder.run, args=(name,), client='a', cost=cost)
+    busy_scheduler.submit('b', recorder.run, args=('b',), client='b', cost=100)
+
+    assert run_all(busy_scheduler, recorder) == ['a-short', 'b', 'a-mid', 'a-long']
+
+
+def test_waiting_counts_against_the_cost_of_a_job(busy_scheduler, recorder, monkeypatch):
+    import scheduler
+
+    clock = [1000.0]
+    monkeypatch.setattr(scheduler, 'time', types.SimpleNamespace(time=lambda: clock[0]))
+    busy_scheduler.submit('long', recorder.run, args=('long',), client='a', cost=30)
+    busy_scheduler.submit('short', recorder.run, args=('short',), client='a', cost=5)
+    assert busy_scheduler.position('short') == 1
+
+    # After waiting longer than its cost, the long job goes ahead of new short ones
+    clock[0] += 40
+    busy_scheduler.submit('new-short', recorder.run, args=('new-short',), client='a', cost=5)
+    assert [busy_scheduler.position(name) for name in ('short', 'long', 'new-short')] == [1, 2, 3]
+
+
+def test_eta_adds_up_the_jobs_ahead(busy_scheduler, recorder):
+    busy_scheduler.submit('first', recorder.run, args=('first',), cost=20)
+    busy_scheduler.submit('second', recorder.run, args=('second',), client='other', cost=5)
+
+    # The blocker has no estimate, so the worker counts as free now
+    assert busy_scheduler.eta('first') == pytest.approx(0, abs=1)
+    assert busy_scheduler.eta('second') == pytest.approx(20, abs=1)
+    assert busy_scheduler.eta('unknown') is None
+
+
+def test_full_queue_rejects_submissions(recorder):
+    scheduler = JobScheduler(workers=1, max_queued=1)
+    try:
+        assert scheduler.submit('blocker', recorder.block) == 0
+        wait_for(lambda: scheduler.stats()['running'] == 1)
+        assert scheduler.submit('waiting', recorder.run, args=('waiting',)) == 1
+        with pytest.raises(QueueFullError):
+            scheduler.submit('rejected', recorder.run, args=('rejected',))
+        assert run_all(scheduler, recorder) == ['waiting']
+    finally:
+        scheduler.shutdown(wait=False)
+
+
+@pytest.fixture
+def deck(tmp_path):
+    path = str(tmp_path / 'deck.pptx')
+    generate_pptx(path, 20 * 1024, slide_count=2, seed=11)
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def post_upload(client, deck):
+    return client.post('/upload', data={'files': [(io.BytesIO(deck), 'deck.pptx')]},
+                       content_type='multipart/form-data')
+
+
+def test_upload_reports_queue_position_and_answers_429_when_full(app_module, monkeypatch, recorder, deck):
+    scheduler = JobScheduler(workers=1, max_queued=1)
+    monkeypatch.setattr(app_module, 'scheduler', scheduler)
+    client = app_module.app.test_client()
+    try:
+        scheduler.submit('blocker', recorder.block)
+        wait_for(lambda: scheduler.stats()['running'] == 1)
+
+        response = post_upload(client, deck)
+        assert response.status_code == 302
+        conversion_id = response.headers['Location'].rstrip('/').split('/')[-1]
+        status = client.get(f'/status/{conversion_id}').get_json()
+        assert status['status'] == 'queued'
+        assert status['queue_position'] == 1
+
+        uploads = set(os.listdir(app_module.converter.upload_folder))
+        response = post_upload(client, deck)
+        assert response.status_code == 429
+        assert response.headers['Retry-After'] == '60'
+        # The rejected upload is not left behind
+        assert set(os.listdir(app_module.converter.upload_folder)) == uploads
+
+        recorder.release.set()
+        wait_for(lambda: client.get(f'/status/{conversion_id}').get_json()['status'] == 'completed')
+    finally:
+        scheduler.shutdown(wait=False)
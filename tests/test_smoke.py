@@ -0,0 +1,77 @@
+"""End-to-end upload -> status -> download through the web app on the fake backend"""
+
+import io
+import os
+import time
+import zipfile
+
+import pytest
+
+from corpus import generate_pptx
+from metrics import CONVERSIONS_TOTAL
+
+@pytest.fixture(scope='module')
+def client(app_module):
+    return app_module.app.test_client()
+
+
+@pytest.fixture(scope='module')
+def decks(tmp_path_factory):
+    deck_dir = tmp_path_factory.mktemp('decks')
+    paths = []
+    for number in range(2):
+        path = str(deck_dir / f'deck{number}.pptx')
+        generate_pptx(path, 50 * 1024, slide_count=3, seed=number)
+        paths.append(path)
+    return paths
+
+
+def upload(client, paths):
+    files = [(io.BytesIO(open(path, 'rb').read()), os.path.basename(path)) for path in paths]
+    response = client.post('/upload', data={'files': files}, content_type='multipart/form-data')
+    assert response.status_code == 302, response.data
+    assert '/progress/' in response.headers['Location']
+    return response.headers['Location'].rstrip('/').split('/')[-1]
+
+
+def wait_until_finished(client, conversion_id, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        status = client.get(f'/status/{conversion_id}').get_json()
+        if status['status'] in ('completed', 'completed_with_errors', 'error'):
+            return status
+        time.sleep(0.1)
+    pytest.fail(f"Conversion {conversion_id} did not finish: {status}")
+
+
+def test_upload_status_download(client, decks):
+    coalesced_before = CONVERSIONS_TOTAL.value(result='coalesced')
+    # The duplicate of the first deck converts at the same time as the
+    # original and waits for its result instead of using an engine
+    conversion_id = upload(client, decks + decks[:1])
+    status = wait_until_finished(client, conversion_id)
+
+    assert status['status'] == 'completed'
+    assert [result['status'] for result in status['results']] == ['success'] * 3
+    assert CONVERSIONS_TOTAL.value(result='coalesced') == coalesced_before + 1
+
+    response = client.get(f'/download/{conversion_id}/0')
+    assert response.status_code == 200
+    assert response.data.startswith(b'%PDF')
+
+    response = client.get(f'/download/{conversion_id}')
+    assert response.status_code == 200
+    with zipfile.ZipFile(io.BytesIO(response.data)) as archive:
+        names = archive.namelist()
+        assert len(names) == 3
+        assert all(archive.read(name).startswith(b'%PDF') for name in names)
+
+
+def test_repeat_upload_is_served_from_cache(client, decks):
+    cached_before = CONVERSIONS_TOTAL.value(result='cached')
+    conversion_id = upload(client, decks[1:])
+    status = wait_until_finished(client, conversion_id)
+
+    assert status['status'] == 'completed'
+    assert CONVERSIONS_TOTAL.value(result='cached') == cached_before + 1
+    assert client.get(f'/download/{conversion_id}/0').data.startswith(b'%PDF')
@@ -0,0 +1,55 @@
+import pytest
+
+from corpus import generate_pptx
+from simple_converter import SimplePPTConverter
+
+pypdf = pytest.importorskip('pypdf')
+
+def page_texts(pdf_path):
+    return [page.extract_text().strip() for page in pypdf.PdfReader(pdf_path).pages]
+
+
+@pytest.fixture
+def converter(tmp_path):
+    converter = SimplePPTConverter(
+        upload_folder=str(tmp_path / 'uploads'),
+        download_folder=str(tmp_path / 'downloads'),
+        backend='fake',
+        backend_options={'startup_delay': 0, 'convert_delay': 0},
+        pool_size=3,
+        split_min_slides=5,
+        optimize=False,
+    )
+    yield converter
+    converter.pool.shutdown()
+
+
+def test_split_parts_contain_only_their_slide_range(converter, tmp_path):
+    deck = str(tmp_path / 'deck.pptx')
+    generate_pptx(deck, 20 * 1024, slide_count=10, seed=1)
+
+    parts = []
+    def on_pages(first_slide, last_slide, part_path, pages):
+        parts.append((first_slide, last_slide, pages, page_texts(part_path)))
+
+    success, pdf_path, error = converter.convert_ppt_to_pdf(deck, on_pages=on_pages)
+    assert success, error
+
+    assert sorted(part[:2] for part in parts) == [(1, 4), (5, 7), (8, 10)]
+    for first_slide, last_slide, pages, texts in parts:
+        assert pages == last_slide - first_slide + 1
+        assert texts == [f"deck.pptx slide {number}" for number in range(first_slide, last_slide + 1)]
+
+    # The merged PDF has every slide once, in order
+    assert page_texts(pdf_path) == [f"deck.pptx slide {number}" for number in range(1, 11)]
+
+
+def test_small_decks_are_not_split(converter, tmp_path):
+    deck = str(tmp_path / 'small.pptx')
+    generate_pptx(deck, 20 * 1024, slide_count=3, seed=2)
+
+    parts = []
+    success, pdf_path, error = converter.convert_ppt_to_pdf(deck, on_pages=lambda *part: parts.append(part))
+    assert success, error
+    assert parts == []
+    assert len(pypdf.PdfReader(pdf_path).pages) == 3
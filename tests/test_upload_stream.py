@@ -0,0 +1,97 @@
+import hashlib
+import io
+import os
+
+import pytest
+
+from upload_stream import OLE2_MAGIC, ZIP_MAGIC, IngestFile, check_signature
+
+
+def test_signatures():
+    assert check_signature(OLE2_MAGIC) is None
+    assert check_signature(ZIP_MAGIC + b'\x14\x00\x06\x00') is None
+    assert check_signature(b'%PDF-1.7') == "File is not a PowerPoint presentation"
+    assert check_signature(b'PK') == "File appears to be corrupted or incomplete"
+
+
+def test_presentation_is_written_and_hashed_in_one_pass(tmp_path):
+    path = str(tmp_path / 'deck.pptx')
+    data = ZIP_MAGIC + os.urandom(10000)
+    ingest = IngestFile(path, max_bytes=len(data))
+    # The parser hands over the body in pieces, the first shorter than the signature
+    for start, end in ((0, 2), (2, 9), (9, 5000), (5000, len(data))):
+        assert ingest.write(data[start:end]) == end - start
+    ingest.seek(0)
+    assert ingest.read(4) == ZIP_MAGIC
+
+    assert ingest.error is None
+    assert ingest.size == len(data)
+    assert ingest.hexdigest() == hashlib.sha256(data).hexdigest()
+    ingest.keep()
+    ingest.close()
+    with open(path, 'rb') as f:
+        assert f.read() == data
+
+
+@pytest.mark.parametrize('chunks, error', [
+    ([b'%PDF-1.7', b'trailer'], "File is not a PowerPoint presentation"),
+    ([ZIP_MAGIC + b'\0' * 8, b'\0' * 8], "File is too large (over 0MB)"),
+], ids=['signature', 'size'])
+def test_invalid_upload_stops_being_written(tmp_path, chunks, error):
+    path = str(tmp_path / 'deck.pptx')
+    ingest = IngestFile(path, max_bytes=16)
+    for chunk in chunks + [b'more data'] * 3:
+        # The rest of the part is accepted and thrown away
+        assert ingest.write(chunk) == len(chunk)
+    assert ingest.error == error
+    assert ingest.closed
+    assert not os.path.exists(path)
+    ingest.seek(0)
+    assert ingest.read() == b''
+
+
+@pytest.mark.parametrize('data, error', [
+    (b'', "File is empty"),
+    (b'PK', "File appears to be corrupted or incomplete"),
+])
+def test_files_shorter_than_a_signature_are_rejected_when_complete(tmp_path, data, error):
+    path = str(tmp_path / 'deck.pptx')
+    ingest = IngestFile(path, max_bytes=1024)
+    ingest.write(data)
+    assert ingest.error is None
+    ingest.seek(0)
+    assert ingest.error == error
+    assert not os.path.exists(path)
+
+
+def test_files_nobody_kept_are_removed_with_the_request(tmp_path):
+    path = str(tmp_path / 'deck.pptx')
+    ingest = IngestFile(path, max_bytes=1024)
+    ingest.write(OLE2_MAGIC + b'\0' * 100)
+    ingest.close()
+    assert not os.path.exists(path)
+
+
+def test_upload_route_streams_into_the_upload_folder(app_module, tmp_path):
+    from corpus import generate_pptx
+
+    deck_path = str(tmp_path / 'deck.pptx')
+    generate_pptx(deck_path, 20 * 1024, slide_count=2, seed=5)
+    with open(deck_path, 'rb') as f:
+        deck = f.read()
+    client = app_module.app.test_client()
+    uploads = set(os.listdir(app_module.converter.upload_folder))
+
+    response = client.post('/upload', content_type='multipart/form-data', data={'files': [
+        (io.BytesIO(deck), 'deck.pptx'),
+        (io.BytesIO(b'just some text, not a deck'), 'notes.pptx'),
+    ]})
+    assert response.status_code == 302
+    conversion_id = response.headers['Location'].rstrip('/').split('/')[-1]
+    job = app_module.job_store.get(conversion_id)
+    assert [file_info['original_filename'] for file_info in job['files']] == ['deck.pptx']
+    assert job['files'][0]['file_hash'] == hashlib.sha256(deck).hexdigest()
+    assert job['failed_uploads'] == ["notes.pptx: File is not a PowerPoint presentation"]
+    # Only the accepted file reached the upload folder
+    added = set(os.listdir(app_module.converter.upload_folder)) - uploads
+    assert all(name.endswith('_deck.pptx') for name in added)
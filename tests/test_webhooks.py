@@ -0,0 +1,127 @@
+import json
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+import webhooks
+from webhooks import SIGNATURE_HEADER, WebhookSender, sign, valid_callback_url
+
+
+class Receiver(BaseHTTPRequestHandler):
+    """Answers each POST with the next status of the server's script"""
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        self.server.requests.append((self.path, self.headers, body))
+        status = self.server.statuses.pop(0) if self.server.statuses else 200
+        self.send_response(status)
+        if status == 302:
+            self.send_header('Location', '/elsewhere')
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def receiver():
+    server = HTTPServer(('127.0.0.1', 0), Receiver)
+    server.requests, server.statuses = [], []
+    thread = threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.01}, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def url(server, path='/done'):
+    return f"http://127.0.0.1:{server.server_port}{path}"
+
+
+def test_delivery_is_retried_with_backoff_and_signed(receiver):
+    delays = []
+    receiver.statuses = [503, 429, 200]
+    sender = WebhookSender(secret='s3cret', attempts=5, retry_delay=0.5, allow_private=True,
+                           sleep=delays.append)
+
+    assert sender.deliver(url(receiver), {'id': '1', 'status': 'completed'})
+    assert delays == [0.5, 1.0]
+    assert len(receiver.requests) == 3
+    for path, headers, body in receiver.requests:
+        assert path == '/done'
+        assert json.loads(body) == {'id': '1', 'status': 'completed'}
+        assert headers[SIGNATURE_HEADER] == sign(body, 's3cret')
+    assert sender.stats() == {'delivered': 1, 'failed': 0}
+
+
+def test_rejected_and_redirected_deliveries_are_not_retried(receiver):
+    delays = []
+    sender = WebhookSender(attempts=5, allow_private=True, sleep=delays.append)
+    for status in (404, 302):
+        receiver.statuses = [status]
+        assert not sender.deliver(url(receiver), {'id': '1'})
+    assert [path for path, _, _ in receiver.requests] == ['/done', '/done']
+    assert delays == []
+    assert sender.stats() == {'delivered': 0, 'failed': 2}
+
+
+def test_private_addresses_need_opting_in(receiver):
+    sender = WebhookSender(attempts=3)
+    assert not sender.deliver(url(receiver), {'id': '1'})
+    assert receiver.requests == []
+
+    for private in ('http://127.0.0.1/', 'http://localhost:8080/', 'http://10.1.2.3/',
+                    'http://169.254.169.254/latest/', 'http://[::1]/', 'http://[fe80::1]/',
+                    'http://224.0.0.1/'):
+        assert not valid_callback_url(private), private
+        assert valid_callback_url(private, allow_private=True), private
+    assert valid_callback_url('https://93.184.215.14/done')
+    for invalid in ('ftp://example.com/', 'http://', 'not a url', 'http://[::1/'):
+        assert not valid_callback_url(invalid, allow_private=True), invalid
+
+
+class Resolver:
+    """Stands in for the socket module of webhooks: names resolve to the
+    given addresses in turn and every connection ends up at the receiver"""
+
+    def __init__(self, receiver, addresses):
+        self.receiver = receiver
+        self.addresses = list(addresses)
+        self.connected = []
+
+    def __getattr__(self, name):
+        return getattr(socket, name)
+
+    def getaddrinfo(self, host, port, *args, **kwargs):
+        address = self.addresses.pop(0) if len(self.addresses) > 1 else self.addresses[0]
+        return [(socket.AF_INET, socket.SOCK_STREAM, socket.IPPROTO_TCP, '', (address, port))]
+
+    def create_connection(self, address, *args):
+        self.connected.append(address)
+        return socket.create_connection(('127.0.0.1', self.receiver.server_port), *args)
+
+
+def test_delivery_connects_to_the_address_it_checked(receiver, monkeypatch):
+    # The name turns private right after the check (DNS rebinding)
+    resolver = Resolver(receiver, ['93.184.215.14', '127.0.0.1'])
+    monkeypatch.setattr(webhooks, 'socket', resolver)
+    sender = WebhookSender(attempts=3, sleep=lambda seconds: None)
+
+    assert sender.deliver(f"http://hooks.example:{receiver.server_port}/done", {'id': '1'})
+    assert resolver.connected == [('93.184.215.14', receiver.server_port)]
+    _, headers, _ = receiver.requests[0]
+    assert headers['Host'] == f"hooks.example:{receiver.server_port}"
+
+
+def test_delivery_stops_once_the_host_turns_private(receiver, monkeypatch):
+    resolver = Resolver(receiver, ['93.184.215.14', '10.0.0.5'])
+    monkeypatch.setattr(webhooks, 'socket', resolver)
+    receiver.statuses = [503]
+    sender = WebhookSender(attempts=3, sleep=lambda seconds: None)
+
+    assert not sender.deliver(f"http://hooks.example:{receiver.server_port}/done", {'id': '1'})
+    assert len(receiver.requests) == 1
+    assert resolver.connected == [('93.184.215.14', receiver.server_port)]
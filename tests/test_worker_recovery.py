@@ -0,0 +1,94 @@
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import pytest
+
+from job_queue import SpoolJobQueue
+from job_store import MemoryJobStore
+from scheduler import JobScheduler
+
+
+@pytest.fixture
+def app(app_module, monkeypatch, tmp_path):
+    """The app in distributed mode with a spool queue and fresh job store"""
+    monkeypatch.setattr(app_module, 'job_queue', SpoolJobQueue(str(tmp_path / 'spool'), poll_interval=0.01))
+    monkeypatch.setattr(app_module, 'job_store', MemoryJobStore())
+    monkeypatch.setitem(app_module.app.config, 'JOB_STALE_SECONDS', 60)
+    return app_module
+
+
+def queued_batch(app, job_id):
+    app.job_store.create(job_id, {'status': 'queued', 'owner': None, 'lane': JobScheduler.BULK,
+                                  'total_files': 1, 'files': []})
+
+
+def later(monkeypatch, seconds):
+    """Move the clock seen by the app forward"""
+    now = time.time() + seconds
+    monkeypatch.setattr(time, 'time', lambda: now)
+
+
+def test_batch_lost_between_claim_and_ownership_is_requeued(app, monkeypatch):
+    queued_batch(app, '1')
+    app.job_queue.put('1', JobScheduler.BULK)
+    # A worker takes the id off the queue and dies before recording itself as owner
+    assert app.job_queue.claim([JobScheduler.BULK], timeout=0) == '1'
+    later(monkeypatch, 120)
+
+    app.resume_interrupted_jobs()
+    assert app.job_queue.position('1') == 1
+    # Requeued once only
+    app.resume_interrupted_jobs()
+    assert app.job_queue.qsize() == 1
+
+
+def test_waiting_and_recent_batches_are_left_alone(app, monkeypatch):
+    queued_batch(app, 'waiting')
+    app.job_queue.put('waiting', JobScheduler.BULK)
+    later(monkeypatch, 120)
+    # Just claimed; its worker is about to record itself as owner
+    queued_batch(app, 'claimed')
+
+    app.resume_interrupted_jobs()
+    assert app.job_queue.qsize() == 1
+    assert app.job_queue.position('claimed') is None
+
+
+def owned_batch(app, job_id, owner):
+    app.job_store.create(job_id, {'status': 'converting', 'owner': owner, 'lane': JobScheduler.BULK,
+                                  'total_files': 1, 'files': []})
+
+
+@pytest.mark.skipif(os.name == 'nt', reason='owners on this host are only checked on POSIX')
+def test_owners_on_this_host_are_checked_by_pid_not_staleness(app, monkeypatch):
+    host = socket.gethostname()
+    # A sibling web worker converting a long batch in-process sends no heartbeat
+    owned_batch(app, 'sibling', f"{host}:{os.getppid()}")
+    exited = subprocess.Popen([sys.executable, '-c', 'pass'])
+    exited.wait()
+    owned_batch(app, 'crashed', f"{host}:{exited.pid}")
+    later(monkeypatch, 120)
+
+    app.resume_interrupted_jobs()
+    assert app.job_queue.position('sibling') is None
+    assert app.job_store.get('sibling')['owner'] == f"{host}:{os.getppid()}"
+    assert app.job_queue.position('crashed') == 1
+
+
+def test_owners_on_other_hosts_are_gone_once_stale(app, monkeypatch):
+    owned_batch(app, 'stale', 'elsewhere:123')
+    later(monkeypatch, 120)
+    owned_batch(app, 'fresh', 'elsewhere:456')
+
+    app.resume_interrupted_jobs()
+    assert app.job_queue.position('stale') == 1
+    assert app.job_queue.position('fresh') is None
+
+
+def test_upload_paths_are_absolute(app):
+    path = app.converter.new_upload_path('deck.pptx')
+    assert os.path.isabs(path)
+    assert os.path.dirname(path) == app.converter.upload_folder
@@ -0,0 +1,92 @@
+import io
+import os
+import struct
+import zipfile
+
+import pytest
+
+from zip_stream import append_to_archive, stream_zip, unique_arcnames
+
+
+@pytest.fixture
+def files(tmp_path):
+    paths = []
+    for number, size in enumerate((0, 1000, 300 * 1024)):
+        path = tmp_path / f'file{number}.pdf'
+        path.write_bytes(os.urandom(size))
+        paths.append(str(path))
+    return paths
+
+
+def read_all(archive_bytes):
+    with zipfile.ZipFile(io.BytesIO(archive_bytes)) as archive:
+        assert archive.testzip() is None
+        return {name: archive.read(name) for name in archive.namelist()}
+
+
+@pytest.mark.parametrize('compression', [zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED])
+def test_streamed_archive_holds_every_member(files, compression):
+    members = [(f'member{number}.pdf', path) for number, path in enumerate(files)]
+    chunks = list(stream_zip(members, compression=compression, chunk_size=16 * 1024))
+
+    # Data goes out while members are read, not in one piece at the end
+    assert len(chunks) > 3
+    contents = read_all(b''.join(chunks))
+    assert list(contents) == ['member0.pdf', 'member1.pdf', 'member2.pdf']
+    for name, path in members:
+        with open(path, 'rb') as f:
+            assert contents[name] == f.read()
+
+
+def test_missing_members_are_skipped(files, tmp_path):
+    members = [('gone.pdf', str(tmp_path / 'gone.pdf')), ('there.pdf', files[1])]
+    assert list(read_all(b''.join(stream_zip(members)))) == ['there.pdf']
+
+
+def test_large_members_get_zip64_records(files, monkeypatch):
+    # Stand-in for members over 4GB: zipfile switches to ZIP64 past this limit
+    monkeypatch.setattr(zipfile, 'ZIP64_LIMIT', 100 * 1024)
+    data = b''.join(stream_zip([('large.pdf', files[2]), ('small.pdf', files[1])]))
+
+    local_header = data.index(b'PK\x03\x04')
+    name_length, extra_length = struct.unpack_from('<HH', data, local_header + 26)
+    extra = data[local_header + 30 + name_length:local_header + 30 + name_length + extra_length]
+    assert struct.unpack_from('<H', extra)[0] == 0x0001  # ZIP64 extended information
+    contents = read_all(data)
+    with open(files[2], 'rb') as f:
+        assert contents['large.pdf'] == f.read()
+
+
+def test_duplicate_names_are_numbered():
+    assert unique_arcnames(['deck.pdf', 'Deck.pdf', 'deck.pdf', 'other.pdf', 'deck (2).pdf']) == \
+        ['deck.pdf', 'Deck (2).pdf', 'deck (3).pdf', 'other.pdf', 'deck (2) (2).pdf']
+
+
+def test_append_numbers_names_already_in_the_archive(files, tmp_path):
+    archive_path = str(tmp_path / 'batch.zip')
+    assert append_to_archive(archive_path, files[1], 'deck.pdf') == 'deck.pdf'
+    assert append_to_archive(archive_path, files[2], 'deck.pdf') == 'deck (2).pdf'
+    with zipfile.ZipFile(archive_path) as archive:
+        assert archive.namelist() == ['deck.pdf', 'deck (2).pdf']
+
+
+def test_batch_download_is_streamed_with_unique_names(app_module, files):
+    app_module.job_store.create('zip-stream', {
+        'status': 'completed_with_errors', 'batch_mode': True,
+        'results': [
+            {'status': 'success', 'pdf_path': files[1], 'pdf_filename': 'deck.pdf'},
+            {'status': 'failed', 'original_filename': 'broken.pptx'},
+            {'status': 'success', 'pdf_path': files[2], 'pdf_filename': 'deck.pdf'},
+        ]
+    })
+    client = app_module.app.test_client()
+    response = client.get('/download/zip-stream')
+    assert response.status_code == 200
+    assert response.mimetype == 'application/zip'
+    assert response.is_streamed
+    assert list(read_all(response.get_data())) == ['deck.pdf', 'deck (2).pdf']
+
+    # The same PDFs make the same archive
+    etag = response.headers['ETag']
+    assert etag.startswith('W/')
+    assert client.get('/download/zip-stream', headers={'If-None-Match': etag}).status_code == 304
@@ -0,0 +1,152 @@
+"""
+Upload Streaming
+Writes uploaded presentations straight to their final location in the
+upload folder while the request body is parsed. The content hash, the size
+limit and the file signature are checked on the fly, so each byte is written
+once and a bad upload stops being written as soon as it is recognised.
+"""
+
+import hashlib
+import os
+
+from flask import Request
+
+# Legacy .ppt files are OLE2 compound documents, .pptx files are ZIP packages
+OLE2_MAGIC = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+ZIP_MAGIC = b'PK\x03\x04'
+SIGNATURE_SIZE = len(OLE2_MAGIC)
+
+
+def check_signature(header):
+    """
+    Check the first bytes of a file for a PowerPoint container format
+
+    Returns:
+        str: error message, or None if the header looks like a presentation
+    """
+    if len(header) < SIGNATURE_SIZE:
+        return "File appears to be corrupted or incomplete"
+    if not (header.startswith(OLE2_MAGIC) or header.startswith(ZIP_MAGIC)):
+        return "File is not a PowerPoint presentation"
+    return None
+
+
+class IngestFile:
+    """
+    Writable, readable file object handed to the multipart parser in place
+    of Werkzeug's temporary file. Data goes directly to file_path; once the
+    upload is found to be invalid the partial file is deleted and the rest
+    of the part is discarded.
+    """
+
+    def __init__(self, file_path, max_bytes):
+        """
+        Args:
+            file_path: Final location of the uploaded file
+            max_bytes: Largest accepted file size
+        """
+        self.path = file_path
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.error = None
+        self.kept = False
+        self._hasher = hashlib.sha256()
+        self._header = b''
+        self._file = open(file_path, 'w+b')
+
+    @property
+    def closed(self):
+        return self._file is None or self._file.closed
+
+    def hexdigest(self):
+        return self._hasher.hexdigest()
+
+    def write(self, data):
+        if self.error is not None:
+            return len(data)
+
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            self._reject(f"File is too large (over {self.max_bytes // (1024 * 1024)}MB)")
+            return len(data)
+
+        if len(self._header) < SIGNATURE_SIZE:
+            self._header += data[:SIGNATURE_SIZE - len(self._header)]
+            if len(self._header) >= SIGNATURE_SIZE and check_signature(self._header):
+                self._reject(check_signature(self._header))
+                return len(data)
+
+        self._hasher.update(data)
+        self._file.write(data)
+        return len(data)
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        # The parser seeks to the start once the part is complete; files
+        # shorter than the signature are only caught here
+        if self.error is None and len(self._header) < SIGNATURE_SIZE:
+            self._reject("File is empty" if self.size == 0 else check_signature(self._header))
+        if self.closed:
+            return 0
+        return self._file.seek(offset, whence)
+
+    def tell(self):
+        return 0 if self.closed else self._file.tell()
+
+    def read(self, size=-1):
+        return b'' if self.closed else self._file.read(size)
+
+    def readline(self, size=-1):
+        return b'' if self.closed else self._file.readline(size)
+
+    def flush(self):
+        if not self.closed:
+            self._file.flush()
+
+    def readable(self):
+        return True
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def keep(self):
+        """Close the file and leave it in place for conversion"""
+        self.kept = True
+        if not self.closed:
+            self._file.close()
+
+    def close(self):
+        """Called when the request ends; removes files nobody kept"""
+        if not self.closed:
+            self._file.close()
+        if not self.kept:
+            self._remove()
+
+    def _reject(self, error):
+        self.error = error
+        self._file.close()
+        self._remove()
+
+    def _remove(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+class StreamingUploadRequest(Request):
+    """
+    Request whose file uploads are streamed to the converter's upload folder.
+    Subclasses set converter; parts with a disallowed file name fall back to
+    Werkzeug's temporary files.
+    """
+
+    converter = None
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        converter = self.converter
+        if converter is None or not filename or not converter.allowed_file(filename):
+            return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+        return IngestFile(converter.new_upload_path(filename), converter.max_file_size)
@@ -0,0 +1,216 @@
+"""
+Webhooks
+Completion notifications for API clients. When a job with a callback URL
+finishes, its status is POSTed as JSON to that URL from a background
+thread, retried with exponential backoff. With a shared secret every
+request carries an HMAC-SHA256 signature of its body so receivers can
+verify the sender.
+
+Callback URLs come from API clients, so by default they must resolve to
+public addresses only: a URL pointing at the server itself or the private
+network behind it is refused when the job is submitted and again before
+every delivery attempt. Each attempt connects to the very address it
+checked (keeping the URL's host name for the Host header and TLS), so a
+name that resolves differently a moment later cannot redirect it, and
+neither HTTP redirects nor proxies are followed.
+"""
+
+import hashlib
+import http.client
+import hmac
+import ipaddress
+import json
+import socket
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+SIGNATURE_HEADER = 'X-PPT2PDF-Signature'
+
+
+def valid_callback_url(url, allow_private=False):
+    """
+    Return True for absolute http(s) URLs whose host resolves to public
+    addresses only
+
+    Args:
+        url: The callback URL
+        allow_private: Also accept loopback, link-local, private and other
+            non-public addresses (for receivers on the internal network)
+    """
+    try:
+        parsed = urllib.parse.urlparse(url or '')
+        host, port = parsed.hostname, parsed.port
+    except ValueError:
+        return False
+    if parsed.scheme not in ('http', 'https') or not host:
+        return False
+    if allow_private:
+        return True
+    try:
+        addresses = _resolve(host, port or _DEFAULT_PORTS[parsed.scheme])
+    except OSError:
+        return False
+    return all(_is_public(address) for address in addresses)
+
+
+_DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def _resolve(host, port):
+    """Addresses of a host; raises OSError if it cannot be resolved"""
+    try:
+        addresses = [info[4][0] for info in socket.getaddrinfo(host, port, proto=socket.IPPROTO_TCP)]
+    except UnicodeError as e:
+        raise OSError(f"Invalid host name {host}: {str(e)}")
+    if not addresses:
+        raise OSError(f"{host} has no addresses")
+    return addresses
+
+
+def _is_public(address):
+    # Drop an IPv6 zone index such as fe80::1%eth0
+    ip = ipaddress.ip_address(address.split('%', 1)[0])
+    return ip.is_global and not ip.is_multicast
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    """Report redirects as errors instead of following them to another host"""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+class _PinnedConnection:
+    """Connects to a resolved address instead of resolving the host again"""
+
+    def __init__(self, host, address=None, **kwargs):
+        super().__init__(host, **kwargs)
+        self._create_connection = (
+            lambda target, *args: socket.create_connection((address, target[1]), *args))
+
+
+class _PinnedHTTPConnection(_PinnedConnection, http.client.HTTPConnection):
+    pass
+
+
+class _PinnedHTTPSConnection(_PinnedConnection, http.client.HTTPSConnection):
+    pass
+
+
+class _PinnedHTTPHandler(urllib.request.HTTPHandler):
+    def __init__(self, address):
+        super().__init__()
+        self.address = address
+
+    def http_open(self, req):
+        return self.do_open(_PinnedHTTPConnection, req, address=self.address)
+
+
+class _PinnedHTTPSHandler(urllib.request.HTTPSHandler):
+    def __init__(self, address):
+        super().__init__()
+        self.address = address
+
+    def https_open(self, req):
+        return self.do_open(_PinnedHTTPSConnection, req, context=self._context, address=self.address)
+
+
+def sign(body, secret):
+    """Signature header value for a request body"""
+    return 'sha256=' + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+class WebhookSender:
+    """Delivers notifications without blocking the conversion that finished"""
+
+    def __init__(self, secret=None, attempts=5, retry_delay=2.0, timeout=10, allow_private=False,
+                 sleep=time.sleep):
+        """
+        Args:
+            secret: Shared secret for request signatures (None sends unsigned)
+            attempts: Deliveries tried before giving up
+            retry_delay: Seconds before the first retry, doubled each time
+            timeout: Seconds to wait for the receiver to answer
+            allow_private: Deliver to non-public addresses too (see
+                valid_callback_url)
+            sleep: Function waiting between attempts
+        """
+        self.secret = secret
+        self.attempts = attempts
+        self.retry_delay = retry_delay
+        self.timeout = timeout
+        self.allow_private = allow_private
+        self.sleep = sleep
+        self.delivered = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+
+    def send(self, url, payload):
+        """Deliver payload to url in the background"""
+        threading.Thread(target=self.deliver, args=(url, payload), name='webhook', daemon=True).start()
+
+    def deliver(self, url, payload):
+        """
+        POST payload to url, retrying on connection errors and 5xx/429 answers
+
+        Returns:
+            bool: True once the receiver answered with a 2xx status
+        """
+        body = json.dumps(payload).encode()
+        headers = {'Content-Type': 'application/json', 'User-Agent': 'ppt2pdf-webhook'}
+        if self.secret:
+            headers[SIGNATURE_HEADER] = sign(body, self.secret)
+
+        for attempt in range(self.attempts):
+            try:
+                request = urllib.request.Request(url, data=body, headers=headers, method='POST')
+                with self._opener(request).open(request, timeout=self.timeout) as response:
+                    response.read()
+                with self._lock:
+                    self.delivered += 1
+                return True
+            except ValueError as e:
+                error = str(e)
+                break  # not a URL this server may call
+            except urllib.error.HTTPError as e:
+                error = f"HTTP {e.code}"
+                if e.code < 500 and e.code != 429:
+                    break  # the receiver rejected or redirected it; retrying will not help
+            except (urllib.error.URLError, OSError) as e:
+                error = str(e)
+
+            if attempt < self.attempts - 1:
+                self.sleep(self.retry_delay * 2 ** attempt)
+
+        print(f"Webhook to {url} failed after {attempt + 1} attempts: {error}")
+        with self._lock:
+            self.failed += 1
+        return False
+
+    def _opener(self, request):
+        """
+        Opener bound to a freshly resolved and checked address of the
+        request's host
+
+        Raises:
+            ValueError: if the host resolves to a non-public address
+            OSError: if the host cannot be resolved
+        """
+        if request.type not in _DEFAULT_PORTS:
+            raise ValueError(f"Not an http(s) URL: {request.full_url}")
+        parsed = urllib.parse.urlsplit(request.full_url)
+        host = parsed.hostname
+        addresses = _resolve(host, parsed.port or _DEFAULT_PORTS[request.type])
+        if not self.allow_private and not all(_is_public(address) for address in addresses):
+            raise ValueError(f"{host} resolves to a non-public address")
+        return urllib.request.build_opener(
+            urllib.request.ProxyHandler({}), _NoRedirect,
+            _PinnedHTTPHandler(addresses[0]), _PinnedHTTPSHandler(addresses[0])
+        )
+
+    def stats(self):
+        with self._lock:
+            return {'delivered': self.delivered, 'failed': self.failed}
@@ -0,0 +1,147 @@
+"""
+Conversion Worker
+Standalone conversion node for distributed mode. Claims uploaded batches from
+the shared job queue, converts them with this node's engine pool, and reports
+progress through the shared job store, writing PDFs to the shared download
+folder. Web nodes and workers are scaled independently.
+
+Start web nodes and workers with the same settings, e.g.:
+    PPT2PDF_JOB_QUEUE=redis PPT2PDF_JOB_STORE=redis python app.py
+    PPT2PDF_JOB_QUEUE=redis PPT2PDF_JOB_STORE=redis python worker.py
+"""
+
+import signal
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app import (
+    WORKER_ID, app, convert_batch_background, converter, job_queue, job_store,
+    resume_interrupted_jobs
+)
+from scheduler import JobScheduler
+
+
+class ConversionWorker:
+    """Pulls batches from the shared queue and converts a few at a time"""
+
+    def __init__(self, concurrency=2, interactive_weight=3, heartbeat_interval=30,
+                 recovery_interval=60):
+        """
+        Args:
+            concurrency: Batches converted at the same time on this node
+            interactive_weight: Interactive batches claimed for every bulk batch
+            heartbeat_interval: Seconds between touches of running batches, so
+                other nodes do not take them for abandoned
+            recovery_interval: Seconds between checks for batches of dead nodes
+        """
+        self.concurrency = max(1, concurrency)
+        self.interactive_weight = max(1, interactive_weight)
+        self.heartbeat_interval = heartbeat_interval
+        self.recovery_interval = recovery_interval
+        self.stopping = threading.Event()
+        self.running = set()
+        self._slots = threading.BoundedSemaphore(self.concurrency)
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='batch')
+        self._interactive_streak = 0
+
+    def _lane_order(self):
+        """Prefer interactive batches, but let a bulk batch through regularly"""
+        if self._interactive_streak >= self.interactive_weight:
+            return [JobScheduler.BULK, JobScheduler.INTERACTIVE]
+        return [JobScheduler.INTERACTIVE, JobScheduler.BULK]
+
+    def run(self):
+        print(f"Worker {WORKER_ID} taking batches from the {app.config['JOB_QUEUE']} queue "
+              f"({self.concurrency} at a time)")
+        threading.Thread(target=self._heartbeat, name='heartbeat', daemon=True).start()
+
+        while not self.stopping.is_set():
+            # Only claim what this node can start right away, leaving the
+            # rest of the queue to other workers
+            if not self._slots.acquire(timeout=1):
+                continue
+            job_id = job_queue.claim(self._lane_order(), timeout=2)
+            if job_id is None or not self._claim(job_id):
+                self._slots.release()
+                continue
+            self._executor.submit(self._convert, job_id)
+
+        print("Waiting for running batches to finish...")
+        self._executor.shutdown(wait=True)
+        if converter._pool is not None:
+            converter.pool.shutdown()
+
+    def _claim(self, job_id):
+        """Take ownership of a queued batch (compare-and-set on the owner)"""
+        job = job_store.get(job_id)
+        if job is None:
+            return False
+        claimed = job_store.transition(job_id, ('queued',), {'owner': WORKER_ID}, expect={'owner': None})
+        if not claimed:
+            return False
+
+        if job.get('lane') == JobScheduler.BULK:
+            self._interactive_streak = 0
+        else:
+            self._interactive_streak += 1
+        with self._lock:
+            self.running.add(job_id)
+        return True
+
+    def _convert(self, job_id):
+        try:
+            job = job_store.get(job_id)
+            if job is not None:
+                convert_batch_background(job_id, job['files'])
+        except Exception as e:
+            print(f"Batch {job_id} failed on this worker: {str(e)}")
+        finally:
+            with self._lock:
+                self.running.discard(job_id)
+            self._slots.release()
+
+    def _heartbeat(self):
+        last_recovery = 0
+        while not self.stopping.wait(self.heartbeat_interval):
+            with self._lock:
+                job_ids = list(self.running)
+            for job_id in job_ids:
+                job_store.update(job_id, {'heartbeat_at': time.time()})
+
+            # Put batches of workers that died back on the queue
+            if time.time() - last_recovery >= self.recovery_interval:
+                last_recovery = time.time()
+                try:
+                    resume_interrupted_jobs()
+                except Exception as e:
+                    print(f"Recovery check failed: {str(e)}")
+
+    def stop(self, *args):
+        self.stopping.set()
+
+
+def main():
+    if job_queue is None:
+        print("worker.py needs a shared queue: set PPT2PDF_JOB_QUEUE to 'spool' or 'redis'")
+        sys.exit(1)
+
+    print("Checking conversion engine availability...")
+    available, error_msg = converter.check_powerpoint_availability()
+    if not available:
+        print(f"⚠ WARNING: {error_msg}")
+
+    worker = ConversionWorker(
+        concurrency=app.config['SCHEDULER_WORKERS'],
+        heartbeat_interval=min(30, app.config['JOB_STALE_SECONDS'] / 3),
+        recovery_interval=app.config['JOB_STALE_SECONDS'] / 2
+    )
+    signal.signal(signal.SIGINT, worker.stop)
+    signal.signal(signal.SIGTERM, worker.stop)
+    worker.run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+Streaming ZIP
+Builds a ZIP archive on the fly and yields it in chunks, so a batch
+download can start immediately without writing the archive to disk. Also
+appends to prebuilt batch archives as conversions finish.
+"""
+
+import os
+import zipfile
+
+CHUNK_SIZE = 64 * 1024
+
+
+class _StreamBuffer:
+    """Write-only, non-seekable sink that zipfile writes into"""
+
+    def __init__(self):
+        self._chunks = []
+        self._offset = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._offset
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        """Return and forget everything written since the last drain"""
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def unique_arcnames(names):
+    """Make archive member names unique by numbering repeats: a.pdf, a (2).pdf"""
+    used = set()
+    unique = []
+    for name in names:
+        base, ext = os.path.splitext(name)
+        candidate = name
+        number = 2
+        while candidate.lower() in used:
+            candidate = f"{base} ({number}){ext}"
+            number += 1
+        used.add(candidate.lower())
+        unique.append(candidate)
+    return unique
+
+
+def stream_zip(members, compression=zipfile.ZIP_STORED, chunk_size=CHUNK_SIZE):
+    """
+    Generate a ZIP archive chunk by chunk
+
+    Args:
+        members: Iterable of (arcname, file_path) pairs
+        compression: zipfile.ZIP_STORED (default, PDFs are already
+            compressed) or zipfile.ZIP_DEFLATED
+        chunk_size: Bytes read from each member at a time
+
+    Yields:
+        bytes: consecutive pieces of the archive
+    """
+    buffer = _StreamBuffer()
+    with zipfile.ZipFile(buffer, 'w', compression) as archive:
+        for arcname, file_path in members:
+            try:
+                info = zipfile.ZipInfo.from_file(file_path, arcname)
+                source = open(file_path, 'rb')
+            except OSError as e:
+                print(f"Skipping {file_path} in archive: {str(e)}")
+                continue
+
+            info.compress_type = compression
+            large = info.file_size > zipfile.ZIP64_LIMIT
+            with source, archive.open(info, 'w', force_zip64=large) as dest:
+                for chunk in iter(lambda: source.read(chunk_size), b''):
+                    dest.write(chunk)
+                    data = buffer.drain()
+                    if data:
+                        yield data
+
+            data = buffer.drain()
+            if data:
+                yield data
+
+    # Central directory
+    yield buffer.drain()
+
+
+def append_to_archive(archive_path, file_path, arcname, compression=zipfile.ZIP_STORED):
+    """
+    Append a file to an archive on disk, creating the archive if needed
+
+    Returns:
+        str: the member name used (numbered if arcname was already taken)
+    """
+    mode = 'a' if os.path.exists(archive_path) else 'w'
+    with zipfile.ZipFile(archive_path, mode, compression) as archive:
+        existing = archive.namelist()
+        arcname = unique_arcnames(existing + [arcname])[-1]
+        archive.write(file_path, arcname)
+    return arcname